@@ -102,7 +102,8 @@ const App: React.FC = () => {
         user_text: text,
         user_location: { lat: userLoc.lat, lon: userLoc.lng },
         request_count_last_10_min: 0,
-        cancel_count_today: 0
+        cancel_count_today: 0,
+        include_route: true
       };
       const backendResponse = await submitAssistanceRequest(payload);
 
@@ -124,10 +125,13 @@ const App: React.FC = () => {
         rating: 4.5,
         capability: (backendResponse.priority === 'emergency' || backendResponse.issue_type === 'accident') ? t.emergency : "Verified Mechanic",
         lat: backendResponse.mechanic_lat,
-        lon: backendResponse.mechanic_lon
+        lon: backendResponse.mechanic_lon,
+        routePolyline: backendResponse.route_polyline
       };
 
-      setRequest(prev => prev ? { ...prev, mechanic: assignedMechanic } : null);
+      // Accidents can be answered by responders alone, without a mechanic to show
+      const mechanic = backendResponse.mechanic_id ? assignedMechanic : undefined;
+      setRequest(prev => prev ? { ...prev, mechanic } : null);
       setStatus(AssistanceStatus.MECHANIC_ASSIGNED);
 
     } catch (err: any) {
@@ -1,11 +1,34 @@
-import math
+import re
+import time
+import bulkhead
+import gazetteer
 import gemini_service
+import incident_store
+import logging_config
+import triage_classifier
+import upstream_scheduler
 import osm_service
 import osrm_service
+import route_polyline
+import service_areas
+import eta_correction
+import eta_grid
+import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
+class UnknownIncident(Exception):
+    """
+    A follow-up named an incident id this process doesn't know, or that expired.
+    """
+
+class IncidentAlreadyAssigned(Exception):
+    """
+    A follow-up named an incident that was already dispatched.
+    """
+
+
 def get_live_status(distance_meters):
     """
     Step 10: Live Status Update
@@ -19,18 +42,32 @@ def get_live_status(distance_meters):
     else:
         return "arrived"
 
+# "... at/near <landmark>", up to the end of the clause; whole words only,
+# so "battery" or "flat tyre" don't count as "at"
+_LOCATION_MARKER = re.compile(r"\b(?:at|near)\s+(?:the\s+)?([^,.;!?]+)")
+
+def extract_location_text(text):
+    """
+    The landmark named in the text, or None.
+    """
+    match = _LOCATION_MARKER.search(text.lower()) if isinstance(text, str) else None
+    return match.group(1).strip() if match else None
+
 def handle_assistance_request(data):
     """
     Deterministic backend logic for handling assistance requests following 10 steps.
+    Each step is timed into the dispatch_stage_seconds metric.
     """
+    with metrics.trace() as spans, upstream_scheduler.request_scope(), metrics.DISPATCH_SECONDS.time():
+        result = _handle_assistance_request(data)
+    metrics.DISPATCH_TOTAL.inc(status=result.get("status"), priority=result.get("priority") or "none")
+    logger.info("Dispatch spans", extra={"spans_ms": {stage: round(seconds * 1000, 1) for stage, seconds in spans}})
+    return result
+
+def _handle_assistance_request(data):
     
-    # --- Internal Helpers (Mocking External Dependencies) ---
+    # --- Internal Helpers ---
     
-    def calculate_distance(loc1, loc2):
-        if not loc1 or not loc2:
-            return float('inf')
-        return math.sqrt((loc1['lat'] - loc2['lat'])**2 + (loc1['lon'] - loc2['lon'])**2)
-
     def extract_issue(text):
         if not isinstance(text, str):
             text = ""
@@ -47,128 +84,157 @@ def handle_assistance_request(data):
         elif "engine" in text_lower or "motor" in text_lower:
             issue_type = "engine"
             
-        location_text = None
-        if "at" in text_lower:
-            parts = text_lower.split("at")
-            if len(parts) > 1:
-                location_text = parts[1].strip()
-        elif "near" in text_lower:
-            parts = text_lower.split("near")
-            if len(parts) > 1:
-                location_text = parts[1].strip()
+        location_text = extract_location_text(text_lower)
             
         emergency_keywords_pool = ["help", "emergency", "danger", "crash", "fire", "injury", "blood", "critical", "trap", "stuck"]
         found_keywords = [kw for kw in emergency_keywords_pool if kw in text_lower]
                 
         return issue_type, found_keywords, location_text
 
-    def nearest_service_center(user_loc):
-        centers = [
-            {"id": "center_1", "location": {"lat": 10.0, "lon": 10.0}},
-            {"id": "center_2", "location": {"lat": 20.0, "lon": 20.0}}
-        ]
-        if not user_loc:
-            return centers[0]
-            
-        best = None
-        min_dist = float('inf')
-        for c in centers:
-            d = calculate_distance(user_loc, c["location"])
-            if d < min_dist:
-                min_dist = d
-                best = c
-        return best
-
-    def nearest_available_mechanic(center, user_loc):
-        mechanics = [
-            {"id": "mech_1", "center_id": "center_1", "location": {"lat": 10.1, "lon": 10.1}},
-            {"id": "mech_2", "center_id": "center_1", "location": {"lat": 10.2, "lon": 10.2}},
-            {"id": "mech_3", "center_id": "center_2", "location": {"lat": 20.1, "lon": 20.1}}
-        ]
-        candidates = [m for m in mechanics if m["center_id"] == center["id"]]
-        if not candidates:
-            candidates = mechanics
-            
-        if not user_loc:
-            return candidates[0]
-            
-        best = None
-        min_dist = float('inf')
-        for m in candidates:
-            d = calculate_distance(user_loc, m["location"])
-            if d < min_dist:
-                min_dist = d
-                best = m
-        return best
-
-    def osrm_eta(origin, destination):
+    def osrm_eta(origin, destination, hub=True):
         if not origin or not destination:
             return -1
+        # Precomputed hub grid first; OSRM only outside its coverage
+        eta = eta_grid.lookup(origin, destination)
+        metrics.cache_lookup("eta_grid", eta is not None)
+        if eta is not None:
+            return eta
+        if hub:
+            # Mechanic shops become hubs; hospitals and police are routed directly
+            eta_grid.register_hub(origin)
         route = osrm_service.get_route(origin, destination)
         if route:
             return route['duration_min']
         return -1
 
-    # --- Step 1: Issue Extraction ---
-    user_text = data.get("user_text", "")
+    # A follow-up to a waiting_for_location incident resumes at Step 6 with its triage
+    incident_id = data.get("incident_id")
+    triage = None
+    if incident_id:
+        triage = incident_store.get(incident_id)
+        if triage is None:
+            raise UnknownIncident(incident_id)
+        if "assigned_at" in triage:
+            raise IncidentAlreadyAssigned(incident_id)
+    if triage:
+        issue_type = triage["issue_type"]
+        emergency_flag = triage["emergency_flag"]
+        suggested_action = triage["suggested_action"]
+        priority = triage["priority"]
+        response_type = triage["response_type"]
+        upstream_scheduler.set_priority(priority)
+    else:
+        # --- Step 1: Issue Extraction ---
+        user_text = data.get("user_text", "")
     
-    # Try LLM analysis first
-    llm_analysis = gemini_service.analyze_request(user_text)
+        # Try the local classifier first, then LLM analysis
+        with metrics.span("triage"):
+            llm_analysis = triage_classifier.classify(user_text)
+            if llm_analysis:
+                triage_classifier.TRIAGE_DECISIONS.inc(source="local")
+            else:
+                llm_analysis = gemini_service.analyze_request(user_text)
+                if llm_analysis:
+                    triage_classifier.TRIAGE_DECISIONS.inc(source="llm")
+                    # Training data for the local classifier
+                    logging_config.log_triage_label(user_text, llm_analysis)
     
-    if llm_analysis:
-        logger.info(f"LLM Analysis: {llm_analysis}")
-        issue_type = llm_analysis.get("issueType", "general").lower()
-        severity = llm_analysis.get("severity", "Medium")
-        suggested_action = llm_analysis.get("suggestedAction", "")
-        emergency_flag = (severity in ["High", "Critical"])
-        # For compatibility with existing logic
-        emergency_keywords = [] if not emergency_flag else ["llm_emergency"]
-    else:
-        # Fallback to Step 1: Rule-based Issue Extraction
-        issue_type, emergency_keywords, location_text = extract_issue(user_text)
+            if llm_analysis:
+                logger.info("LLM Analysis: %s", llm_analysis)
+                issue_type = llm_analysis.get("issueType", "general").lower()
+                severity = llm_analysis.get("severity", "Medium")
+                suggested_action = llm_analysis.get("suggestedAction", "")
+                emergency_flag = (severity in ["High", "Critical"])
+                # For compatibility with existing logic
+                emergency_keywords = [] if not emergency_flag else ["llm_emergency"]
+            else:
+                # Fallback to Step 1: Rule-based Issue Extraction
+                metrics.fallback("rule_based_triage")
+                triage_classifier.TRIAGE_DECISIONS.inc(source="rules")
+                issue_type, emergency_keywords, location_text = extract_issue(user_text)
 
-        # --- Step 2: Emergency Scoring (Fallback) ---
-        score = 0
-        if issue_type == "accident":
-            score += 60
-        score += 15 * len(emergency_keywords)
-        score = min(score, 100)
-        emergency_flag = (score >= 70)
-        suggested_action = None
+                # --- Step 2: Emergency Scoring (Fallback) ---
+                score = 0
+                if issue_type == "accident":
+                    score += 60
+                score += 15 * len(emergency_keywords)
+                score = min(score, 100)
+                emergency_flag = (score >= 70)
+                suggested_action = None
 
-    # --- Step 3: Fake / Misuse Detection ---
-    request_count_last_10_min = data.get("request_count_last_10_min", 0)
-    cancel_count_today = data.get("cancel_count_today", 0)
+        # --- Step 3: Fake / Misuse Detection ---
+        with metrics.span("misuse_check"):
+            request_count_last_10_min = data.get("request_count_last_10_min", 0)
+            cancel_count_today = data.get("cancel_count_today", 0)
     
-    if emergency_flag:
-        suspicious = False
-    elif request_count_last_10_min >= 5 or cancel_count_today >= 3:
-        suspicious = True
-    else:
-        suspicious = False
+            if emergency_flag:
+                suspicious = False
+            elif request_count_last_10_min >= 5 or cancel_count_today >= 3:
+                suspicious = True
+            else:
+                suspicious = False
 
-    # --- Step 4: Dispatch Decision ---
-    if emergency_flag:
-        priority = "emergency"
-        response_type = "ambulance_police_and_mechanic"
-    else:
-        priority = "low" if suspicious else "normal"
-        response_type = "mechanic"
+        # --- Step 4: Dispatch Decision ---
+        with metrics.span("dispatch_decision"):
+            if emergency_flag:
+                priority = "emergency"
+                response_type = "ambulance_police_and_mechanic"
+            else:
+                priority = "low" if suspicious else "normal"
+                response_type = "mechanic"
+            # Upstream calls from here on queue by this priority
+            upstream_scheduler.set_priority(priority)
+
+    triage_state = triage or {
+        "issue_type": issue_type,
+        "emergency_flag": emergency_flag,
+        "suggested_action": suggested_action,
+        "priority": priority,
+        "response_type": response_type,
+    }
 
     user_location = data.get("user_location")
+    resolved_location = None
+    if not user_location or user_location.get("lat") is None:
+        # No GPS fix: look up the landmark in the text in the offline gazetteer
+        with metrics.span("geocode"):
+            location_text = extract_location_text(data.get("user_text"))
+            if not location_text and triage:
+                # The follow-up to "share a nearby landmark" may be just the landmark
+                location_text = data.get("user_text")
+            resolved_location = gazetteer.resolve(location_text)
+        if resolved_location:
+            logger.info("Resolved %r to %s", location_text, resolved_location)
+            user_location = {"lat": resolved_location["lat"], "lon": resolved_location["lon"]}
+
     if not user_location or user_location.get("lat") is None:
+        # Keep the triage so the follow-up with a location skips Steps 1-4
+        incident_id = incident_id if triage else incident_store.create(triage_state)
         response_type = "request_location"
 
     # --- Step 5: Location Resolution ---
     if response_type == "request_location":
         return {
           "message": "Please share a nearby landmark so we can send help",
-          "status": "waiting_for_location"
+          "status": "waiting_for_location",
+          "priority": priority,
+          "incident_id": incident_id
         }
 
     # --- Step 6: Real Service Discovery (OSM) ---
-    nearby_services = osm_service.get_real_assistance(user_location['lat'], user_location['lon'], issue_type)
-    
+    with metrics.span("osm_discovery"):
+        emergency_services = None
+        if issue_type == "accident":
+            # Hospital, police and mechanic are resolved as separate lookups in parallel
+            nearest_by_category = osm_service.get_emergency_assistance(user_location['lat'], user_location['lon'])
+            emergency_services = [
+                dict(service, category=category)
+                for category, service in nearest_by_category.items() if service
+            ]
+            nearby_services = emergency_services
+        else:
+            nearby_services = osm_service.get_real_assistance(user_location['lat'], user_location['lon'], issue_type)
+
     if not nearby_services:
         return {
             "message": "We couldn't find any specialized help nearby. Please call 112 for emergency assistance.",
@@ -176,37 +242,175 @@ def handle_assistance_request(data):
             "priority": priority
         }
 
-    # Selection: take the closest one
+    # Selection: the mechanic for accidents (responders are listed separately, never sent as the
+    # mechanic, so there may be none), otherwise the closest one
     selected_service = nearby_services[0]
+    if emergency_services:
+        selected_service = next((s for s in emergency_services if s['category'] == 'mechanic'), None)
 
     # --- Step 7: ETA Calculation ---
-    eta = osrm_eta(selected_service, user_location)
-    final_eta = eta if eta >= 0 else 15 # Fallback eta
+    with metrics.span("eta"):
+        if emergency_services:
+            # ETAs for the accident responders run concurrently in the routing bulkhead
+            futures = [
+                bulkhead.get("routing").submit(osrm_eta, s, user_location, s['category'] == 'mechanic')
+                for s in emergency_services
+            ]
+            etas = [f.result() for f in futures]
+            for service, eta in zip(emergency_services, etas):
+                if eta < 0:
+                    metrics.fallback("default_eta")
+                service['eta_fallback'] = eta < 0
+                service['predicted_eta'] = eta if eta >= 0 else 15 # Fallback eta
+                # Free-flow time adjusted for this area and hour of the week
+                service['eta_minutes'] = eta_correction.correct(service['predicted_eta'], user_location)
+            predicted_eta, eta_fallback, final_eta = None, True, None
+            if selected_service:
+                predicted_eta = selected_service['predicted_eta']
+                eta_fallback = selected_service['eta_fallback']
+                final_eta = selected_service['eta_minutes']
+        else:
+            eta = osrm_eta(selected_service, user_location)
+            if eta < 0:
+                metrics.fallback("default_eta")
+            eta_fallback = eta < 0
+            predicted_eta = eta if eta >= 0 else 15 # Fallback eta
+            final_eta = eta_correction.correct(predicted_eta, user_location)
 
     # --- Step 8: Contact Details ---
     # In a real app, you might check if they have WhatsApp. 
     # For now, we assume the phone number is available for SMS/Call.
     
     # --- Step 9: Initial Response ---
-    res_msg = f"Help is coming from {selected_service['name']}"
-    if emergency_flag:
-        res_msg = f"Emergency assistance requested from {selected_service['name']} (Type: {selected_service['type']})."
+    with metrics.span("response_build"):
+        if emergency_services:
+            responders = ", ".join(f"{s['category']}: {s['name']}" for s in emergency_services)
+            res_msg = f"Emergency assistance requested ({responders})."
+            if not selected_service:
+                res_msg += " No mechanic was found nearby; arrange towing separately."
+        elif emergency_flag:
+            res_msg = f"Emergency assistance requested from {selected_service['name']} (Type: {selected_service['type']})."
+        else:
+            res_msg = f"Help is coming from {selected_service['name']}"
     
-    # Use LLM suggested action if available as additional info
-    if suggested_action:
-        res_msg += f" {suggested_action}"
+        # Use LLM suggested action if available as additional info
+        if suggested_action:
+            res_msg += f" {suggested_action}"
+
+        result = {
+          "message": res_msg,
+          "priority": priority,
+          "eta_minutes": final_eta,
+          "status": "assigned",
+          "issue_type": issue_type
+        }
+        if selected_service:
+            result.update({
+                "mechanic_id": str(selected_service['id']),
+                "mechanic_name": selected_service['name'],
+                "mechanic_phone": selected_service['phone'],
+                "mechanic_lat": selected_service['lat'],
+                "mechanic_lon": selected_service['lon'],
+            })
+        if emergency_services:
+            result["emergency_services"] = [
+                {
+                    "category": s['category'],
+                    "id": str(s['id']),
+                    "name": s['name'],
+                    "phone": s['phone'],
+                    "lat": s['lat'],
+                    "lon": s['lon'],
+                    "eta_minutes": s['eta_minutes'],
+                }
+                for s in emergency_services
+            ]
+        # Keep the assignment so the arrival report can be scored against the uncorrected ETA
+        assignment = {
+            "assigned_at": time.time(),
+            "predicted_eta": predicted_eta,
+            # Not a routing estimate; arrivals against it say nothing about traffic
+            "eta_fallback": eta_fallback,
+            "location": user_location,
+            # None when an accident has responders but no mechanic; nothing is tracked against it
+            "mechanic_id": result.get("mechanic_id"),
+        }
+        if triage:
+            # Concurrent follow-ups both get here; only the first one is assigned
+            if not incident_store.update(incident_id, assignment, unless="assigned_at"):
+                raise IncidentAlreadyAssigned(incident_id)
+        else:
+            incident_id = incident_store.create(dict(triage_state, **assignment))
+        result["incident_id"] = incident_id
+        # The center whose coverage area contains the user, else the nearest one
+        service_center = service_areas.assign_center(user_location)
+        if service_center:
+            result["service_center_id"] = service_center["id"]
+            if not service_center["covered"]:
+                metrics.fallback("nearest_service_center")
+        if resolved_location:
+            result["resolved_location"] = {k: resolved_location[k] for k in ("name", "lat", "lon")}
+
+    # Opt-in: the mechanic's route for the map view
+    if data.get("include_route") and selected_service:
+        with metrics.span("route_polyline"):
+            encoded = route_polyline.get_polyline(
+                {"lat": selected_service['lat'], "lon": selected_service['lon']}, user_location
+            )
+        if encoded:
+            result["route_polyline"] = encoded
+    return result
+
+def report_arrival(incident_id, arrived_at=None):
+    """
+    Record the assigned mechanic's arrival for the ETA correction model.
+    Returns (report, first): the predicted and observed minutes, and False
+    when the arrival was already reported (the stored report is returned and
+    nothing is recorded again). None for an unknown or unassigned incident,
+    or one without a mechanic.
+    """
+    incident = incident_store.get(incident_id)
+    if not incident or not incident.get("mechanic_id"):
+        return None
+    if "arrived_at" in incident:
+        arrived_at, first = incident["arrived_at"], False
+    else:
+        arrived_at = time.time() if arrived_at is None else arrived_at
+        # Concurrent repeats race on the store, not on the copy read above
+        first = incident_store.mark_once(incident_id, "arrived_at", arrived_at)
+        if not first:
+            arrived_at = (incident_store.get(incident_id) or {}).get("arrived_at", arrived_at)
+    if first:
+        if not incident.get("eta_fallback"):
+            eta_correction.record_arrival(incident["location"], incident["predicted_eta"], incident["assigned_at"], arrived_at)
+        osrm_service.forget_route(incident_id)
+    return {
+        "incident_id": incident_id,
+        "predicted_minutes": incident["predicted_eta"],
+        "observed_minutes": round((arrived_at - incident["assigned_at"]) / 60, 1),
+    }, first
 
+def update_position(incident_id, position, ts=None):
+    """
+    Refresh the ETA of an assigned incident from the mechanic's current
+    position, along the route cached for the assignment. Returns
+    {incident_id, eta_minutes, distance_km, rerouted} (eta_minutes is None
+    when no route is available), or None for an unknown or unassigned incident,
+    or one without a mechanic.
+    """
+    incident = incident_store.get(incident_id)
+    if not incident or not incident.get("mechanic_id"):
+        return None
+    with upstream_scheduler.request_scope():
+        upstream_scheduler.set_priority(incident.get("priority", "normal"))
+        remaining = osrm_service.remaining_route(incident_id, position, incident["location"])
+    if remaining is None:
+        return {"incident_id": incident_id, "eta_minutes": None, "distance_km": None, "rerouted": False}
     return {
-      "message": res_msg,
-      "priority": priority,
-      "mechanic_id": str(selected_service['id']),
-      "mechanic_name": selected_service['name'],
-      "mechanic_phone": selected_service['phone'],
-      "mechanic_lat": selected_service['lat'],
-      "mechanic_lon": selected_service['lon'],
-      "eta_minutes": final_eta,
-      "status": "assigned",
-      "issue_type": issue_type
+        "incident_id": incident_id,
+        "eta_minutes": eta_correction.correct(remaining["duration_min"], incident["location"], ts),
+        "distance_km": remaining["distance_km"],
+        "rerouted": remaining["rerouted"],
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import poi_extract
+
+# Build-time benchmark for the POI index from an OSM extract, across worker
+# counts. Uses the extract given on the command line, or a synthetic one.
+
+def write_synthetic_extract(path, nodes=400000, ways=60000, poi_share=0.02, seed=1):
+    """
+    Nodes scattered over ~50 km around Nagpur, some tagged as POIs, then ways
+    over random nodes, some of them tagged POI buildings.
+    """
+    rng = random.Random(seed)
+    tags = ['<tag k="amenity" v="car_repair"/>', '<tag k="amenity" v="hospital"/>',
+            '<tag k="amenity" v="police"/>', '<tag k="craft" v="mechanic"/>']
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for i in range(1, nodes + 1):
+            lat, lon = 21.15 + rng.uniform(-0.25, 0.25), 79.09 + rng.uniform(-0.25, 0.25)
+            if rng.random() < poi_share:
+                f.write(f'  <node id="{i}" lat="{lat:.7f}" lon="{lon:.7f}">\n'
+                        f'    {rng.choice(tags)}\n    <tag k="name" v="POI {i}"/>\n  </node>\n')
+            else:
+                f.write(f'  <node id="{i}" lat="{lat:.7f}" lon="{lon:.7f}"/>\n')
+        for i in range(1, ways + 1):
+            start = rng.randint(1, nodes - 5)
+            refs = "".join(f'\n    <nd ref="{start + k}"/>' for k in range(5))
+            tag = rng.choice(tags) if rng.random() < poi_share else '<tag k="highway" v="residential"/>'
+            f.write(f'  <way id="{i}">{refs}\n    {tag}\n  </way>\n')
+        f.write('</osm>\n')
+
+def time_build(path, output, workers, chunk_bytes, runs=3):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        count = poi_extract.build_from_extract(path, output, workers=workers, chunk_bytes=chunk_bytes,
+                                               way_nodes_path=os.path.join(os.path.dirname(output), "poi_way_nodes.bin"))
+        samples.append(time.perf_counter() - start)
+    return count, samples
+
+if __name__ == "__main__":
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({w for w in (1, 2, 4, 8, 16, cores) if w <= cores})
+    with tempfile.TemporaryDirectory() as tmp:
+        if len(sys.argv) > 1:
+            extract = sys.argv[1]
+        else:
+            extract = os.path.join(tmp, "synthetic.osm")
+            write_synthetic_extract(extract)
+        size_mb = os.path.getsize(extract) / 1024 / 1024
+        # At least a few blocks per worker, so uneven blocks even out
+        chunk_bytes = max(1024 * 1024, int(os.path.getsize(extract) / (4 * max(worker_counts))))
+        print(f"Extract: {extract} ({size_mb:.0f} MB), {chunk_bytes // 1024} KB blocks, {cores} cores")
+        print(f"{'workers':>7} {'median':>9} {'min':>9} {'speedup':>8}")
+        baseline = None
+        for workers in worker_counts:
+            count, samples = time_build(extract, os.path.join(tmp, "poi_index.bin"), workers, chunk_bytes)
+            median = statistics.median(samples)
+            baseline = baseline or median
+            print(f"{workers:>7} {median:>8.2f}s {min(samples):>8.2f}s {baseline / median:>7.2f}x")
+        print(f"{count} POIs indexed")
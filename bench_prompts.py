@@ -0,0 +1,54 @@
+import statistics
+import sys
+import time
+
+import cassette
+import gemini_service
+
+# Compares the compact (structured-output) and verbose Gemini prompt variants
+# on latency, tokens, cost and parse failures. Needs GEMINI_API_KEY, or a
+# cassette recorded earlier (UPSTREAM_CASSETTE_MODE=replay).
+
+SAMPLE_TEXTS = [
+    "I have a flat tire",
+    "Car battery is dead, won't start",
+    "There is smoke coming from my engine",
+    "I was in a major accident and need help immediately",
+    "Bike skidded near Zero Mile, minor scratches",
+    "Car stopped on the highway, no idea why",
+]
+
+def run_variant(variant, texts, repeats):
+    latencies, prompt_tokens, output_tokens, costs, failures = [], [], [], [], 0
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            result = gemini_service.analyze_request(text, variant=variant)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not result:
+                failures += 1
+                continue
+            usage = result["usage"]
+            prompt_tokens.append(usage["prompt_tokens"])
+            output_tokens.append(usage["output_tokens"])
+            costs.append(usage["cost_usd"])
+    return {
+        "calls": len(latencies),
+        "failures": failures,
+        "latency_p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "latency_max_ms": max(latencies) if latencies else 0.0,
+        "prompt_tokens": statistics.mean(prompt_tokens) if prompt_tokens else 0.0,
+        "output_tokens": statistics.mean(output_tokens) if output_tokens else 0.0,
+        "cost_per_1k_usd": 1000 * statistics.mean(costs) if costs else 0.0,
+    }
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    if gemini_service.get_model() is None and cassette.mode() != cassette.MODE_REPLAY:
+        sys.exit("Set GEMINI_API_KEY (or replay a cassette) to compare prompt variants.")
+
+    print(f"{'variant':<10}{'calls':>7}{'fail':>6}{'p50 ms':>9}{'max ms':>9}{'in tok':>8}{'out tok':>9}{'$/1k req':>10}")
+    for variant in gemini_service.PROMPT_VARIANTS:
+        r = run_variant(variant, SAMPLE_TEXTS, repeats)
+        print(f"{variant:<10}{r['calls']:>7}{r['failures']:>6}{r['latency_p50_ms']:>9.0f}{r['latency_max_ms']:>9.0f}"
+              f"{r['prompt_tokens']:>8.0f}{r['output_tokens']:>9.0f}{r['cost_per_1k_usd']:>10.4f}")
@@ -0,0 +1,57 @@
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import road_graph
+
+# Point-to-point query benchmark for the embedded router, on the graph given
+# on the command line or a synthetic city grid (arterials every 10th street).
+
+def write_city_grid(path, size=150, step=0.001, origin=(21.05, 79.00)):
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for r in range(size):
+            for c in range(size):
+                f.write(f'<node id="{r * size + c + 1}" lat="{origin[0] + r * step:.6f}" lon="{origin[1] + c * step:.6f}"/>\n')
+        way_id = 1
+        for r in range(size):
+            refs = "".join(f'<nd ref="{r * size + c + 1}"/>' for c in range(size))
+            highway = "primary" if r % 10 == 0 else "residential"
+            f.write(f'<way id="{way_id}">{refs}<tag k="highway" v="{highway}"/></way>\n')
+            way_id += 1
+        for c in range(size):
+            refs = "".join(f'<nd ref="{r * size + c + 1}"/>' for r in range(size))
+            highway = "secondary" if c % 10 == 0 else "residential"
+            f.write(f'<way id="{way_id}">{refs}<tag k="highway" v="{highway}"/></way>\n')
+            way_id += 1
+        f.write('</osm>\n')
+
+def time_queries(graph, queries=300, seed=1):
+    rng = random.Random(seed)
+    pairs = [(rng.randrange(graph.num_nodes), rng.randrange(graph.num_nodes)) for _ in range(queries)]
+    samples = []
+    for s, t in pairs:
+        start = time.perf_counter()
+        graph.shortest_path(s, t)
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        if len(sys.argv) > 1:
+            graph_path = sys.argv[1]
+        else:
+            extract = os.path.join(tmp, "city.osm")
+            graph_path = os.path.join(tmp, "city.bin")
+            write_city_grid(extract)
+            start = time.perf_counter()
+            road_graph.build_graph(extract, graph_path)
+            print(f"Preprocessing: {time.perf_counter() - start:.1f} s")
+        graph = road_graph.RoadGraph(graph_path)
+        samples = time_queries(graph)
+        ms = [s * 1000 for s in samples]
+        print(f"{graph.num_nodes} nodes, {len(ms)} random queries")
+        print(f"median {statistics.median(ms):.2f} ms, p90 {ms[int(len(ms) * 0.9)]:.2f} ms, max {ms[-1]:.2f} ms")
@@ -0,0 +1,66 @@
+import json
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+
+import server
+
+# Representative backend results: a normal assignment and an accident with responders
+NORMAL_RESULT = {
+    "message": "Help is coming from Sai Auto Garage",
+    "priority": "normal",
+    "mechanic_id": "4410923751",
+    "mechanic_name": "Sai Auto Garage",
+    "mechanic_phone": "+91 9822000000",
+    "mechanic_lat": 21.1407,
+    "mechanic_lon": 79.0887,
+    "eta_minutes": 6,
+    "status": "assigned",
+    "issue_type": "tyre",
+}
+ACCIDENT_RESULT = dict(
+    NORMAL_RESULT,
+    priority="emergency",
+    issue_type="accident",
+    message="Emergency assistance requested (hospital: Mayo Hospital, police: Sitabuldi Police Station, mechanic: Sai Auto Garage).",
+    emergency_services=[
+        {"category": c, "id": str(i), "name": n, "phone": "+91 9822000000", "lat": 21.14 + i / 1000, "lon": 79.08, "eta_minutes": 5 + i}
+        for i, (c, n) in enumerate([("hospital", "Mayo Hospital"), ("police", "Sitabuldi Police Station"), ("mechanic", "Sai Auto Garage")])
+    ],
+)
+
+def _route_field():
+    for route in server.app.routes:
+        if getattr(route, "path", None) == "/api/request-assistance":
+            return route.response_field
+    raise RuntimeError("request-assistance route not found")
+
+FIELD = _route_field()
+
+def old_path(result):
+    """
+    Previous behaviour: build the model, let FastAPI validate it again against
+    response_model, then jsonable-encode and json.dumps like JSONResponse.
+    """
+    model = server.AssistanceResponse(**result)
+    value, errors = FIELD.validate(model, {}, loc=("response",))
+    assert not errors
+    content = FIELD.serialize(value, by_alias=True)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def new_path(result):
+    return server.render_assistance_response(result).body
+
+def bench(name, fn, result, number=20000):
+    seconds = min(timeit.repeat(lambda: fn(result), number=number, repeat=5))
+    per_call_us = seconds / number * 1e6
+    print(f"{name:<28} {per_call_us:8.2f} us/request")
+    return per_call_us
+
+if __name__ == "__main__":
+    for label, result in (("normal", NORMAL_RESULT), ("accident", ACCIDENT_RESULT)):
+        assert json.loads(old_path(result)) == json.loads(new_path(result))
+        print(f"--- {label} response ---")
+        before = bench("before (double validation)", old_path, result)
+        after = bench("after (single validation)", new_path, result)
+        print(f"speedup: {before / after:.1f}x")
@@ -0,0 +1,45 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Import-time benchmark for server.py: wall time of a fresh interpreter
+# importing the app, plus the slowest imports from `python -X importtime`.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def time_import(module, runs=7):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], cwd=HERE, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def slowest_imports(module, top=15):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=HERE,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self_us | cumulative_us | <indent>name", nesting shown by indent
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # Skip the interpreter's own startup imports and the module itself
+        if 1 <= depth <= 3:
+            rows.append((int(cumulative_us), int(self_us), "  " * (depth - 1) + name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+if __name__ == "__main__":
+    module = sys.argv[1] if len(sys.argv) > 1 else "server"
+    baseline = statistics.median(time_import("sys", runs=5))
+    samples = time_import(module)
+    print(f"Interpreter startup: {baseline * 1000:.0f} ms")
+    print(f"import {module}: median {statistics.median(samples) * 1000:.0f} ms, "
+          f"min {min(samples) * 1000:.0f} ms over {len(samples)} runs")
+    print(f"\nSlowest imports under {module}:")
+    for cumulative_us, self_us, name in slowest_imports(module):
+        print(f"{cumulative_us / 1000:9.1f} ms  {name}")
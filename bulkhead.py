@@ -0,0 +1,110 @@
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Separate bounded pools per dependency, so a slow Gemini can't tie up the
+# threads that POI discovery and routing need. Each pool runs up to
+# `workers` calls and queues up to `queue` more; past that the policy
+# applies: "reject" raises BulkheadFull (the caller falls back), while
+# "caller_runs" runs the call on the submitting thread instead.
+POLICY_REJECT, POLICY_CALLER_RUNS = "reject", "caller_runs"
+
+# name: (workers, queue, policy); override with BULKHEAD_<NAME>_WORKERS/_QUEUE/_POLICY
+DEFAULT_BULKHEADS = {
+    "llm": (8, 16, POLICY_REJECT),
+    "poi": (6, 24, POLICY_CALLER_RUNS),
+    "routing": (6, 24, POLICY_CALLER_RUNS),
+}
+
+ACTIVE = metrics.Gauge("bulkhead_active", "Calls running in a bulkhead")
+QUEUED = metrics.Gauge("bulkhead_queued", "Calls waiting for a bulkhead worker")
+REJECTED = metrics.Counter("bulkhead_rejected_total", "Calls refused or run on the caller because a bulkhead was full, by policy")
+TIMEOUTS = metrics.Counter("bulkhead_timeouts_total", "Calls abandoned by the caller after their timeout")
+
+class BulkheadFull(Exception):
+    """
+    The bulkhead's workers and queue are all taken.
+    """
+
+class Bulkhead:
+    """
+    A thread pool with a bounded queue. Calls run in a copy of the
+    submitter's context, so the dispatch's upstream priority and trace carry over.
+    """
+
+    def __init__(self, name, workers, queue, policy=POLICY_REJECT):
+        if policy not in (POLICY_REJECT, POLICY_CALLER_RUNS):
+            raise ValueError(f"Unknown bulkhead policy {policy!r}")
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.policy = policy
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"bulkhead-{name}")
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule fn(*args, **kwargs); returns a Future.
+        """
+        context = contextvars.copy_context()
+        if not self._slots.acquire(blocking=False):
+            REJECTED.inc(bulkhead=self.name, policy=self.policy)
+            if self.policy == POLICY_REJECT:
+                raise BulkheadFull(f"Bulkhead {self.name} is full ({self.workers} running, {self.queue} queued)")
+            future = Future()
+            try:
+                future.set_result(context.run(fn, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        QUEUED.inc(bulkhead=self.name)
+        def run():
+            QUEUED.dec(bulkhead=self.name)
+            ACTIVE.inc(bulkhead=self.name)
+            try:
+                return context.run(fn, *args, **kwargs)
+            finally:
+                ACTIVE.dec(bulkhead=self.name)
+                self._slots.release()
+        return self._executor.submit(run)
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        """
+        Run fn in the bulkhead and wait for it. On timeout the call keeps its
+        worker until it finishes, but the caller gets TimeoutError right away.
+        """
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            TIMEOUTS.inc(bulkhead=self.name)
+            raise
+
+_bulkheads = {}
+_bulkheads_lock = threading.Lock()
+
+def get(name):
+    """
+    The bulkhead for a dependency, created on first use.
+    """
+    bulkhead = _bulkheads.get(name)
+    if bulkhead is None:
+        with _bulkheads_lock:
+            bulkhead = _bulkheads.get(name)
+            if bulkhead is None:
+                workers, queue, policy = DEFAULT_BULKHEADS.get(name, (4, 16, POLICY_REJECT))
+                prefix = f"BULKHEAD_{name.upper()}"
+                bulkhead = _bulkheads[name] = Bulkhead(
+                    name,
+                    int(os.getenv(f"{prefix}_WORKERS", workers)),
+                    int(os.getenv(f"{prefix}_QUEUE", queue)),
+                    os.getenv(f"{prefix}_POLICY", policy),
+                )
+    return bulkhead
@@ -0,0 +1,115 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Record/replay of upstream (Gemini, Overpass, OSRM) responses, so the
+# dispatch pipeline can be benchmarked offline and deterministically.
+#   record: call upstream, append {upstream, key, elapsed, result|error}
+#   replay: serve the recorded result, sleeping the recorded time or not at all
+MODE_OFF, MODE_RECORD, MODE_REPLAY = "off", "record", "replay"
+LATENCY_RECORDED, LATENCY_ZERO = "recorded", "zero"
+
+class CassetteMiss(Exception):
+    """
+    Replay mode found no recording for this call; callers treat it like an
+    upstream failure and fall back.
+    """
+
+class ReplayedError(Exception):
+    """
+    The recorded call failed; replayed with the original error message.
+    """
+
+_mode = os.getenv("UPSTREAM_CASSETTE_MODE", MODE_OFF)
+_path = os.getenv("UPSTREAM_CASSETTE_PATH", "upstream_cassette.jsonl.gz")
+_latency = os.getenv("UPSTREAM_CASSETTE_LATENCY", LATENCY_RECORDED)
+_lock = threading.Lock()
+_recordings = None
+_cursors = {}
+_writer = None
+
+def configure(mode=None, path=None, latency=None):
+    """
+    Override the UPSTREAM_CASSETTE_* settings, e.g. from a benchmark script.
+    """
+    global _mode, _path, _latency, _recordings
+    close()
+    with _lock:
+        _mode = mode or _mode
+        _path = path or _path
+        _latency = latency or _latency
+        _recordings = None
+        _cursors.clear()
+
+def mode():
+    return _mode
+
+def _load():
+    global _recordings
+    recordings = {}
+    if os.path.exists(_path):
+        with gzip.open(_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                recordings.setdefault((entry["upstream"], entry["key"]), []).append(entry)
+    logger.info("Loaded %d recorded upstream calls from %s", sum(map(len, recordings.values())), _path)
+    _recordings = recordings
+
+def _append(entry):
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = gzip.open(_path, "at", encoding="utf-8")
+        _writer.write(json.dumps(entry) + "\n")
+
+def close():
+    """
+    Flush and close the recording file.
+    """
+    global _writer
+    with _lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+
+atexit.register(close)
+
+def call(upstream, key, fn):
+    """
+    Run fn() (which must return JSON-serializable data) through the cassette.
+    key identifies the request, e.g. the query or URL.
+    """
+    if _mode == MODE_RECORD:
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            _append({"upstream": upstream, "key": key, "elapsed": time.perf_counter() - start, "error": str(e)})
+            raise
+        _append({"upstream": upstream, "key": key, "elapsed": time.perf_counter() - start, "result": result})
+        return result
+
+    if _mode == MODE_REPLAY:
+        with _lock:
+            if _recordings is None:
+                _load()
+            entries = _recordings.get((upstream, key))
+            if not entries:
+                raise CassetteMiss(f"No recording for {upstream} call {key[:80]!r}")
+            # Repeated identical calls cycle through their recordings in order
+            cursor = _cursors.get((upstream, key), 0)
+            _cursors[(upstream, key)] = cursor + 1
+            entry = entries[cursor % len(entries)]
+        if _latency == LATENCY_RECORDED:
+            time.sleep(entry["elapsed"])
+        if "error" in entry:
+            raise ReplayedError(entry["error"])
+        return entry["result"]
+
+    return fn()
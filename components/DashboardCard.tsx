@@ -93,6 +93,7 @@ const DashboardCard: React.FC<DashboardCardProps> = ({ request, status, onCancel
                 userLoc={userLocation}
                 mechanicLoc={{ lat: request.mechanic.lat, lng: request.mechanic.lon }}
                 mechanicName={request.mechanic.name}
+                routePolyline={request.mechanic.routePolyline}
               />
             )}
 
@@ -1,7 +1,8 @@
-import React, { useEffect } from 'react';
-import { MapContainer, TileLayer, Marker, Popup, useMap } from 'react-leaflet';
+import React, { useEffect, useMemo } from 'react';
+import { MapContainer, TileLayer, Marker, Popup, Polyline, useMap } from 'react-leaflet';
 import L from 'leaflet';
 import 'leaflet/dist/leaflet.css';
+import { decodePolyline } from '../services/polyline';
 
 // Fix for default marker icons in Leaflet with React
 // @ts-ignore
@@ -16,21 +17,24 @@ interface MapDisplayProps {
     userLoc: { lat: number; lng: number };
     mechanicLoc: { lat: number; lng: number };
     mechanicName: string;
+    // Encoded route from the mechanic to the user, if the backend returned one
+    routePolyline?: string;
 }
 
 // Component to handle auto-fitting the map to show both markers
-const RecenterMap: React.FC<{ userLoc: [number, number], mechanicLoc: [number, number] }> = ({ userLoc, mechanicLoc }) => {
+const RecenterMap: React.FC<{ userLoc: [number, number], mechanicLoc: [number, number], route?: [number, number][] }> = ({ userLoc, mechanicLoc, route }) => {
     const map = useMap();
     useEffect(() => {
-        const bounds = L.latLngBounds([userLoc, mechanicLoc]);
+        const bounds = L.latLngBounds([userLoc, mechanicLoc, ...(route || [])]);
         map.fitBounds(bounds, { padding: [50, 50] });
-    }, [map, userLoc, mechanicLoc]);
+    }, [map, userLoc, mechanicLoc, route]);
     return null;
 };
 
-const MapDisplay: React.FC<MapDisplayProps> = ({ userLoc, mechanicLoc, mechanicName }) => {
+const MapDisplay: React.FC<MapDisplayProps> = ({ userLoc, mechanicLoc, mechanicName, routePolyline }) => {
     const userPos: [number, number] = [userLoc.lat, userLoc.lng];
     const mechPos: [number, number] = [mechanicLoc.lat, mechanicLoc.lng];
+    const route = useMemo(() => (routePolyline ? decodePolyline(routePolyline) : undefined), [routePolyline]);
 
     return (
         <div className="w-full h-64 rounded-2xl overflow-hidden border-2 border-slate-100 shadow-inner relative z-10">
@@ -58,7 +62,9 @@ const MapDisplay: React.FC<MapDisplayProps> = ({ userLoc, mechanicLoc, mechanicN
                     </Popup>
                 </Marker>
 
-                <RecenterMap userLoc={userPos} mechanicLoc={mechPos} />
+                {route && <Polyline positions={route} pathOptions={{ color: '#ea580c', weight: 4 }} />}
+
+                <RecenterMap userLoc={userPos} mechanicLoc={mechPos} route={route} />
             </MapContainer>
         </div>
     );
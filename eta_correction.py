@@ -0,0 +1,264 @@
+import array
+import logging
+import math
+import os
+import queue
+import struct
+import threading
+import time
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process file locks (Windows); run a single worker there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Routing ETAs are free-flow times. Reported arrivals are aggregated into a
+# correction factor per ~1 km tile and hour of the week (168 slots), as the
+# mean log of observed / predicted minutes. Sparse tiles are shrunk towards
+# the city-wide factor for the same hour, which is shrunk towards 1.
+# Every worker process shares one file: a worker adds the arrivals it saw
+# since its last save to what is on disk, under a file lock, and idle workers
+# reload the file when another worker has changed it.
+ETA_CORRECTION_PATH = os.getenv("ETA_CORRECTION_PATH", "eta_correction.bin")
+ETA_CORRECTION_RELOAD_SECONDS = float(os.getenv("ETA_CORRECTION_RELOAD_SECONDS", 60))
+# Hour-of-week is local time; Nagpur is UTC+5:30
+ETA_CORRECTION_UTC_OFFSET_HOURS = float(os.getenv("ETA_CORRECTION_UTC_OFFSET_HOURS", 5.5))
+TILE_DEGREES = 0.01
+HOURS_PER_WEEK = 168
+# Pseudo-observations at the parent factor; more data is needed to move further from it
+PRIOR_WEIGHT = 5.0
+# Observed / predicted ratios outside this range are treated as bad reports
+MIN_RATIO, MAX_RATIO = 0.25, 6.0
+FACTOR_RANGE = (0.5, 4.0)
+
+MAGIC = b"ETC1"
+VERSION = 1
+# magic, version, tiles, tile_degrees
+HEADER = struct.Struct("<4sHId")
+TILE = struct.Struct("<ii")
+
+ETA_OBSERVATIONS = metrics.Counter("eta_observations_total", "Reported arrivals by outcome (used, rejected, dropped)")
+ETA_OBSERVED_RATIO = metrics.Histogram(
+    "eta_observed_ratio", "Observed / predicted travel time of reported arrivals",
+    buckets=(0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 3.0, 4.0),
+)
+
+def hour_of_week(ts=None):
+    t = time.gmtime((time.time() if ts is None else ts) + ETA_CORRECTION_UTC_OFFSET_HOURS * 3600)
+    return t.tm_wday * 24 + t.tm_hour
+
+def tile_of(lat, lon, tile_degrees=TILE_DEGREES):
+    return math.floor(lat / tile_degrees), math.floor(lon / tile_degrees)
+
+class EtaCorrection:
+    """
+    Per tile: sums of log(observed / predicted) and observation counts, one
+    slot per hour of the week, plus the same arrays for the whole city.
+    """
+
+    def __init__(self, tile_degrees=TILE_DEGREES):
+        self.tile_degrees = tile_degrees
+        self.global_sums = array.array('f', [0.0]) * HOURS_PER_WEEK
+        self.global_counts = array.array('I', [0]) * HOURS_PER_WEEK
+        self.tiles = {}
+
+    def observe(self, lat, lon, predicted_minutes, observed_minutes, ts):
+        """
+        Add one arrival; returns False if the ratio is implausible.
+        """
+        if predicted_minutes <= 0 or observed_minutes <= 0:
+            return False
+        ratio = observed_minutes / predicted_minutes
+        if not MIN_RATIO <= ratio <= MAX_RATIO:
+            return False
+        how = hour_of_week(ts)
+        key = tile_of(lat, lon, self.tile_degrees)
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = self.tiles[key] = (array.array('f', [0.0]) * HOURS_PER_WEEK, array.array('I', [0]) * HOURS_PER_WEEK)
+        log_ratio = math.log(ratio)
+        tile[0][how] += log_ratio
+        tile[1][how] += 1
+        self.global_sums[how] += log_ratio
+        self.global_counts[how] += 1
+        return True
+
+    def factor(self, lat, lon, ts=None):
+        how = hour_of_week(ts)
+        global_log = self.global_sums[how] / (self.global_counts[how] + PRIOR_WEIGHT)
+        tile = self.tiles.get(tile_of(lat, lon, self.tile_degrees))
+        if tile is None:
+            log_factor = global_log
+        else:
+            log_factor = (tile[0][how] + PRIOR_WEIGHT * global_log) / (tile[1][how] + PRIOR_WEIGHT)
+        return min(max(math.exp(log_factor), FACTOR_RANGE[0]), FACTOR_RANGE[1])
+
+    def merge(self, other):
+        """
+        Add other's observations to this model's.
+        """
+        if other.tile_degrees != self.tile_degrees:
+            raise ValueError("Can't merge ETA corrections with different tile sizes")
+        for how in range(HOURS_PER_WEEK):
+            self.global_sums[how] += other.global_sums[how]
+            self.global_counts[how] += other.global_counts[how]
+        for key, (sums, counts) in other.tiles.items():
+            tile = self.tiles.get(key)
+            if tile is None:
+                self.tiles[key] = (array.array('f', sums), array.array('I', counts))
+                continue
+            for how in range(HOURS_PER_WEEK):
+                tile[0][how] += sums[how]
+                tile[1][how] += counts[how]
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self.tiles), self.tile_degrees))
+            self.global_sums.tofile(f)
+            self.global_counts.tofile(f)
+            for (ty, tx), (sums, counts) in list(self.tiles.items()):
+                f.write(TILE.pack(ty, tx))
+                sums.tofile(f)
+                counts.tofile(f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            magic, version, n_tiles, tile_degrees = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not an ETA correction file")
+            model = cls(tile_degrees)
+            model.global_sums = array.array('f')
+            model.global_sums.fromfile(f, HOURS_PER_WEEK)
+            model.global_counts = array.array('I')
+            model.global_counts.fromfile(f, HOURS_PER_WEEK)
+            for _ in range(n_tiles):
+                key = TILE.unpack(f.read(TILE.size))
+                sums, counts = array.array('f'), array.array('I')
+                sums.fromfile(f, HOURS_PER_WEEK)
+                counts.fromfile(f, HOURS_PER_WEEK)
+                model.tiles[key] = (sums, counts)
+        return model
+
+_model = EtaCorrection()
+# Arrivals observed by this process and not yet added to the file
+_unsaved = EtaCorrection()
+_file_version = None
+_queue = queue.Queue(maxsize=10000)
+_worker = None
+
+def _version(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = f"{path}.lock"
+        self._f = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._f = open(self.path, "a")
+            fcntl.flock(self._f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._f is not None:
+            fcntl.flock(self._f, fcntl.LOCK_UN)
+            self._f.close()
+            self._f = None
+
+def _sync(path=ETA_CORRECTION_PATH):
+    """
+    Add this process's unsaved arrivals to the file, then serve the merged
+    factors, which include every other worker's saved arrivals.
+    """
+    global _model, _unsaved, _file_version
+    with _FileLock(path):
+        merged = EtaCorrection.load(path) if os.path.exists(path) else EtaCorrection(_unsaved.tile_degrees)
+        merged.merge(_unsaved)
+        merged.save(path)
+        _file_version = _version(path)
+    _model, _unsaved = merged, EtaCorrection(merged.tile_degrees)
+
+def _reload(path=ETA_CORRECTION_PATH):
+    """
+    Pick up arrivals other workers saved since this process last read the file.
+    """
+    global _model, _file_version
+    version = _version(path)
+    if version is None or version == _file_version:
+        return False
+    model = EtaCorrection.load(path)
+    model.merge(_unsaved)
+    _model, _file_version = model, version
+    return True
+
+def correct(minutes, location, ts=None):
+    """
+    A free-flow ETA in minutes adjusted for the location and time of week.
+    """
+    if minutes is None or minutes < 0 or not location:
+        return minutes
+    return max(1, round(minutes * _model.factor(location['lat'], location['lon'], ts)))
+
+def record_arrival(location, predicted_minutes, assigned_at, arrived_at=None):
+    """
+    Queue a reported arrival for the aggregator; never blocks the caller.
+    predicted_minutes is the uncorrected ETA given at assigned_at (epoch seconds).
+    """
+    arrived_at = time.time() if arrived_at is None else arrived_at
+    try:
+        _queue.put_nowait((location['lat'], location['lon'], predicted_minutes, (arrived_at - assigned_at) / 60, assigned_at))
+    except queue.Full:
+        ETA_OBSERVATIONS.inc(outcome="dropped")
+
+def _run_worker():
+    while True:
+        try:
+            lat, lon, predicted, observed, ts = _queue.get(timeout=ETA_CORRECTION_RELOAD_SECONDS)
+        except queue.Empty:
+            try:
+                _reload(ETA_CORRECTION_PATH)
+            except Exception as e:
+                logger.error("Failed to reload ETA corrections %s: %s", ETA_CORRECTION_PATH, e)
+            continue
+        if _model.observe(lat, lon, predicted, observed, ts):
+            _unsaved.observe(lat, lon, predicted, observed, ts)
+            ETA_OBSERVATIONS.inc(outcome="used")
+            ETA_OBSERVED_RATIO.observe(observed / predicted)
+        else:
+            ETA_OBSERVATIONS.inc(outcome="rejected")
+        # Persist once a burst of reports has been folded in
+        if _queue.empty():
+            try:
+                _sync(ETA_CORRECTION_PATH)
+            except Exception as e:
+                # The arrivals stay unsaved and go out with the next save
+                logger.error("Failed to save ETA corrections to %s: %s", ETA_CORRECTION_PATH, e)
+
+def start_background_aggregator():
+    """
+    Load saved corrections and start the thread that folds in reported arrivals.
+    """
+    global _worker
+    if _worker is not None:
+        return
+    if os.path.exists(ETA_CORRECTION_PATH):
+        try:
+            _reload(ETA_CORRECTION_PATH)
+            logger.info("Loaded ETA corrections for %d tiles from %s", len(_model.tiles), ETA_CORRECTION_PATH)
+        except Exception as e:
+            logger.error("Failed to load ETA corrections %s: %s", ETA_CORRECTION_PATH, e)
+    _worker = threading.Thread(target=_run_worker, name="eta-correction", daemon=True)
+    _worker.start()
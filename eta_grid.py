@@ -0,0 +1,247 @@
+import array
+import json
+import logging
+import math
+import os
+import queue
+import struct
+import threading
+from collections import OrderedDict
+
+import osrm_service
+import upstream_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Travel-time grids from each service hub (mechanic shop) to a lattice of
+# points around it. osrm_eta interpolates in these instead of calling OSRM.
+ETA_GRID_DIR = os.getenv("ETA_GRID_DIR", "eta_grids")
+ETA_HUBS_PATH = os.getenv("ETA_HUBS_PATH", "eta_hubs.json")
+GRID_RADIUS_KM = float(os.getenv("ETA_GRID_RADIUS_KM", 10))
+GRID_STEP_DEGREES = float(os.getenv("ETA_GRID_STEP_DEGREES", 0.005))
+# Each grid costs ~15 OSRM table calls and ~3 KB; hubs learned from dispatch
+# are kept as an LRU (in memory and on disk), configured hubs are never evicted
+ETA_GRID_MAX_HUBS = int(os.getenv("ETA_GRID_MAX_HUBS", 200))
+
+# Durations are stored as uint16 seconds; this marks unreachable cells
+UNREACHABLE = 0xFFFF
+HEADER = struct.Struct("<4sdddddII")
+MAGIC = b"ETG1"
+
+_grids = OrderedDict()
+_grids_lock = threading.Lock()
+# Keys of the hubs listed in ETA_HUBS_PATH
+_pinned = set()
+_pending = set()
+_queue = queue.Queue()
+_worker = None
+
+def hub_key(loc):
+    """
+    Hubs are identified by their coordinates rounded to ~10 m.
+    """
+    return f"{loc['lat']:.4f}_{loc['lon']:.4f}"
+
+class EtaGrid:
+    """
+    Durations (seconds) from one hub to a regular lat/lon lattice around it.
+    """
+
+    def __init__(self, hub_lat, hub_lon, min_lat, min_lon, step, rows, cols, durations):
+        self.hub_lat = hub_lat
+        self.hub_lon = hub_lon
+        self.min_lat = min_lat
+        self.min_lon = min_lon
+        self.step = step
+        self.rows = rows
+        self.cols = cols
+        self.durations = durations
+
+    @classmethod
+    def around(cls, hub, radius_km=GRID_RADIUS_KM, step=GRID_STEP_DEGREES):
+        """
+        Empty grid (all unreachable) centered on hub.
+        """
+        half_lat = radius_km / 111.0
+        half_lon = radius_km / (111.0 * math.cos(math.radians(hub['lat'])))
+        rows = int(2 * half_lat / step) + 1
+        cols = int(2 * half_lon / step) + 1
+        durations = array.array('H', [UNREACHABLE]) * (rows * cols)
+        return cls(hub['lat'], hub['lon'], hub['lat'] - half_lat, hub['lon'] - half_lon, step, rows, cols, durations)
+
+    def points(self):
+        return [
+            {"lat": self.min_lat + r * self.step, "lon": self.min_lon + c * self.step}
+            for r in range(self.rows) for c in range(self.cols)
+        ]
+
+    def lookup_seconds(self, lat, lon):
+        """
+        Bilinear interpolation between the four surrounding lattice points.
+        Returns None outside the grid or next to an unreachable point.
+        """
+        y = (lat - self.min_lat) / self.step
+        x = (lon - self.min_lon) / self.step
+        r, c = int(math.floor(y)), int(math.floor(x))
+        if r < 0 or c < 0 or r + 1 >= self.rows or c + 1 >= self.cols:
+            return None
+        d = self.durations
+        i = r * self.cols + c
+        v00, v01, v10, v11 = d[i], d[i + 1], d[i + self.cols], d[i + self.cols + 1]
+        if UNREACHABLE in (v00, v01, v10, v11):
+            return None
+        fy, fx = y - r, x - c
+        top = v00 * (1 - fx) + v01 * fx
+        bottom = v10 * (1 - fx) + v11 * fx
+        return top * (1 - fy) + bottom * fy
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.hub_lat, self.hub_lon, self.min_lat, self.min_lon, self.step, self.rows, self.cols))
+            self.durations.tofile(f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            magic, hub_lat, hub_lon, min_lat, min_lon, step, rows, cols = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an ETA grid file")
+            durations = array.array('H')
+            durations.fromfile(f, rows * cols)
+        return cls(hub_lat, hub_lon, min_lat, min_lon, step, rows, cols, durations)
+
+def build_grid(hub, radius_km=GRID_RADIUS_KM, step=GRID_STEP_DEGREES):
+    """
+    Compute the travel-time grid for one hub with a one-to-many query.
+    """
+    grid = EtaGrid.around(hub, radius_km, step)
+    seconds = osrm_service.get_durations(hub, grid.points())
+    for i, s in enumerate(seconds):
+        if s is not None:
+            grid.durations[i] = min(int(round(s)), UNREACHABLE - 1)
+    return grid
+
+def lookup(origin, destination):
+    """
+    Interpolated ETA in minutes from a hub to destination, or None if origin
+    is not a known hub or destination is outside its grid.
+    """
+    key = hub_key(origin)
+    with _grids_lock:
+        grid = _grids.get(key)
+        if grid is None:
+            return None
+        _grids.move_to_end(key)
+    seconds = grid.lookup_seconds(destination['lat'], destination['lon'])
+    if seconds is None:
+        return None
+    return round(seconds / 60)
+
+def _grid_path(key, directory=ETA_GRID_DIR):
+    return os.path.join(directory, f"{key}.grid")
+
+def _store_grid(key, grid, directory=ETA_GRID_DIR):
+    """
+    Add a grid and evict least recently used unpinned grids past the cap,
+    removing their files. Call with _grids_lock held.
+    """
+    _grids[key] = grid
+    _grids.move_to_end(key)
+    if len(_grids) <= ETA_GRID_MAX_HUBS:
+        return
+    for old in [k for k in _grids if k not in _pinned][:len(_grids) - ETA_GRID_MAX_HUBS]:
+        del _grids[old]
+        try:
+            os.remove(_grid_path(old, directory))
+        except FileNotFoundError:
+            pass
+
+def is_known(hub):
+    """
+    True if hub already has a grid or one is being built.
+    """
+    key = hub_key(hub)
+    with _grids_lock:
+        return key in _grids or key in _pending
+
+def upstream_calls(hub, radius_km=GRID_RADIUS_KM, step=GRID_STEP_DEGREES):
+    """
+    OSRM table requests building hub's grid takes; 0 with the local road graph.
+    """
+    if osrm_service.get_local_graph():
+        return 0
+    grid = EtaGrid.around(hub, radius_km, step)
+    return math.ceil(grid.rows * grid.cols / osrm_service.OSRM_TABLE_MAX_DESTINATIONS)
+
+def register_hub(hub):
+    """
+    Queue a hub for background grid computation (no-op if known or queued).
+    Only mechanic shops are hubs; callers pass car_repair POIs.
+    """
+    key = hub_key(hub)
+    with _grids_lock:
+        if key in _grids or key in _pending:
+            return
+        _pending.add(key)
+    _queue.put({"lat": hub['lat'], "lon": hub['lon']})
+
+def _run_worker():
+    # Grid builds must not hold up dispatches' own OSRM calls
+    upstream_scheduler.set_priority("low")
+    while True:
+        hub = _queue.get()
+        key = hub_key(hub)
+        try:
+            grid = build_grid(hub)
+            os.makedirs(ETA_GRID_DIR, exist_ok=True)
+            grid.save(_grid_path(key))
+            with _grids_lock:
+                _store_grid(key, grid)
+            logger.info("Built ETA grid for hub %s (%dx%d)", key, grid.rows, grid.cols)
+        except Exception as e:
+            logger.error("Failed to build ETA grid for hub %s: %s", key, e)
+        finally:
+            with _grids_lock:
+                _pending.discard(key)
+
+def load_grids(directory=ETA_GRID_DIR):
+    """
+    Load previously built grids from disk.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    loaded = 0
+    # Oldest first, so the most recently built grids survive the cap
+    names = sorted((n for n in os.listdir(directory) if n.endswith(".grid")),
+                   key=lambda n: os.path.getmtime(os.path.join(directory, n)))
+    for name in names:
+        try:
+            grid = EtaGrid.load(os.path.join(directory, name))
+        except Exception as e:
+            logger.error("Failed to load ETA grid %s: %s", name, e)
+            continue
+        with _grids_lock:
+            _store_grid(hub_key({"lat": grid.hub_lat, "lon": grid.hub_lon}), grid, directory)
+        loaded += 1
+    return loaded
+
+def start_background_builder():
+    """
+    Load grids from disk, queue the configured hubs and start the builder thread.
+    Hubs seen during dispatch are queued later through register_hub.
+    """
+    global _worker
+    if _worker is not None:
+        return
+    hubs = []
+    if os.path.exists(ETA_HUBS_PATH):
+        with open(ETA_HUBS_PATH) as f:
+            hubs = json.load(f)
+    _pinned.update(hub_key(hub) for hub in hubs)
+    logger.info("Loaded %d ETA grids from %s", load_grids(), ETA_GRID_DIR)
+    for hub in hubs:
+        register_hub(hub)
+    _worker = threading.Thread(target=_run_worker, name="eta-grid-builder", daemon=True)
+    _worker.start()
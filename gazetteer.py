@@ -0,0 +1,282 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import metrics
+import osm_extract
+
+logger = logging.getLogger(__name__)
+
+# Offline landmark lookup built from OSM names, so "near zero mile" can be
+# resolved to coordinates in-process when the user has no GPS fix. Names are
+# matched exactly, then as a prefix (trie), then fuzzily (trigram candidates
+# ranked by edit distance). Free text often runs on past the landmark ("near
+# zero mile with a flat tyre"), so when the whole text doesn't match, the
+# longest leading run of words that does is used.
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "gazetteer.json")
+GAZETTEER_MIN_SCORE = float(os.getenv("GAZETTEER_MIN_SCORE", 0.8))
+# A prefix has to cover most of the name: "home" must not become "Home Needs Store"
+GAZETTEER_MIN_PREFIX_SCORE = float(os.getenv("GAZETTEER_MIN_PREFIX_SCORE", 0.6))
+# One typo in a short everyday word ("stuck" / "Stock") is a different word, not a landmark
+FUZZY_MIN_LENGTH = 6
+# Longest leading run of words tried as a landmark name
+GAZETTEER_MAX_WORDS = int(os.getenv("GAZETTEER_MAX_WORDS", 6))
+NAME_TAGS = ("name", "name:en", "alt_name", "old_name", "short_name")
+# Entries that make good landmarks win ties between equally good matches
+KIND_PRIORITY = ("place", "historic", "tourism", "railway", "amenity", "leisure", "shop", "highway")
+# Completions kept per trie node
+TRIE_LIMIT = 20
+# Fuzzy candidates scored with edit distance
+FUZZY_CANDIDATES = 50
+
+GAZETTEER_LOOKUPS = metrics.Counter("gazetteer_lookups_total", "Landmark lookups by how they matched (exact, prefix, fuzzy, none)")
+GAZETTEER_SECONDS = metrics.Histogram(
+    "gazetteer_lookup_seconds", "Time to resolve one landmark text",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_LEADING_FILLER = re.compile(r"^(?:the|a|an)\s+")
+
+def normalize(text):
+    text = _NON_ALNUM.sub(" ", (text or "").lower()).strip()
+    return _LEADING_FILLER.sub("", text)
+
+def _trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _kind(tags):
+    for key in KIND_PRIORITY:
+        if key in tags:
+            return f"{key}={tags[key]}"
+    return ""
+
+def _rank(kind):
+    key = kind.split("=", 1)[0]
+    return KIND_PRIORITY.index(key) if key in KIND_PRIORITY else len(KIND_PRIORITY)
+
+def _names(tags):
+    seen = []
+    for tag in NAME_TAGS:
+        for value in (tags.get(tag) or "").split(";"):
+            value = value.strip()
+            if value and value not in seen:
+                seen.append(value)
+    return seen
+
+def edit_distance(a, b, limit=None):
+    """
+    Levenshtein distance; stops early and returns limit + 1 once it is exceeded.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def build_gazetteer(extract_path, output_path, bbox=None):
+    """
+    Collect named nodes and named ways (at the centroid of their nodes) from
+    an OSM extract into a gazetteer file. Returns the number of entries.
+    """
+    entries = []
+    way_names = []
+    needed = set()
+    for el in osm_extract.iter_elements(extract_path):
+        names = _names(el['tags'])
+        if not names:
+            continue
+        if el['type'] == 'node':
+            if osm_extract.in_bbox(el['lat'], el['lon'], bbox):
+                entries.extend((name, el['lat'], el['lon'], _kind(el['tags'])) for name in names)
+        elif el['refs']:
+            way_names.append((names, el['refs'], _kind(el['tags'])))
+            needed.update(el['refs'])
+
+    coords = {}
+    if needed:
+        for el in osm_extract.iter_elements(extract_path):
+            if el['type'] == 'node' and el['id'] in needed:
+                coords[el['id']] = (el['lat'], el['lon'])
+    for names, refs, kind in way_names:
+        points = [coords[r] for r in refs if r in coords]
+        if not points:
+            continue
+        lat = sum(p[0] for p in points) / len(points)
+        lon = sum(p[1] for p in points) / len(points)
+        if osm_extract.in_bbox(lat, lon, bbox):
+            entries.extend((name, lat, lon, kind) for name in names)
+
+    # A street is split into many ways; keep one entry per name and kind, best ranked first
+    unique = {}
+    for name, lat, lon, kind in entries:
+        unique.setdefault((normalize(name), kind), (name, round(lat, 6), round(lon, 6), kind))
+    rows = sorted(unique.values(), key=lambda e: (_rank(e[3]), e[0]))
+
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"entries": rows}, f)
+    os.replace(tmp_path, output_path)
+    logger.info("Wrote gazetteer with %d names to %s", len(rows), output_path)
+    return len(rows)
+
+class Gazetteer:
+    """
+    In-memory name indexes over a gazetteer file. Entries are ordered best
+    landmark kind first, so lower ids win ties.
+    """
+
+    def __init__(self, entries):
+        self.entries = [tuple(e) for e in entries]
+        self.normalized = [normalize(e[0]) for e in self.entries]
+        self._exact = {}
+        self._trie = {}
+        self._trigrams = {}
+        for i, name in enumerate(self.normalized):
+            if not name:
+                continue
+            self._exact.setdefault(name, i)
+            node = self._trie
+            for ch in name:
+                node = node.setdefault(ch, {})
+                ids = node.setdefault("", [])
+                if len(ids) < TRIE_LIMIT:
+                    ids.append(i)
+            for gram in _trigrams(name):
+                self._trigrams.setdefault(gram, []).append(i)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f)["entries"])
+
+    def _result(self, i, score, match):
+        name, lat, lon, kind = self.entries[i]
+        return {"name": name, "lat": lat, "lon": lon, "kind": kind, "score": round(score, 3), "match": match}
+
+    def _prefix(self, query):
+        node = self._trie
+        for ch in query:
+            node = node.get(ch)
+            if node is None:
+                return None
+        ids = node.get("")
+        if not ids:
+            return None
+        # The completion closest in length to what was typed
+        return min(ids, key=lambda i: (len(self.normalized[i]), i))
+
+    def _fuzzy(self, query, min_score):
+        counts = {}
+        for gram in _trigrams(query):
+            for i in self._trigrams.get(gram, ()):
+                counts[i] = counts.get(i, 0) + 1
+        candidates = sorted(counts, key=lambda i: (-counts[i], i))[:FUZZY_CANDIDATES]
+        best, best_score = None, min_score
+        for i in candidates:
+            name = self.normalized[i]
+            longest = max(len(name), len(query))
+            limit = int(longest * (1 - best_score))
+            score = 1 - edit_distance(query, name, limit) / longest
+            if score > best_score or (score == best_score and best is None):
+                best, best_score = i, score
+        return best, best_score
+
+    def _match(self, query, min_score):
+        i = self._exact.get(query)
+        if i is not None:
+            return self._result(i, 1.0, "exact")
+        i = self._prefix(query)
+        if i is not None and len(query) >= 4:
+            score = len(query) / len(self.normalized[i])
+            if score >= min(min_score, GAZETTEER_MIN_PREFIX_SCORE):
+                return self._result(i, score, "prefix")
+        i, score = self._fuzzy(query, min_score) if len(query) >= FUZZY_MIN_LENGTH else (None, 0.0)
+        if i is not None:
+            return self._result(i, score, "fuzzy")
+        return None
+
+    def resolve(self, text, min_score=GAZETTEER_MIN_SCORE):
+        """
+        Best entry for a landmark text, as {name, lat, lon, kind, score, match},
+        or None if nothing scores at least min_score. Falls back to the longest
+        leading run of words that matches.
+        """
+        start = time.perf_counter()
+        try:
+            query = normalize(text)
+            if not query:
+                return None
+            words = query.split(" ")
+            result = self._match(query, min_score)
+            for n in range(min(len(words) - 1, GAZETTEER_MAX_WORDS), 0, -1):
+                if result is not None:
+                    break
+                result = self._match(" ".join(words[:n]), min_score)
+            GAZETTEER_LOOKUPS.inc(match=result["match"] if result else "none")
+            return result
+        finally:
+            GAZETTEER_SECONDS.observe(time.perf_counter() - start)
+
+_gazetteer = None
+_gazetteer_loaded = False
+_gazetteer_lock = threading.Lock()
+
+def get_gazetteer():
+    """
+    The gazetteer at GAZETTEER_PATH, loaded once; None if there is none.
+    """
+    global _gazetteer, _gazetteer_loaded
+    if not _gazetteer_loaded:
+        with _gazetteer_lock:
+            if not _gazetteer_loaded:
+                try:
+                    _gazetteer = Gazetteer.load(GAZETTEER_PATH)
+                    logger.info("Loaded gazetteer %s (%d names)", GAZETTEER_PATH, len(_gazetteer.entries))
+                except FileNotFoundError:
+                    _gazetteer = None
+                except Exception as e:
+                    logger.error("Failed to load gazetteer %s: %s", GAZETTEER_PATH, e)
+                    _gazetteer = None
+                _gazetteer_loaded = True
+    return _gazetteer
+
+def resolve(text):
+    """
+    Resolve landmark text with the shared gazetteer; None if unavailable or unmatched.
+    """
+    gazetteer = get_gazetteer()
+    return gazetteer.resolve(text) if gazetteer and text else None
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build or query the landmark gazetteer")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build from a local OSM extract")
+    build.add_argument("extract")
+    build.add_argument("output", nargs="?", default=GAZETTEER_PATH)
+    build.add_argument("--bbox", help="min_lat,min_lon,max_lat,max_lon")
+    lookup = sub.add_parser("lookup", help="resolve a landmark text")
+    lookup.add_argument("text")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_gazetteer(args.extract, args.output, bbox=osm_extract.parse_bbox(args.bbox))
+    else:
+        start = time.perf_counter()
+        result = resolve(args.text)
+        print(result, f"({(time.perf_counter() - start) * 1000:.3f} ms)")
@@ -1,41 +1,32 @@
 import os
 import json
 import logging
-import google.generativeai as genai
-from dotenv import load_dotenv
+import threading
+import time
 
-# Load environment variables
-load_dotenv()
-load_dotenv(".env.local")
+import bulkhead
+import cassette
+import metrics
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Initialize Gemini
-api_key = os.getenv("GEMINI_API_KEY") or os.getenv("VITE_GEMINI_API_KEY")
+# Using a reliable model version from the available list
+MODEL_NAME = 'gemini-3-flash-preview'
 
-if api_key and api_key != "PLACEHOLDER_API_KEY":
-    try:
-        genai.configure(api_key=api_key)
-        # Using a reliable model version from the available list
-        model = genai.GenerativeModel('gemini-3-flash-preview')
-        logger.info("Gemini AI configured successfully on the backend.")
-    except Exception as e:
-        logger.error(f"Failed to configure Gemini AI: {e}")
-        model = None
-else:
-    logger.warning("Gemini API key not found or is a placeholder. LLM features will be disabled.")
-    model = None
+# "compact" sends a short prompt and asks for JSON matching RESPONSE_SCHEMA;
+# "verbose" is the original free-form prompt with the JSON shape spelled out.
+PROMPT_VARIANT = os.getenv("GEMINI_PROMPT_VARIANT", "compact")
+PROMPT_VARIANTS = ("compact", "verbose")
 
-def analyze_request(user_text: str):
-    """
-    Analyzes a roadside assistance request using Gemini LLM.
-    Returns a dictionary with issueType, severity, and suggestedAction.
-    """
-    if not model:
-        return None
+# USD per 1M tokens, used for cost accounting; keep in line with current pricing
+INPUT_COST_PER_MTOK = float(os.getenv("GEMINI_INPUT_COST_PER_MTOK", 0.50))
+OUTPUT_COST_PER_MTOK = float(os.getenv("GEMINI_OUTPUT_COST_PER_MTOK", 3.00))
+
+# Triage falls back to rules rather than waiting longer than this for Gemini
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", 8))
 
-    prompt = f"""
+VERBOSE_PROMPT = """
     The user is in a roadside emergency in India. The description provided is: "{user_text}".
     
     Categorize the issue and determine severity.
@@ -49,17 +40,156 @@ def analyze_request(user_text: str):
     }}
     """
 
+COMPACT_PROMPT = 'Roadside emergency in India: "{user_text}". Classify it and give brief advice.'
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "issueType": {"type": "string", "enum": ["Tyre", "Battery", "Engine", "Accident", "General"]},
+        "severity": {"type": "string", "enum": ["Low", "Medium", "High", "Critical"]},
+        "suggestedAction": {"type": "string"},
+    },
+    "required": ["issueType", "severity", "suggestedAction"],
+}
+COMPACT_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": RESPONSE_SCHEMA}
+
+TOKENS = metrics.Counter("gemini_tokens_total", "Gemini tokens by kind (prompt/output) and prompt variant")
+COST_USD = metrics.Counter("gemini_cost_usd_total", "Estimated Gemini spend in USD by prompt variant")
+
+_daily_usage = {}
+_usage_lock = threading.Lock()
+
+# The SDK import and client construction are deferred to first use (or to
+# warm_up) so importing this module stays cheap for workers, tests and CLIs.
+_model = None
+_model_initialized = False
+_model_lock = threading.Lock()
+
+def _create_model():
+    from dotenv import load_dotenv
+
+    # Load environment variables
+    load_dotenv()
+    load_dotenv(".env.local")
+
+    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("VITE_GEMINI_API_KEY")
+    if not api_key or api_key == "PLACEHOLDER_API_KEY":
+        logger.warning("Gemini API key not found or is a placeholder. LLM features will be disabled.")
+        return None
+
+    try:
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel(MODEL_NAME)
+        logger.info("Gemini AI configured successfully on the backend.")
+        return model
+    except Exception as e:
+        logger.error("Failed to configure Gemini AI: %s", e)
+        return None
+
+def get_model():
+    """
+    Return the Gemini model, constructing it on first use; None if unavailable.
+    """
+    global _model, _model_initialized
+    if _model_initialized:
+        return _model
+    with _model_lock:
+        if not _model_initialized:
+            _model = _create_model()
+            _model_initialized = True
+    return _model
+
+def warm_up():
+    """
+    Build the client ahead of the first request.
+    """
+    get_model()
+
+def start_background_warm_up():
+    """
+    Run warm_up on a daemon thread so server startup isn't blocked by it.
+    """
+    thread = threading.Thread(target=warm_up, name="gemini-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def record_usage(usage, variant):
+    """
+    Add one call's token counts to the metrics and today's totals.
+    Returns the usage with its estimated cost.
+    """
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    output_tokens = usage.get("output_tokens") or 0
+    cost = (prompt_tokens * INPUT_COST_PER_MTOK + output_tokens * OUTPUT_COST_PER_MTOK) / 1_000_000
+    TOKENS.inc(prompt_tokens, kind="prompt", variant=variant)
+    TOKENS.inc(output_tokens, kind="output", variant=variant)
+    COST_USD.inc(cost, variant=variant)
+    day = time.strftime("%Y-%m-%d")
+    with _usage_lock:
+        totals = _daily_usage.setdefault(day, {"requests": 0, "prompt_tokens": 0, "output_tokens": 0, "cost_usd": 0.0})
+        totals["requests"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["output_tokens"] += output_tokens
+        totals["cost_usd"] += cost
+    return {"prompt_tokens": prompt_tokens, "output_tokens": output_tokens, "cost_usd": cost, "variant": variant}
+
+def get_daily_usage():
+    """
+    Token and cost totals per day (YYYY-MM-DD) since the process started.
+    """
+    with _usage_lock:
+        return {day: dict(totals) for day, totals in _daily_usage.items()}
+
+def analyze_request(user_text: str, variant: str = None):
+    """
+    Analyzes a roadside assistance request using Gemini LLM.
+    Returns a dictionary with issueType, severity, suggestedAction and the
+    call's token usage. variant overrides GEMINI_PROMPT_VARIANT.
+    """
+    model = get_model()
+    # Recorded responses can be replayed without an API key
+    if not model and cassette.mode() != cassette.MODE_REPLAY:
+        return None
+
+    variant = variant or PROMPT_VARIANT
+    if variant == "compact":
+        prompt = COMPACT_PROMPT.format(user_text=user_text)
+        generation_config = COMPACT_GENERATION_CONFIG
+    else:
+        prompt = VERBOSE_PROMPT.format(user_text=user_text)
+        generation_config = None
+
+    def generate():
+        response = model.generate_content(prompt, generation_config=generation_config)
+        usage = response.usage_metadata
+        return {
+            "text": response.text,
+            "usage": {
+                "prompt_tokens": usage.prompt_token_count,
+                "output_tokens": usage.candidates_token_count,
+            },
+        }
+
+    def call():
+        with metrics.upstream("gemini"):
+            return cassette.call("gemini", prompt, generate)
+
     try:
-        response = model.generate_content(prompt)
-        # Extract JSON from response text (handling potential markdown wrapping)
-        text = response.text.strip()
-        if text.startswith("```json"):
-            text = text[7:-3].strip()
-        elif text.startswith("```"):
-            text = text[3:-3].strip()
+        # Runs in the llm bulkhead so a slow Gemini only ties up its own threads
+        reply = bulkhead.get("llm").call(call, timeout=GEMINI_TIMEOUT_SECONDS)
+        usage = record_usage(reply["usage"], variant)
+        text = reply["text"].strip()
+        if variant != "compact":
+            # Extract JSON from response text (handling potential markdown wrapping)
+            if text.startswith("```json"):
+                text = text[7:-3].strip()
+            elif text.startswith("```"):
+                text = text[3:-3].strip()
         
         result = json.loads(text)
+        result["usage"] = usage
         return result
     except Exception as e:
-        logger.error(f"Gemini analysis failed: {e}")
+        logger.error("Gemini analysis failed: %r", e)
         return None
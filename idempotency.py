@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Repeated "Request help" taps must not re-run triage and discovery or get a
+# different mechanic. A request is identified by its Idempotency-Key header,
+# or else by device + rounded location + normalized text; repeats within the
+# window get the first result, and concurrent repeats wait for it.
+IDEMPOTENCY_WINDOW_SECONDS = float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", 120))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000))
+# ~100 m, so GPS jitter between taps still matches
+LOCATION_DECIMALS = 3
+# Dispatch outcomes worth replaying; anything else (e.g. no_services_found after
+# an upstream outage) runs again on the next tap
+REPLAYABLE_STATUSES = ("assigned", "waiting_for_location")
+
+IDEMPOTENCY_REQUESTS = metrics.Counter(
+    "idempotency_requests_total", "Keyed requests by outcome (executed, replayed, joined)",
+)
+
+_SPACES = re.compile(r"\s+")
+
+class IdempotencyConflict(Exception):
+    """
+    An Idempotency-Key was reused with a different request body.
+    """
+
+def derive_key(device_id, data):
+    """
+    Key for a request without an Idempotency-Key header; None without a device id.
+    """
+    if not device_id:
+        return None
+    loc = data.get("user_location") or {}
+    parts = [
+        device_id,
+        data.get("incident_id") or "",
+        _SPACES.sub(" ", (data.get("user_text") or "").strip().lower()),
+        "" if loc.get("lat") is None else f"{round(loc['lat'], LOCATION_DECIMALS)},{round(loc['lon'], LOCATION_DECIMALS)}",
+        # A retry asking for the route must not replay a result without one
+        "route" if data.get("include_route") else "",
+    ]
+    return "derived:" + hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class _Entry:
+    __slots__ = ("created", "fingerprint", "done", "result", "error")
+
+    def __init__(self, created, fingerprint):
+        self.created = created
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+def is_replayable(result):
+    return isinstance(result, dict) and result.get("status") in REPLAYABLE_STATUSES
+
+class IdempotencyStore:
+    """
+    Bounded LRU of results by key, each kept for ttl seconds. Failed runs, and
+    results keep(result) rejects, are not kept, so a retry runs again.
+    """
+
+    def __init__(self, max_entries=IDEMPOTENCY_MAX_ENTRIES, ttl=IDEMPOTENCY_WINDOW_SECONDS, keep=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.keep = keep
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def run(self, key, data, fn):
+        """
+        fn() for the first request with this key, the stored result for
+        repeats. Returns (result, replayed).
+        """
+        request_print = fingerprint(data)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                owner = False
+            else:
+                entry = self._entries[key] = _Entry(now, request_print)
+                owner = True
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        if not owner:
+            if entry.fingerprint != request_print and not key.startswith("derived:"):
+                raise IdempotencyConflict(f"Idempotency key {key!r} was used for a different request")
+            outcome = "replayed" if entry.done.is_set() else "joined"
+            entry.done.wait()
+            IDEMPOTENCY_REQUESTS.inc(outcome=outcome)
+            if entry.error is not None:
+                raise entry.error
+            return entry.result, True
+
+        try:
+            entry.result = fn()
+        except Exception as e:
+            entry.error = e
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            raise
+        finally:
+            entry.done.set()
+        if self.keep is not None and not self.keep(entry.result):
+            # Requests that joined this run still get its result
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+        IDEMPOTENCY_REQUESTS.inc(outcome="executed")
+        return entry.result, False
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,105 @@
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Triage of requests that came in without a location, keyed by incident id.
+# The follow-up only has to send the id and a location: dispatch resumes at
+# service discovery with the stored triage instead of calling the LLM again.
+# Assigned incidents also keep the assignment, for the mechanic's arrival report.
+# The store lives in the process: with several uvicorn workers, follow-ups and
+# arrival/position reports must reach the worker that issued the incident id
+# (route on it, e.g. sticky sessions), or they are answered as unknown.
+INCIDENT_TTL_SECONDS = float(os.getenv("INCIDENT_TTL_SECONDS", 7200))
+INCIDENT_MAX_ENTRIES = int(os.getenv("INCIDENT_MAX_ENTRIES", 10000))
+
+INCIDENTS = metrics.Counter("incidents_total", "Incident store events (created, found, missing)")
+
+class IncidentStore:
+    """
+    Bounded LRU of incident state, each entry kept for ttl seconds.
+    """
+
+    def __init__(self, max_entries=INCIDENT_MAX_ENTRIES, ttl=INCIDENT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, state):
+        """
+        Store state under a new incident id and return the id.
+        """
+        incident_id = secrets.token_urlsafe(12)
+        with self._lock:
+            self._entries[incident_id] = (time.monotonic(), dict(state))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        INCIDENTS.inc(event="created")
+        return incident_id
+
+    def get(self, incident_id):
+        """
+        A copy of the incident's state, or None if it is unknown or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(incident_id)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[incident_id]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(incident_id)
+        if entry is None:
+            INCIDENTS.inc(event="missing")
+            return None
+        INCIDENTS.inc(event="found")
+        return dict(entry[1])
+
+    def update(self, incident_id, fields, unless=None):
+        """
+        Merge fields into a live incident's state; False if it is unknown or
+        expired, or already has the field named by unless.
+        """
+        with self._lock:
+            entry = self._entries.get(incident_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                return False
+            if unless is not None and unless in entry[1]:
+                return False
+            entry[1].update(fields)
+            return True
+
+    def mark_once(self, incident_id, field, value):
+        """
+        Set field on a live incident unless it is already set; True if this
+        call set it.
+        """
+        with self._lock:
+            entry = self._entries.get(incident_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl or field in entry[1]:
+                return False
+            entry[1][field] = value
+            return True
+
+    def __len__(self):
+        return len(self._entries)
+
+_store = IncidentStore()
+
+def create(state):
+    return _store.create(state)
+
+def get(incident_id):
+    return _store.get(incident_id)
+
+def update(incident_id, fields, unless=None):
+    return _store.update(incident_id, fields, unless)
+
+def mark_once(incident_id, field, value):
+    return _store.mark_once(incident_id, field, value)
@@ -0,0 +1,183 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+
+import metrics
+
+# Logging for the request path: records are sampled and enqueued by the
+# request thread, then formatted as JSON and written to a rotating file by
+# a background listener thread.
+LOG_FILE = os.getenv("LOG_FILE", "server.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# One JSON line per assistance request; read back by warmup.py and replay.py
+REQUEST_LOG_PATH = os.getenv("REQUEST_LOG_PATH", "request_log.jsonl")
+REQUEST_LOGGER = "request_log"
+# One JSON line per Gemini triage result; training data for triage_classifier.py
+TRIAGE_LABEL_LOG_PATH = os.getenv("TRIAGE_LABEL_LOG_PATH", "triage_labels.jsonl")
+TRIAGE_LABEL_LOGGER = "triage_labels"
+
+# Data logs are written unsampled to their own JSONL files, not to LOG_FILE
+DATA_LOGS = {REQUEST_LOGGER: REQUEST_LOG_PATH, TRIAGE_LABEL_LOGGER: TRIAGE_LABEL_LOG_PATH}
+
+# Fraction of records kept per level; WARNING and above are never sampled
+LOG_SAMPLE_RATES = {
+    logging.DEBUG: float(os.getenv("LOG_SAMPLE_DEBUG", 0.1)),
+    logging.INFO: float(os.getenv("LOG_SAMPLE_INFO", 1.0)),
+}
+
+LOG_RECORDS = metrics.Counter("log_records_total", "Log records enqueued, by level")
+LOG_SAMPLED_OUT = metrics.Counter("log_records_sampled_out_total", "Log records dropped by sampling, by level")
+LOG_DROPPED = metrics.Counter("log_records_dropped_total", "Log records dropped because the queue was full")
+LOG_WRITE_SECONDS = metrics.Histogram(
+    "log_write_seconds", "Time the listener spends formatting and writing one record",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01, 0.1),
+)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, including any fields passed with `extra=`.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DataLogFormatter(logging.Formatter):
+    """
+    The payload passed as extra={"payload": ...}, with a timestamp unless it has one.
+    """
+
+    def format(self, record):
+        entry = dict(record.payload)
+        entry.setdefault("ts", round(record.created, 3))
+        return json.dumps(entry, default=str)
+
+class ExcludeDataLogsFilter(logging.Filter):
+    def filter(self, record):
+        return record.name not in DATA_LOGS
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        LOG_SAMPLED_OUT.inc(level=record.levelname)
+        return False
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues the record as-is: message interpolation and JSON encoding happen
+    in the listener thread. Arguments are therefore rendered as they are when
+    written, so don't log objects that are mutated right afterwards.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            LOG_RECORDS.inc(level=record.levelname)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+class MeteredRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Size-based rotation, with each write timed into log_write_seconds.
+    """
+
+    def emit(self, record):
+        start = time.perf_counter()
+        super().emit(record)
+        LOG_WRITE_SECONDS.observe(time.perf_counter() - start)
+
+_listener = None
+
+def setup_logging():
+    """
+    Route the root logger through the background queue; safe to call twice.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    file_handler = MeteredRotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    file_handler.setFormatter(JsonFormatter())
+    file_handler.addFilter(ExcludeDataLogsFilter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+
+    handlers = [file_handler]
+    for name, path in DATA_LOGS.items():
+        data_handler = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+        data_handler.setFormatter(DataLogFormatter())
+        data_handler.addFilter(logging.Filter(name))
+        handlers.append(data_handler)
+        # Data logs are never sampled
+        data_logger = logging.getLogger(name)
+        data_logger.propagate = False
+        data_logger.setLevel(logging.INFO)
+        data_logger.addHandler(LazyQueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def log_request(data, issued_incident_id=None, received_at=None):
+    """
+    Append an assistance request (the dict passed to backend_logic) to the
+    request log, with the incident id its response carried. received_at
+    (epoch seconds) is logged as its timestamp when given.
+    """
+    payload = dict(data)
+    if issued_incident_id:
+        payload["issued_incident_id"] = issued_incident_id
+    if received_at is not None:
+        payload["ts"] = round(received_at, 3)
+    logging.getLogger(REQUEST_LOGGER).info("assistance_request", extra={"payload": payload})
+
+def log_triage_label(user_text, analysis):
+    """
+    Append a Gemini triage result for user_text to the label log.
+    """
+    label = {"user_text": user_text, "issueType": analysis.get("issueType"), "severity": analysis.get("severity")}
+    logging.getLogger(TRIAGE_LABEL_LOGGER).info("triage_label", extra={"payload": label})
+
+def shutdown_logging():
+    """
+    Flush queued records and stop the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
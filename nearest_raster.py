@@ -0,0 +1,206 @@
+import array
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+import metrics
+import poi_index
+
+logger = logging.getLogger(__name__)
+
+# "Which hospital / police station / garage is nearest to this point" as an
+# array lookup: an offline-built raster per category over the POI index's
+# area. Each cell lists every POI that can be the nearest one for some point
+# in the cell, so a lookup only compares the exact distances of that list.
+# The list is bounded by R, the distance from the farthest cell corner to the
+# POI nearest the cell center: no point in the cell has its nearest POI
+# further away than R, so POIs further than R from the whole cell are dropped.
+NEAREST_RASTER_PATH = os.getenv("NEAREST_RASTER_PATH", "nearest_raster.bin")
+RASTER_DEGREES = float(os.getenv("NEAREST_RASTER_DEGREES", 0.002))
+# Extends the raster past the outermost POIs
+RASTER_MARGIN_DEGREES = 0.05
+METERS_PER_DEGREE = 6371000.0 * math.radians(1)
+# Covers the difference between the planar bound and poi_index._distance_m
+BOUND_SLACK = 1.01
+
+MAGIC = b"NNR1"
+VERSION = 2
+# magic, version, categories, POI index checksum, min_lat, min_lon, cell_deg, rows, cols;
+# then uint32 offsets per (category, cell) + 1 into the uint32 record indexes
+HEADER = struct.Struct("<4sHHIdddII")
+
+def _candidates(buckets, bucket, lat0, lon0, lat1, lon1):
+    """
+    Indexes of the POIs that can be nearest to some point of the cell
+    [lat0, lat1] x [lon0, lon1], given (index, lat, lon) bucketed by bucket degrees.
+    """
+    kx = math.cos(math.radians((lat0 + lat1) / 2)) * METERS_PER_DEGREE
+    corners = ((lat0, lon0), (lat0, lon1), (lat1, lon0), (lat1, lon1))
+    clat, clon = (lat0 + lat1) / 2, (lon0 + lon1) / 2
+    br, bc = math.floor(clat / bucket), math.floor(clon / bucket)
+
+    # Ring search for the point nearest the cell center
+    best, best_d = None, float('inf')
+    ring = 0
+    while best is None or best_d > (ring - 1) * bucket * min(kx, METERS_PER_DEGREE):
+        for rr in range(br - ring, br + ring + 1):
+            for cc in range(bc - ring, bc + ring + 1):
+                if max(abs(rr - br), abs(cc - bc)) != ring:
+                    continue
+                for p in buckets.get((rr, cc), ()):
+                    d = math.hypot((p[1] - clat) * METERS_PER_DEGREE, (p[2] - clon) * kx)
+                    if d < best_d:
+                        best, best_d = p, d
+        ring += 1
+    bound = max(math.hypot((best[1] - a) * METERS_PER_DEGREE, (best[2] - b) * kx) for a, b in corners)
+    bound = bound * BOUND_SLACK + 1.0
+
+    found = []
+    dlat, dlon = bound / METERS_PER_DEGREE, bound / kx
+    for rr in range(math.floor((lat0 - dlat) / bucket), math.floor((lat1 + dlat) / bucket) + 1):
+        for cc in range(math.floor((lon0 - dlon) / bucket), math.floor((lon1 + dlon) / bucket) + 1):
+            for i, plat, plon in buckets.get((rr, cc), ()):
+                dy = max(lat0 - plat, 0.0, plat - lat1) * METERS_PER_DEGREE
+                dx = max(lon0 - plon, 0.0, plon - lon1) * kx
+                if dx * dx + dy * dy <= bound * bound:
+                    found.append(i)
+    return found
+
+def build_raster(index, path, cell_degrees=RASTER_DEGREES, margin=RASTER_MARGIN_DEGREES):
+    """
+    Rasterize the nearest-POI candidates of each category over the index's
+    extent and atomically replace path with the result. Returns (rows, cols).
+    """
+    min_lat = index.min_lat - margin
+    min_lon = index.min_lon - margin
+    rows = int((index.rows * index.cell_degrees + 2 * margin) / cell_degrees) + 1
+    cols = int((index.cols * index.cell_degrees + 2 * margin) / cell_degrees) + 1
+
+    positions = {category: [] for category in poi_index.CATEGORIES}
+    for i, record in enumerate(index.records()):
+        positions[record['category']].append((i, record['lat'], record['lon']))
+
+    offsets = array.array('I', [0])
+    indexes = array.array('I')
+    for category in poi_index.CATEGORIES:
+        points = positions[category]
+        if not points:
+            offsets.extend([len(indexes)] * (rows * cols))
+            continue
+        # Buckets holding about one POI each
+        bucket = max(cell_degrees, math.sqrt(rows * cols * cell_degrees ** 2 / len(points)))
+        buckets = {}
+        for p in points:
+            buckets.setdefault((math.floor(p[1] / bucket), math.floor(p[2] / bucket)), []).append(p)
+        for r in range(rows):
+            lat0 = min_lat + r * cell_degrees
+            for c in range(cols):
+                lon0 = min_lon + c * cell_degrees
+                indexes.extend(_candidates(buckets, bucket, lat0, lon0, lat0 + cell_degrees, lon0 + cell_degrees))
+                offsets.append(len(indexes))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(poi_index.CATEGORIES), index.checksum(), min_lat, min_lon,
+                            cell_degrees, rows, cols))
+        offsets.tofile(f)
+        indexes.tofile(f)
+    os.replace(tmp_path, path)
+    logger.info("Wrote %dx%d nearest-POI raster (%d candidates) to %s", rows, cols, len(indexes), path)
+    return rows, cols
+
+class NearestRaster:
+    """
+    Reader over a raster file written by build_raster.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, n_categories, self.index_checksum, self.min_lat, self.min_lon,
+         self.cell_degrees, self.rows, self.cols) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or n_categories != len(poi_index.CATEGORIES):
+            raise ValueError(f"{path} is not a nearest-POI raster file")
+        self.path = path
+        n_offsets = n_categories * self.rows * self.cols + 1
+        values = memoryview(self._mm)[HEADER.size:].cast('I')
+        self._offsets = values[:n_offsets]
+        self._indexes = values[n_offsets:]
+
+    def candidates(self, lat, lon, category):
+        """
+        Record indexes that can be nearest to the point, or None outside the raster.
+        """
+        r = int(math.floor((lat - self.min_lat) / self.cell_degrees))
+        c = int(math.floor((lon - self.min_lon) / self.cell_degrees))
+        if not (0 <= r < self.rows and 0 <= c < self.cols):
+            return None
+        cell = poi_index.CATEGORIES.index(category) * self.rows * self.cols + r * self.cols + c
+        return self._indexes[self._offsets[cell]:self._offsets[cell + 1]].tolist()
+
+_raster = None
+_raster_checked = 0.0
+_raster_lock = threading.Lock()
+
+def get_raster(path=None):
+    """
+    The shared raster, remapped when the file has been swapped; None if absent.
+    """
+    global _raster, _raster_checked
+    path = path or NEAREST_RASTER_PATH
+    now = time.monotonic()
+    if _raster is not None and now - _raster_checked < poi_index.POI_INDEX_CHECK_SECONDS:
+        return _raster
+    with _raster_lock:
+        _raster_checked = now
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            _raster = None
+            return None
+        if _raster is None or _raster.path != path or (st.st_ino, st.st_mtime_ns) != (_raster.stat.st_ino, _raster.stat.st_mtime_ns):
+            try:
+                _raster = NearestRaster(path)
+                logger.info("Mapped nearest-POI raster %s (%dx%d)", path, _raster.rows, _raster.cols)
+            except Exception as e:
+                logger.error("Failed to map nearest-POI raster %s: %s", path, e)
+                _raster = None
+    return _raster
+
+def nearest(lat, lon, category, radius=10000):
+    """
+    The nearest POI of a category as a poi_index record, or None when the
+    raster can't answer (missing, stale, outside its area, or nothing within
+    radius) and the caller should fall back to a search.
+    """
+    if category not in poi_index.CATEGORIES:
+        return None
+    raster = get_raster()
+    index = poi_index.get_index()
+    # A raster built from a different index would point at the wrong records
+    if raster is None or index is None or raster.index_checksum != index.checksum():
+        return None
+    candidates = raster.candidates(lat, lon, category)
+    if not candidates:
+        return None
+    distance, best = min((poi_index._distance_m(lat, lon, *index.position(i)), i) for i in candidates)
+    if distance > radius:
+        return None
+    return index.record(best)
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the nearest-POI raster from the POI index")
+    parser.add_argument("output", nargs="?", default=NEAREST_RASTER_PATH)
+    parser.add_argument("--index", default=poi_index.POI_INDEX_PATH)
+    parser.add_argument("--cell-degrees", type=float, default=RASTER_DEGREES)
+    args = parser.parse_args()
+
+    build_raster(poi_index.PoiIndex(args.index), args.output, cell_degrees=args.cell_degrees)
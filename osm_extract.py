@@ -0,0 +1,76 @@
+import bz2
+import gzip
+import logging
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+def open_extract(path):
+    """
+    Open a local OSM XML extract, transparently handling .bz2 and .gz files.
+    """
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def iter_elements(path):
+    """
+    Stream nodes and ways from an OSM XML extract without loading it in memory.
+    Yields dicts like:
+      {'type': 'node', 'id': 1, 'lat': 21.1, 'lon': 79.0, 'tags': {...}}
+      {'type': 'way', 'id': 2, 'refs': [1, 3], 'tags': {...}}
+    """
+    with open_extract(path) as f:
+        yield from iter_xml_elements(f)
+
+def iter_xml_elements(source):
+    """
+    Same as iter_elements, for an already opened file object.
+    """
+    context = ET.iterparse(source, events=("start", "end"))
+    root = None
+    for event, el in context:
+        if event == "start":
+            if root is None:
+                root = el
+            continue
+        if el.tag == "node":
+            yield {
+                'type': 'node',
+                'id': int(el.get('id')),
+                'lat': float(el.get('lat')),
+                'lon': float(el.get('lon')),
+                'tags': {t.get('k'): t.get('v') for t in el.iter('tag')},
+            }
+            root.clear()
+        elif el.tag == "way":
+            yield {
+                'type': 'way',
+                'id': int(el.get('id')),
+                'refs': [int(nd.get('ref')) for nd in el.iter('nd')],
+                'tags': {t.get('k'): t.get('v') for t in el.iter('tag')},
+            }
+            root.clear()
+        elif el.tag == "relation":
+            root.clear()
+
+def in_bbox(lat, lon, bbox):
+    """
+    bbox is (min_lat, min_lon, max_lat, max_lon); None means no filtering.
+    """
+    if not bbox:
+        return True
+    return bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]
+
+def parse_bbox(text):
+    """
+    Parse "min_lat,min_lon,max_lat,max_lon" as given on the command line.
+    """
+    if not text:
+        return None
+    parts = [float(p) for p in text.split(",")]
+    if len(parts) != 4:
+        raise ValueError(f"bbox must have 4 comma separated values, got {text!r}")
+    return tuple(parts)
@@ -1,17 +1,102 @@
 import requests
 import logging
 import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import bulkhead
+import cassette
+import metrics
+import nearest_raster
+import poi_index
+import upstream_scheduler
 
 logger = logging.getLogger(__name__)
 
 OVERPASS_URL = "http://overpass-api.de/api/interpreter"
 
+# Overpass results are cached per ~500 m tile so repeated lookups around the
+# same spot (and the per-category accident lookups) don't hit the API again.
+CACHE_TTL_SECONDS = int(os.getenv("OSM_CACHE_TTL_SECONDS", 3600))
+CACHE_TILE_DEGREES = 0.005
+CACHE_MAX_TILES = int(os.getenv("OSM_CACHE_MAX_TILES", 5000))
+
+# Categories resolved independently for accident dispatch
+EMERGENCY_CATEGORIES = {
+    'hospital': ['hospital'],
+    'police': ['police'],
+    'mechanic': ['car_repair'],
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _cache_key(lat, lon, types, radius):
+    return (round(lat / CACHE_TILE_DEGREES), round(lon / CACHE_TILE_DEGREES), tuple(sorted(types)), radius)
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= CACHE_TTL_SECONDS:
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return entry[1]
+
+def _cache_put(key, results):
+    now = time.monotonic()
+    with _cache_lock:
+        # Puts follow an Overpass call, so sweeping expired tiles here costs little
+        for expired in [k for k, (stored, _) in _cache.items() if now - stored >= CACHE_TTL_SECONDS]:
+            del _cache[expired]
+        _cache[key] = (now, results)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_TILES:
+            _cache.popitem(last=False)
+
 def fetch_nearby(lat, lon, types=['car_repair'], radius=10000):
     """
     Fetch nearby points of interest from OpenStreetMap using the Overpass API.
     types can include: 'car_repair', 'hospital', 'police'
+    Results are sorted by distance from (lat, lon).
+    """
+    key = _cache_key(lat, lon, types, radius)
+    cached = _cache_get(key)
+    metrics.cache_lookup("overpass", cached is not None)
+    if cached is not None:
+        return sorted(cached, key=lambda x: (x['lat'] - lat)**2 + (x['lon'] - lon)**2)
+
+    # The shared POI index answers without a network call when it covers the area
+    index = poi_index.get_index()
+    if index:
+        results = []
+        for t in types:
+            if t in poi_index.CATEGORIES:
+                results.extend(index.nearest(lat, lon, t, radius=radius))
+        metrics.cache_lookup("poi_index", bool(results))
+        if results:
+            results.sort(key=lambda x: (x['lat'] - lat)**2 + (x['lon'] - lon)**2)
+            return results
+
+    results = query_overpass(lat, lon, types, radius)
+    if results:
+        _cache_put(key, results)
+    return results
+
+def _post_overpass(query):
+    response = requests.post(OVERPASS_URL, data={'data': query}, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+def query_overpass(lat, lon, types=['car_repair'], radius=10000):
+    """
+    Query the Overpass API directly, bypassing the cache and the POI index.
+    Returns [] if the request fails.
     """
-    
     # Map types to OSM tags
     tag_map = {
         'car_repair': '["amenity"="car_repair"]',
@@ -47,10 +132,9 @@ def fetch_nearby(lat, lon, types=['car_repair'], radius=10000):
     """
 
     try:
-        logger.info(f"Querying Overpass API for {types} around {lat}, {lon}")
-        response = requests.post(OVERPASS_URL, data={'data': query}, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+        logger.info("Querying Overpass API for %s around %s, %s", types, lat, lon)
+        with upstream_scheduler.slot("overpass"), metrics.upstream("overpass"):
+            data = cassette.call("overpass", query, lambda: _post_overpass(query))
         
         elements = data.get('elements', [])
         results = []
@@ -73,7 +157,7 @@ def fetch_nearby(lat, lon, types=['car_repair'], radius=10000):
         
         return results
     except Exception as e:
-        logger.error(f"Overpass API request failed: {e}")
+        logger.error("Overpass API request failed: %s", e)
         return []
 
 def get_real_assistance(lat, lon, issue_type='general'):
@@ -86,6 +170,28 @@ def get_real_assistance(lat, lon, issue_type='general'):
         
     return fetch_nearby(lat, lon, types=search_types)
 
+def get_emergency_assistance(lat, lon):
+    """
+    Resolve the nearest hospital, police station and mechanic as separate
+    ranked lookups, run concurrently so accident dispatch pays for the slowest
+    lookup only. Returns a dict keyed by category; a category with nothing
+    nearby maps to None.
+    """
+    nearest = {}
+    futures = {}
+    for category, types in EMERGENCY_CATEGORIES.items():
+        # The precomputed raster answers with one array lookup when it covers the point
+        hit = nearest_raster.nearest(lat, lon, types[0])
+        metrics.cache_lookup("nearest_raster", hit is not None)
+        if hit:
+            nearest[category] = hit
+        else:
+            futures[category] = bulkhead.get("poi").submit(fetch_nearby, lat, lon, types=types)
+    for category, future in futures.items():
+        results = future.result()
+        nearest[category] = results[0] if results else None
+    return {category: nearest[category] for category in EMERGENCY_CATEGORIES}
+
 if __name__ == "__main__":
     # Test with Nagpur coordinates
     nagpur_lat, nagpur_lon = 21.1458, 79.0882
@@ -1,27 +1,88 @@
 import requests
 import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import cassette
+import metrics
+import upstream_scheduler
 
 logger = logging.getLogger(__name__)
 
 OSRM_API_BASE_URL = "https://router.project-osrm.org/route/v1/driving"
+OSRM_TABLE_BASE_URL = "https://router.project-osrm.org/table/v1/driving"
+# The public server rejects table requests with more than 100 coordinates
+OSRM_TABLE_MAX_DESTINATIONS = 99
+
+# Preprocessed road graph (see road_graph.py); when present, routes are
+# computed in-process and the public OSRM server is only used outside it.
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH", "road_graph.bin")
+
+# Live ETA refresh: each assignment's route polyline is fetched once and
+# cached with cumulative travel times; a position update is projected onto it,
+# and only a mechanic further than ROUTE_DEVIATION_METERS from the route
+# triggers a new route request.
+ROUTE_DEVIATION_METERS = float(os.getenv("ROUTE_DEVIATION_METERS", 150))
+TRACKED_ROUTES_MAX = int(os.getenv("TRACKED_ROUTES_MAX", 5000))
+METERS_PER_DEGREE = 111195.0
+# Matches road_graph.SNAP_SPEED_KMH, for the leg from a deviated position back to the route
+OFF_ROUTE_SPEED_KMH = 15
+
+ROUTE_REFRESHES = metrics.Counter("route_refreshes_total", "Position updates by outcome (fetched, projected, rerouted, unavailable)")
+
+_local_graph = None
+_local_graph_loaded = False
+_local_graph_lock = threading.Lock()
+
+def get_local_graph():
+    """
+    Load the local road graph once; returns None if no graph file is available.
+    """
+    global _local_graph, _local_graph_loaded
+    if _local_graph_loaded:
+        return _local_graph
+    with _local_graph_lock:
+        if not _local_graph_loaded:
+            if os.path.exists(ROAD_GRAPH_PATH):
+                import road_graph
+                try:
+                    _local_graph = road_graph.RoadGraph(ROAD_GRAPH_PATH)
+                except Exception as e:
+                    logger.error("Failed to load road graph %s: %s", ROAD_GRAPH_PATH, e)
+            _local_graph_loaded = True
+    return _local_graph
+
+def _get_json(url, timeout):
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
 
 def get_route(start_loc, end_loc):
     """
-    Fetch route distance and duration from OSRM.
+    Fetch route distance and duration from the local road graph, or OSRM.
     start_loc and end_loc are dicts with 'lat' and 'lon'.
     """
     if not start_loc or not end_loc:
         return None
 
+    graph = get_local_graph()
+    if graph:
+        route = graph.route(start_loc, end_loc)
+        if route:
+            return route
+        logger.info("Route outside local road graph, falling back to OSRM")
+        metrics.fallback("osrm_http_route")
+
     # OSRM expects {longitude},{latitude}
     coords = f"{start_loc['lon']},{start_loc['lat']};{end_loc['lon']},{end_loc['lat']}"
     url = f"{OSRM_API_BASE_URL}/{coords}?overview=false"
 
     try:
-        logger.info(f"Querying OSRM for route: {coords}")
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        logger.info("Querying OSRM for route: %s", coords)
+        with upstream_scheduler.slot("osrm_route"), metrics.upstream("osrm_route"):
+            data = cassette.call("osrm_route", url, lambda: _get_json(url, timeout=10))
 
         if data.get("code") == "Ok" and data.get("routes"):
             route = data["routes"][0]
@@ -32,8 +93,168 @@ def get_route(start_loc, end_loc):
             }
         return None
     except Exception as e:
-        logger.error(f"OSRM request failed: {e}")
+        logger.error("OSRM request failed: %s", e)
+        return None
+
+def _segment_meters(a, b):
+    dx = (b[1] - a[1]) * math.cos(math.radians(a[0])) * METERS_PER_DEGREE
+    dy = (b[0] - a[0]) * METERS_PER_DEGREE
+    return math.hypot(dx, dy)
+
+def get_route_geometry(start_loc, end_loc):
+    """
+    Route polyline from the local road graph, or OSRM, as {"points": [(lat, lon)],
+    "seconds": [...], "meters": [...]} with cumulative travel time and distance
+    at each point. None if no route is available.
+    """
+    if not start_loc or not end_loc:
+        return None
+
+    geometry = None
+    graph = get_local_graph()
+    if graph:
+        geometry = graph.route_geometry(start_loc, end_loc)
+        if geometry is None:
+            metrics.fallback("osrm_http_route_geometry")
+
+    if geometry is None:
+        coords = f"{start_loc['lon']},{start_loc['lat']};{end_loc['lon']},{end_loc['lat']}"
+        url = f"{OSRM_API_BASE_URL}/{coords}?overview=full&geometries=geojson&annotations=duration"
+        try:
+            with upstream_scheduler.slot("osrm_route"), metrics.upstream("osrm_route_geometry"):
+                data = cassette.call("osrm_route_geometry", url, lambda: _get_json(url, timeout=10))
+            if data.get("code") != "Ok" or not data.get("routes"):
+                return None
+            route = data["routes"][0]
+            points = [(lat, lon) for lon, lat in route["geometry"]["coordinates"]]
+            steps = [d for leg in route["legs"] for d in leg["annotation"]["duration"]]
+            if len(steps) != len(points) - 1:
+                raise ValueError(f"{len(steps)} durations for {len(points)} points")
+            seconds = [0.0]
+            for step in steps:
+                seconds.append(seconds[-1] + step)
+            geometry = {"points": points, "seconds": seconds}
+        except Exception as e:
+            logger.error("OSRM route geometry request failed: %s", e)
+            return None
+
+    points = geometry["points"]
+    if len(points) < 2:
+        return None
+    meters = [0.0]
+    for a, b in zip(points, points[1:]):
+        meters.append(meters[-1] + _segment_meters(a, b))
+    geometry["meters"] = meters
+    return geometry
+
+def project_onto_route(geometry, position, start_segment=0):
+    """
+    Snap position to the closest point of the polyline, searching from
+    start_segment on so a route that doubles back keeps its progress.
+    Returns (segment, fraction along it, meters off the route).
+    """
+    lat0, lon0 = position['lat'], position['lon']
+    kx = math.cos(math.radians(lat0)) * METERS_PER_DEGREE
+    points = geometry["points"]
+    best = (start_segment, 0.0, math.inf)
+    for i in range(start_segment, len(points) - 1):
+        ax, ay = (points[i][1] - lon0) * kx, (points[i][0] - lat0) * METERS_PER_DEGREE
+        bx, by = (points[i + 1][1] - lon0) * kx, (points[i + 1][0] - lat0) * METERS_PER_DEGREE
+        dx, dy = bx - ax, by - ay
+        length2 = dx * dx + dy * dy
+        t = 0.0 if length2 == 0 else min(max(-(ax * dx + ay * dy) / length2, 0.0), 1.0)
+        d = math.hypot(ax + t * dx, ay + t * dy)
+        if d < best[2]:
+            best = (i, t, d)
+    return best
+
+_tracked_routes = OrderedDict()
+_tracked_routes_lock = threading.Lock()
+
+def remaining_route(key, position, destination, deviation_meters=None):
+    """
+    Remaining travel time and distance from position to destination along the
+    route cached under key (one per assignment). The route is fetched on the
+    first update for a key and again only when position is more than
+    deviation_meters off it. Returns {duration_min, distance_km, rerouted},
+    or None if no route is available.
+    """
+    if not position or not destination:
         return None
+    deviation_meters = ROUTE_DEVIATION_METERS if deviation_meters is None else deviation_meters
+    target = (destination['lat'], destination['lon'])
+    with _tracked_routes_lock:
+        entry = _tracked_routes.get(key)
+        if entry is not None:
+            _tracked_routes.move_to_end(key)
+
+    rerouted = False
+    segment, fraction, off_route = 0, 0.0, 0.0
+    if entry is not None and entry["destination"] == target:
+        segment, fraction, off_route = project_onto_route(entry["geometry"], position, entry["segment"])
+        if off_route > deviation_meters:
+            entry, rerouted = None, True
+    else:
+        entry = None
+
+    if entry is None:
+        geometry = get_route_geometry(position, destination)
+        if geometry is None:
+            ROUTE_REFRESHES.inc(outcome="unavailable")
+            return None
+        entry = {"destination": target, "geometry": geometry, "segment": 0}
+        segment, fraction, off_route = project_onto_route(geometry, position)
+        ROUTE_REFRESHES.inc(outcome="rerouted" if rerouted else "fetched")
+    else:
+        ROUTE_REFRESHES.inc(outcome="projected")
+
+    entry["segment"] = segment
+    with _tracked_routes_lock:
+        _tracked_routes[key] = entry
+        _tracked_routes.move_to_end(key)
+        while len(_tracked_routes) > TRACKED_ROUTES_MAX:
+            _tracked_routes.popitem(last=False)
+
+    geometry = entry["geometry"]
+    seconds, meters = geometry["seconds"], geometry["meters"]
+    done_seconds = seconds[segment] + fraction * (seconds[segment + 1] - seconds[segment])
+    done_meters = meters[segment] + fraction * (meters[segment + 1] - meters[segment])
+    remaining_seconds = seconds[-1] - done_seconds + off_route / (OFF_ROUTE_SPEED_KMH / 3.6)
+    return {
+        "duration_min": round(remaining_seconds / 60),
+        "distance_km": round((meters[-1] - done_meters + off_route) / 1000, 2),
+        "rerouted": rerouted,
+    }
+
+def forget_route(key):
+    with _tracked_routes_lock:
+        _tracked_routes.pop(key, None)
+
+def get_durations(origin, destinations):
+    """
+    One-to-many travel times in seconds from origin to each destination.
+    Uses the local road graph when available, otherwise the OSRM table service
+    in chunks. Unreachable destinations (or failed chunks) get None.
+    """
+    graph = get_local_graph()
+    if graph:
+        return graph.durations_from(origin, destinations)
+
+    durations = []
+    for i in range(0, len(destinations), OSRM_TABLE_MAX_DESTINATIONS):
+        chunk = destinations[i:i + OSRM_TABLE_MAX_DESTINATIONS]
+        coords = ";".join(f"{p['lon']},{p['lat']}" for p in [origin] + chunk)
+        url = f"{OSRM_TABLE_BASE_URL}/{coords}?sources=0&annotations=duration"
+        try:
+            with upstream_scheduler.slot("osrm_table"), metrics.upstream("osrm_table"):
+                data = cassette.call("osrm_table", url, lambda: _get_json(url, timeout=30))
+            if data.get("code") != "Ok":
+                raise ValueError(data.get("code"))
+            durations.extend(data["durations"][0][1:])
+        except Exception as e:
+            logger.error("OSRM table request failed: %s", e)
+            durations.extend([None] * len(chunk))
+    return durations
 
 if __name__ == "__main__":
     # Test with Nagpur coordinates
@@ -0,0 +1,254 @@
+import array
+import io
+import logging
+import os
+import re
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import osm_extract
+import poi_index
+
+logger = logging.getLogger(__name__)
+
+# Builds the POI index from a local OSM XML extract instead of Overpass.
+# An uncompressed extract is split into byte ranges at element boundaries and
+# the ranges are parsed by a process pool in two passes:
+#   1. keep tagged nodes as POIs, and tagged ways with their node refs
+#   2. look up the coordinates of those refs, for the way centroids
+# The per-block results are merged and written with poi_index.build_index.
+# The node refs of the tracked ways and those nodes' coordinates are kept in a
+# side file, so poi_updates can re-place a way when only some of its nodes move.
+POI_WAY_NODES_PATH = os.getenv("POI_WAY_NODES_PATH", "poi_way_nodes.bin")
+CHUNK_BYTES = int(os.getenv("POI_EXTRACT_CHUNK_MB", 32)) * 1024 * 1024
+# Read size when looking for the first element start tag after a split point
+SCAN_BYTES = 64 * 1024
+
+# Tags selecting each poi_index category; matches osm_service.query_overpass
+CATEGORY_TAGS = {
+    'car_repair': (('amenity', 'car_repair'), ('shop', 'car_repair'), ('craft', 'mechanic')),
+    'hospital': (('amenity', 'hospital'),),
+    'police': (('amenity', 'police'),),
+}
+
+# Start of a top-level element; the element belongs to the block it starts in
+_ELEMENT_START = re.compile(rb"<(?:node|way|relation)[\s/>]")
+_OSM_END = b"</osm>"
+
+WAY_NODES_MAGIC = b"PWN1"
+# magic, ways, nodes
+WAY_NODES_HEADER = struct.Struct("<4sII")
+
+def category_of(tags):
+    for category, pairs in CATEGORY_TAGS.items():
+        if any(tags.get(k) == v for k, v in pairs):
+            return category
+    return None
+
+def poi_fields(tags):
+    """
+    name, phone and type of a POI from its tags, with the same defaults as
+    osm_service.query_overpass.
+    """
+    return {
+        'name': tags.get('name', tags.get('operator', 'Independent Service')),
+        'phone': tags.get('phone', tags.get('contact:phone', '+91 0000000000')),
+        'type': tags.get('amenity', 'general'),
+    }
+
+def split_blocks(path, chunk_bytes=CHUNK_BYTES):
+    """
+    Byte ranges (start, end) covering every element of an uncompressed
+    extract, each starting at an element start tag.
+    """
+    size = os.path.getsize(path)
+    starts = []
+    with open(path, "rb") as f:
+        for offset in range(0, size, chunk_bytes):
+            position = offset
+            while True:
+                f.seek(position)
+                data = f.read(SCAN_BYTES)
+                match = _ELEMENT_START.search(data)
+                if match:
+                    position += match.start()
+                    break
+                if len(data) < SCAN_BYTES:
+                    position = None
+                    break
+                # Overlap the next read in case a start tag straddles the boundary
+                position += len(data) - 16
+            if position is not None and (not starts or position > starts[-1]):
+                starts.append(position)
+    return [(start, end) for start, end in zip(starts, starts[1:] + [size])]
+
+def _read_block(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # The last block ends with the document's closing tag
+    tail = data.rfind(_OSM_END)
+    if tail != -1:
+        data = data[:tail]
+    return b"<osm>" + data + _OSM_END
+
+def _iter_block(path, block):
+    if block is None:
+        # Compressed extracts can't be split; parse the whole stream
+        return osm_extract.iter_elements(path)
+    return osm_extract.iter_xml_elements(io.BytesIO(_read_block(path, *block)))
+
+def _scan_block(path, block, bbox):
+    """
+    Pass 1 over one block: (POIs from nodes, [(way id, category, fields, refs)], has nodes).
+    """
+    nodes, ways = [], []
+    has_nodes = False
+    for el in _iter_block(path, block):
+        if el['type'] == 'node':
+            has_nodes = True
+        category = category_of(el['tags'])
+        if category is None:
+            continue
+        if el['type'] == 'node':
+            if osm_extract.in_bbox(el['lat'], el['lon'], bbox):
+                nodes.append(dict(poi_fields(el['tags']), id=el['id'], lat=el['lat'], lon=el['lon'],
+                                  category=category, osm_type='node'))
+        elif el['refs']:
+            ways.append((el['id'], category, poi_fields(el['tags']), el['refs']))
+    return nodes, ways, has_nodes
+
+def _node_coords(path, block, needed):
+    """
+    Pass 2 over one block: {node id: (lat, lon)} for the needed ids in it.
+    """
+    coords = {}
+    for el in _iter_block(path, block):
+        if el['type'] == 'node' and el['id'] in needed:
+            coords[el['id']] = (el['lat'], el['lon'])
+    return coords
+
+def _run(pool, fn, path, blocks, *args):
+    if pool is None:
+        return [fn(path, block, *args) for block in blocks]
+    futures = [pool.submit(fn, path, block, *args) for block in blocks]
+    return [f.result() for f in futures]
+
+def save_way_nodes(path, way_refs, coords):
+    """
+    Write {way id: [node ids]} and the coordinates of those nodes; coordinates
+    of nodes no way references are left out.
+    """
+    way_ids = array.array('q', sorted(way_refs))
+    offsets, refs = array.array('I', [0]), array.array('q')
+    for way_id in way_ids:
+        refs.extend(way_refs[way_id])
+        offsets.append(len(refs))
+    node_ids = array.array('q', sorted(set(refs) & coords.keys()))
+    lats = array.array('d', (coords[n][0] for n in node_ids))
+    lons = array.array('d', (coords[n][1] for n in node_ids))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(WAY_NODES_HEADER.pack(WAY_NODES_MAGIC, len(way_ids), len(node_ids)))
+        for values in (way_ids, offsets, refs, node_ids, lats, lons):
+            values.tofile(f)
+    os.replace(tmp_path, path)
+
+def load_way_nodes(path):
+    """
+    (way refs, node coordinates) as written by save_way_nodes; empty if there is no file.
+    """
+    if not os.path.exists(path):
+        return {}, {}
+    with open(path, "rb") as f:
+        magic, n_ways, n_nodes = WAY_NODES_HEADER.unpack(f.read(WAY_NODES_HEADER.size))
+        if magic != WAY_NODES_MAGIC:
+            raise ValueError(f"{path} is not a way node file")
+        way_ids, offsets, refs = array.array('q'), array.array('I'), array.array('q')
+        way_ids.fromfile(f, n_ways)
+        offsets.fromfile(f, n_ways + 1)
+        refs.fromfile(f, offsets[-1])
+        node_ids, lats, lons = array.array('q'), array.array('d'), array.array('d')
+        node_ids.fromfile(f, n_nodes)
+        lats.fromfile(f, n_nodes)
+        lons.fromfile(f, n_nodes)
+    way_refs = {way_id: refs[offsets[i]:offsets[i + 1]].tolist() for i, way_id in enumerate(way_ids)}
+    return way_refs, dict(zip(node_ids, zip(lats, lons)))
+
+def extract_pois(path, bbox=None, workers=None, chunk_bytes=CHUNK_BYTES, way_nodes=None):
+    """
+    POIs of the tracked categories in an OSM XML extract, as poi_index.build_index
+    dicts. Ways are placed at the centroid of their nodes. workers=1 runs
+    in-process; compressed extracts are always read in a single pass.
+    A (way refs, node coordinates) pair passed as way_nodes is filled with
+    the placed ways' nodes.
+    """
+    workers = workers or os.cpu_count() or 1
+    if path.endswith((".bz2", ".gz")):
+        blocks, workers = [None], 1
+    else:
+        blocks = split_blocks(path, chunk_bytes)
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(blocks) > 1 else None
+    try:
+        scanned = _run(pool, _scan_block, path, blocks, bbox)
+        pois = {}
+        for nodes, _, _ in scanned:
+            for p in nodes:
+                pois[(p['category'], 'node', p['id'])] = p
+        ways = [w for _, block_ways, _ in scanned for w in block_ways]
+
+        if ways:
+            needed = frozenset(ref for _, _, _, refs in ways for ref in refs)
+            # Extracts list nodes first; blocks without nodes can be skipped
+            node_blocks = [block for block, (_, _, has_nodes) in zip(blocks, scanned) if has_nodes]
+            coords = {}
+            for found in _run(pool, _node_coords, path, node_blocks, needed):
+                coords.update(found)
+            for way_id, category, fields, refs in ways:
+                points = [coords[r] for r in refs if r in coords]
+                if not points:
+                    continue
+                lat = sum(p[0] for p in points) / len(points)
+                lon = sum(p[1] for p in points) / len(points)
+                if osm_extract.in_bbox(lat, lon, bbox):
+                    pois[(category, 'way', way_id)] = dict(fields, id=way_id, lat=lat, lon=lon,
+                                                          category=category, osm_type='way')
+                    if way_nodes is not None:
+                        way_nodes[0][way_id] = list(refs)
+                        way_nodes[1].update((r, coords[r]) for r in refs if r in coords)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return list(pois.values())
+
+def build_from_extract(path, output_path, bbox=None, workers=None, chunk_bytes=CHUNK_BYTES,
+                       way_nodes_path=POI_WAY_NODES_PATH):
+    """
+    Build the POI index file, and its way node file, from an OSM extract.
+    Returns the number of POIs written.
+    """
+    start = time.perf_counter()
+    way_nodes = ({}, {})
+    pois = extract_pois(path, bbox=bbox, workers=workers, chunk_bytes=chunk_bytes, way_nodes=way_nodes)
+    count = poi_index.build_index(pois, output_path)
+    save_way_nodes(way_nodes_path, *way_nodes)
+    logger.info("Built POI index from %s in %.1f s", path, time.perf_counter() - start)
+    return count
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the shared POI index from a local OSM extract")
+    parser.add_argument("extract")
+    parser.add_argument("output", nargs="?", default=poi_index.POI_INDEX_PATH)
+    parser.add_argument("--bbox", help="min_lat,min_lon,max_lat,max_lon")
+    parser.add_argument("--way-nodes", default=POI_WAY_NODES_PATH, help="way node file for poi_updates")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES // (1024 * 1024))
+    args = parser.parse_args()
+
+    build_from_extract(args.extract, args.output, bbox=osm_extract.parse_bbox(args.bbox),
+                       workers=args.workers, chunk_bytes=args.chunk_mb * 1024 * 1024, way_nodes_path=args.way_nodes)
@@ -0,0 +1,243 @@
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Read-only POI index shared by all server workers: the file is mmap'ed, so
+# every process reads the same page-cache pages instead of holding a copy.
+# Rebuilds are written to a temp file and swapped in with os.replace; readers
+# notice the new inode and remap.
+POI_INDEX_PATH = os.getenv("POI_INDEX_PATH", "poi_index.bin")
+POI_INDEX_CHECK_SECONDS = float(os.getenv("POI_INDEX_CHECK_SECONDS", 30))
+CELL_DEGREES = 0.01
+
+# Same names as osm_service.fetch_nearby types
+CATEGORIES = ('car_repair', 'hospital', 'police')
+OSM_TYPES = ('node', 'way')
+
+MAGIC = b"POI1"
+VERSION = 1
+# magic, version, categories, count, min_lat, min_lon, cell_deg, rows, cols, cells_off, records_off, strings_off
+HEADER = struct.Struct("<4sHHIdddIIQQQ")
+# osm id, lat, lon, category, osm type, (offset, length) of name, phone and type strings
+RECORD = struct.Struct("<qddBBIHIHIH")
+
+def _distance_m(lat1, lon1, lat2, lon2):
+    # Equirectangular approximation, plenty for ranking within a city
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371000.0 * math.hypot(x, y)
+
+def build_index(pois, path, cell_degrees=CELL_DEGREES):
+    """
+    Write POIs to an index file and atomically replace path with it.
+    Each POI is a dict with id, lat, lon, category, name, phone, type and
+    optionally osm_type ('node' or 'way'). Returns the number written.
+    """
+    pois = [p for p in pois if p.get('category') in CATEGORIES]
+    if pois:
+        min_lat = math.floor(min(p['lat'] for p in pois) / cell_degrees) * cell_degrees
+        min_lon = math.floor(min(p['lon'] for p in pois) / cell_degrees) * cell_degrees
+        rows = int((max(p['lat'] for p in pois) - min_lat) / cell_degrees) + 1
+        cols = int((max(p['lon'] for p in pois) - min_lon) / cell_degrees) + 1
+    else:
+        min_lat = min_lon = 0.0
+        rows = cols = 1
+    cells = rows * cols
+
+    def cell_of(p):
+        r = min(int((p['lat'] - min_lat) / cell_degrees), rows - 1)
+        c = min(int((p['lon'] - min_lon) / cell_degrees), cols - 1)
+        return r * cols + c
+
+    keyed = sorted((((CATEGORIES.index(p['category']), cell_of(p)), p) for p in pois), key=lambda kp: kp[0])
+
+    # For each category, offsets[cell]..offsets[cell + 1] is the record range
+    offsets = [0] * (len(CATEGORIES) * (cells + 1))
+    counts = {}
+    for (cat, cell), _ in keyed:
+        counts[(cat, cell)] = counts.get((cat, cell), 0) + 1
+    position = 0
+    for cat in range(len(CATEGORIES)):
+        base = cat * (cells + 1)
+        for cell in range(cells):
+            offsets[base + cell] = position
+            position += counts.get((cat, cell), 0)
+        offsets[base + cells] = position
+
+    strings = bytearray()
+    string_offsets = {}
+    def intern(text):
+        data = (text or "").encode("utf-8")[:0xFFFF]
+        if data not in string_offsets:
+            string_offsets[data] = len(strings)
+            strings.extend(data)
+        return string_offsets[data], len(data)
+
+    records = bytearray()
+    for (cat, _), p in keyed:
+        name = intern(p.get('name'))
+        phone = intern(p.get('phone'))
+        kind = intern(p.get('type'))
+        records += RECORD.pack(int(p['id']), p['lat'], p['lon'], cat, OSM_TYPES.index(p.get('osm_type', 'node')),
+                               name[0], name[1], phone[0], phone[1], kind[0], kind[1])
+
+    cells_off = HEADER.size
+    records_off = cells_off + 4 * len(offsets)
+    strings_off = records_off + len(records)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(CATEGORIES), len(keyed), min_lat, min_lon, cell_degrees,
+                            rows, cols, cells_off, records_off, strings_off))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(records)
+        f.write(strings)
+    os.replace(tmp_path, path)
+    logger.info("Wrote POI index with %d entries to %s", len(keyed), path)
+    return len(keyed)
+
+class PoiIndex:
+    """
+    Zero-copy reader over an index file written by build_index.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, n_categories, self.count, self.min_lat, self.min_lon, self.cell_degrees,
+         self.rows, self.cols, cells_off, self.records_off, self.strings_off) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a POI index file")
+        self.path = path
+        self.n_cells = self.rows * self.cols
+        self._offsets = memoryview(self._mm)[cells_off:self.records_off].cast('I')
+        self._checksum = None
+
+    def checksum(self):
+        """
+        CRC32 of the records; files derived from this index (nearest_raster)
+        store it to detect that the index has been rebuilt since.
+        """
+        if self._checksum is None:
+            self._checksum = zlib.crc32(self._mm[self.records_off:self.strings_off])
+        return self._checksum
+
+    def _string(self, offset, length):
+        start = self.strings_off + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def record(self, i):
+        """
+        Decode record i into the same dict shape osm_service.fetch_nearby returns.
+        """
+        (osm_id, lat, lon, cat, osm_type, name_off, name_len, phone_off, phone_len,
+         type_off, type_len) = RECORD.unpack_from(self._mm, self.records_off + i * RECORD.size)
+        return {
+            'id': osm_id,
+            'osm_type': OSM_TYPES[osm_type],
+            'category': CATEGORIES[cat],
+            'name': self._string(name_off, name_len),
+            'lat': lat,
+            'lon': lon,
+            'phone': self._string(phone_off, phone_len),
+            'type': self._string(type_off, type_len),
+        }
+
+    def records(self):
+        for i in range(self.count):
+            yield self.record(i)
+
+    def position(self, i):
+        """
+        (lat, lon) of record i without decoding the rest.
+        """
+        return struct.unpack_from("<dd", self._mm, self.records_off + i * RECORD.size + 8)
+
+    def _cell_range(self, cat, r, c):
+        base = cat * (self.n_cells + 1) + r * self.cols + c
+        return self._offsets[base], self._offsets[base + 1]
+
+    def nearest(self, lat, lon, category, limit=10, radius=10000):
+        """
+        Up to `limit` POIs of a category within radius meters, nearest first.
+        """
+        cat = CATEGORIES.index(category)
+        cr = int(math.floor((lat - self.min_lat) / self.cell_degrees))
+        cc = int(math.floor((lon - self.min_lon) / self.cell_degrees))
+        cell_m = self.cell_degrees * 111000 * math.cos(math.radians(lat))
+        max_ring = int(radius / cell_m) + 1
+        found = []
+        for ring in range(max_ring + 1):
+            for r in range(cr - ring, cr + ring + 1):
+                if r < 0 or r >= self.rows:
+                    continue
+                for c in range(cc - ring, cc + ring + 1):
+                    if c < 0 or c >= self.cols or max(abs(r - cr), abs(c - cc)) != ring:
+                        continue
+                    start, end = self._cell_range(cat, r, c)
+                    for i in range(start, end):
+                        plat, plon = self.position(i)
+                        d = _distance_m(lat, lon, plat, plon)
+                        if d <= radius:
+                            found.append((d, i))
+            # Cells in the next ring are at least ring * cell_m away
+            if len(found) >= limit and sorted(found)[limit - 1][0] <= ring * cell_m:
+                break
+        found.sort()
+        return [self.record(i) for _, i in found[:limit]]
+
+_index = None
+_index_checked = 0.0
+_index_lock = threading.Lock()
+
+def get_index(path=None):
+    """
+    The shared index, remapped when the file has been swapped; None if absent.
+    """
+    global _index, _index_checked
+    path = path or POI_INDEX_PATH
+    now = time.monotonic()
+    if _index is not None and now - _index_checked < POI_INDEX_CHECK_SECONDS:
+        return _index
+    with _index_lock:
+        _index_checked = now
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            _index = None
+            return None
+        if _index is None or _index.path != path or (st.st_ino, st.st_mtime_ns) != (_index.stat.st_ino, _index.stat.st_mtime_ns):
+            try:
+                _index = PoiIndex(path)
+                logger.info("Mapped POI index %s (%d entries)", path, _index.count)
+            except Exception as e:
+                logger.error("Failed to map POI index %s: %s", path, e)
+                _index = None
+    return _index
+
+if __name__ == "__main__":
+    import argparse
+
+    import osm_service
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the shared POI index from Overpass")
+    parser.add_argument("output", nargs="?", default=POI_INDEX_PATH)
+    parser.add_argument("--center", action="append", default=[], help="lat,lon of a service city (repeatable)")
+    parser.add_argument("--radius", type=int, default=25000, help="meters around each center")
+    args = parser.parse_args()
+
+    centers = [tuple(float(x) for x in c.split(",")) for c in args.center] or [(21.1458, 79.0882)]  # Nagpur
+    pois = {}
+    for lat, lon in centers:
+        for category in CATEGORIES:
+            for p in osm_service.query_overpass(lat, lon, types=[category], radius=args.radius):
+                pois[(category, p['id'])] = dict(p, category=category)
+    build_index(pois.values(), args.output)
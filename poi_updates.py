@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+
+import nearest_raster
+import osm_extract
+import poi_extract
+import poi_index
+
+logger = logging.getLogger(__name__)
+
+# Incremental POI updates from OSM replication diffs (osmChange XML, .osc or
+# .osc.gz). The current index is read back into a dict keyed by (osm type, id),
+# the create / modify / delete actions for the tracked tags are applied in
+# document order, and the index is rebuilt and swapped in with os.replace, so
+# readers keep querying the old file until the new one is complete.
+# Ways are placed from their node refs, looked up in the diff and then in the
+# way node file poi_extract writes; a way is only moved when every ref
+# resolves. The last applied replication sequence is kept in a state file;
+# diffs at or below it are skipped, and re-applying a diff is harmless. A diff
+# that leaves a tracked way unplaced is not recorded as applied, so the state
+# never moves past a POI that was dropped.
+POI_UPDATES_STATE_PATH = os.getenv("POI_UPDATES_STATE_PATH", "poi_replication_state.json")
+ACTIONS = ("create", "modify", "delete")
+
+def parse_change(path):
+    """
+    Node and way changes of an osmChange file, in document order, as
+    (action, element) with elements shaped like osm_extract.iter_elements.
+    Deleted elements may come without coordinates or tags.
+    """
+    changes = []
+    action = action_el = None
+    with osm_extract.open_extract(path) as f:
+        for event, el in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if el.tag in ACTIONS:
+                    action, action_el = el.tag, el
+                continue
+            if el.tag in ACTIONS:
+                action = action_el = None
+                el.clear()
+            elif action is not None and el.tag in ("node", "way", "relation"):
+                if el.tag == "node":
+                    lat, lon = el.get('lat'), el.get('lon')
+                    changes.append((action, {
+                        'type': 'node',
+                        'id': int(el.get('id')),
+                        'lat': None if lat is None else float(lat),
+                        'lon': None if lon is None else float(lon),
+                        'tags': {t.get('k'): t.get('v') for t in el.iter('tag')},
+                    }))
+                elif el.tag == "way":
+                    changes.append((action, {
+                        'type': 'way',
+                        'id': int(el.get('id')),
+                        'refs': [int(nd.get('ref')) for nd in el.iter('nd')],
+                        'tags': {t.get('k'): t.get('v') for t in el.iter('tag')},
+                    }))
+                # Drop the finished element from its action block, not the whole document
+                action_el.remove(el)
+    return changes
+
+def load_pois(index_path):
+    """
+    POIs of an existing index keyed by (osm type, id); empty if there is none.
+    """
+    if not os.path.exists(index_path):
+        return {}
+    index = poi_index.PoiIndex(index_path)
+    return {(p['osm_type'], p['id']): p for p in index.records()}
+
+def _centroid(points):
+    return sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)
+
+def apply_changes(pois, changes, bbox=None, way_nodes=None):
+    """
+    Apply parsed changes to pois in place. way_nodes is the (way refs, node
+    coordinates) pair of poi_extract.load_way_nodes, updated in place. A way
+    is placed at the centroid of its nodes once every ref resolves; otherwise
+    a known way keeps its old position and a new one is skipped as unlocated.
+    Ways whose nodes moved are re-placed too. Returns counts by outcome.
+    """
+    counts = {"created": 0, "modified": 0, "deleted": 0, "unlocated": 0}
+    way_refs, node_coords = way_nodes if way_nodes is not None else ({}, {})
+    coords = {el['id']: (el['lat'], el['lon']) for action, el in changes
+              if el['type'] == 'node' and action != "delete" and el['lat'] is not None}
+    # Nodes of tracked ways that this diff moves
+    moved = {n for n in coords if n in node_coords and node_coords[n] != coords[n]}
+    node_coords.update((n, coords[n]) for n in moved)
+
+    for action, el in changes:
+        key = (el['type'], el['id'])
+        category = None if action == "delete" else poi_extract.category_of(el['tags'])
+        if category is None:
+            # Deleted, or no longer tagged as something we track
+            if el['type'] == 'way':
+                way_refs.pop(el['id'], None)
+            if pois.pop(key, None) is not None:
+                counts["deleted"] += 1
+            continue
+
+        if el['type'] == 'node':
+            lat, lon = el['lat'], el['lon']
+        else:
+            points = [coords.get(r) or node_coords.get(r) for r in el['refs']]
+            way_refs[el['id']] = list(el['refs'])
+            node_coords.update((r, p) for r, p in zip(el['refs'], points) if p)
+            if points and all(points):
+                lat, lon = _centroid(points)
+            elif key in pois:
+                lat, lon = pois[key]['lat'], pois[key]['lon']
+            else:
+                counts["unlocated"] += 1
+                continue
+        if not osm_extract.in_bbox(lat, lon, bbox):
+            if el['type'] == 'way':
+                way_refs.pop(el['id'], None)
+            if pois.pop(key, None) is not None:
+                counts["deleted"] += 1
+            continue
+
+        counts["modified" if key in pois else "created"] += 1
+        pois[key] = dict(poi_extract.poi_fields(el['tags']), id=el['id'], lat=lat, lon=lon,
+                         category=category, osm_type=el['type'])
+
+    if moved:
+        # Ways the diff doesn't list but whose nodes it moves
+        listed = {el['id'] for _, el in changes if el['type'] == 'way'}
+        for way_id, refs in list(way_refs.items()):
+            key = ('way', way_id)
+            if way_id in listed or key not in pois or moved.isdisjoint(refs):
+                continue
+            points = [node_coords.get(r) for r in refs]
+            if not all(points):
+                continue
+            lat, lon = _centroid(points)
+            if osm_extract.in_bbox(lat, lon, bbox):
+                pois[key] = dict(pois[key], lat=lat, lon=lon)
+                counts["modified"] += 1
+            else:
+                del pois[key], way_refs[way_id]
+                counts["deleted"] += 1
+    return counts
+
+def read_state(state_path=POI_UPDATES_STATE_PATH):
+    """
+    {"sequence", "timestamp"} of the last applied diff, or None.
+    """
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_state(sequence, state_path=POI_UPDATES_STATE_PATH):
+    tmp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"sequence": sequence, "timestamp": time.time()}, f)
+    os.replace(tmp_path, state_path)
+
+def update(diffs, index_path=None, state_path=POI_UPDATES_STATE_PATH, raster_path=None, bbox=None,
+           way_nodes_path=None):
+    """
+    Apply diffs, a list of (path, replication sequence) in sequence order, to
+    the POI index. The nearest-POI raster is rebuilt if it exists; otherwise it
+    would be ignored until rebuilt, as its checksum no longer matches.
+    Returns the sequence recorded in the state file: the last diff applied,
+    or the one before the first diff that left a way unlocated.
+    """
+    index_path = index_path or poi_index.POI_INDEX_PATH
+    raster_path = raster_path or nearest_raster.NEAREST_RASTER_PATH
+    way_nodes_path = way_nodes_path or poi_extract.POI_WAY_NODES_PATH
+    state = read_state(state_path)
+    reached = state["sequence"] if state else None
+    pending = [(path, sequence) for path, sequence in diffs if reached is None or sequence > reached]
+    if len(pending) < len(diffs):
+        logger.info("Skipping %d diffs at or below sequence %s", len(diffs) - len(pending), reached)
+    if not pending:
+        return reached
+
+    pois = load_pois(index_path)
+    way_nodes = poi_extract.load_way_nodes(way_nodes_path)
+    recorded, held = reached, False
+    for path, sequence in pending:
+        counts = apply_changes(pois, parse_change(path), bbox, way_nodes)
+        logger.info("Applied %s (sequence %d): %s", path, sequence, counts)
+        if counts["unlocated"] and not held:
+            # Re-applied on every run until the index is rebuilt from an extract
+            logger.warning("%d tracked ways in %s have nodes outside the diff and the way node file; "
+                           "keeping the state at sequence %s", counts["unlocated"], path, recorded)
+            held = True
+        if not held:
+            recorded = sequence
+
+    poi_index.build_index(pois.values(), index_path)
+    poi_extract.save_way_nodes(way_nodes_path, *way_nodes)
+    if os.path.exists(raster_path):
+        # Keep the resolution the raster was built with
+        cell_degrees = nearest_raster.NearestRaster(raster_path).cell_degrees
+        nearest_raster.build_raster(poi_index.PoiIndex(index_path), raster_path, cell_degrees=cell_degrees)
+    # Recorded last: a crash before this re-applies the same diffs next time
+    if recorded is not None:
+        write_state(recorded, state_path)
+    return recorded
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Apply OSM replication diffs to the POI index")
+    parser.add_argument("diffs", nargs="+", help="osmChange files, in order")
+    parser.add_argument("--sequence", type=int, required=True, help="replication sequence of the first diff")
+    parser.add_argument("--index", default=poi_index.POI_INDEX_PATH)
+    parser.add_argument("--state", default=POI_UPDATES_STATE_PATH)
+    parser.add_argument("--way-nodes", default=poi_extract.POI_WAY_NODES_PATH)
+    parser.add_argument("--bbox", help="min_lat,min_lon,max_lat,max_lon")
+    args = parser.parse_args()
+
+    diffs = [(path, args.sequence + i) for i, path in enumerate(args.diffs)]
+    reached = update(diffs, index_path=args.index, state_path=args.state, bbox=osm_extract.parse_bbox(args.bbox),
+                     way_nodes_path=args.way_nodes)
+    print(f"POI index at replication sequence {reached}")
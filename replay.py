@@ -0,0 +1,213 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cassette
+import logging_config
+
+logger = logging.getLogger(__name__)
+
+# Replays recorded assistance requests (the request log written by
+# logging_config.log_request) with their original inter-arrival timing,
+# optionally compressed, and reports throughput, latency and decision diffs.
+# Follow-ups name the incident the server issued to an earlier request; the
+# log records each response's incident id, so a follow-up is sent with the id
+# its original request got in this replay. Follow-ups whose original request
+# isn't replayed are skipped.
+
+# Fields of server.AssistanceRequest; keep in step with it
+REQUEST_FIELDS = ("user_text", "user_location", "request_count_last_10_min", "cancel_count_today",
+                  "incident_id", "include_route")
+# Fields of the response compared between builds
+DECISION_FIELDS = ("status", "priority", "issue_type", "mechanic_id", "eta_minutes")
+
+def read_requests(path):
+    """
+    Recorded requests as (ts, payload, issued incident id or None), ordered by timestamp.
+    """
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            payload = {k: entry[k] for k in REQUEST_FIELDS if k in entry}
+            payload.setdefault("user_text", "")
+            entries.append((entry.get("ts"), payload, entry.get("issued_incident_id")))
+    if entries and all(ts is not None for ts, _, _ in entries):
+        entries.sort(key=lambda e: e[0])
+    return entries
+
+def make_target(target):
+    """
+    Return a callable payload -> response dict for 'direct', 'app' or a base URL.
+    """
+    if target == "direct":
+        import backend_logic
+        return backend_logic.handle_assistance_request
+    if target == "app":
+        # Goes through routing, validation and serialization in-process
+        from fastapi.testclient import TestClient
+        import server
+        client = TestClient(server.app)
+        def call_app(payload):
+            response = client.post("/api/request-assistance", json=payload)
+            response.raise_for_status()
+            return response.json()
+        return call_app
+
+    import requests
+    session = requests.Session()
+    url = target.rstrip("/") + "/api/request-assistance"
+    def call_http(payload):
+        response = session.post(url, json=payload, timeout=60)
+        response.raise_for_status()
+        return response.json()
+    return call_http
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+def replay(entries, call, speedup=1.0, max_workers=32):
+    """
+    Open-loop replay: each request starts at its recorded offset / speedup,
+    regardless of how long earlier ones take; a follow-up also waits for the
+    response to its original request. Returns per-request results.
+    """
+    results = [None] * len(entries)
+    t0 = entries[0][0] if entries and entries[0][0] is not None else None
+    start = time.perf_counter()
+    lock = threading.Lock()
+    # Recorded incident id -> index of the request it was issued to
+    origins = {}
+    for i, (_, payload, issued) in enumerate(entries):
+        if issued and not payload.get("incident_id"):
+            origins.setdefault(issued, i)
+    issued_events = {i: threading.Event() for i in origins.values()}
+    replay_ids = {}
+
+    def skip(i, payload, reason):
+        with lock:
+            results[i] = {"index": i, "request": payload, "skipped": reason,
+                          "latency_ms": 0.0, "lag_ms": 0.0, "error": None, "decision": None}
+
+    def run(i, scheduled, payload):
+        response = None
+        try:
+            recorded_id = payload.get("incident_id")
+            if recorded_id:
+                origin = origins.get(recorded_id)
+                if origin is None or origin > i:
+                    return skip(i, payload, "original request not replayed")
+                issued_events[origin].wait()
+                if not replay_ids.get(origin):
+                    return skip(i, payload, "original request got no incident")
+                payload = dict(payload, incident_id=replay_ids[origin])
+            began = time.perf_counter()
+            try:
+                response, error = call(dict(payload)), None
+            except Exception as e:
+                response, error = None, str(e)
+            finished = time.perf_counter()
+            with lock:
+                results[i] = {
+                    "index": i,
+                    "request": payload,
+                    "latency_ms": (finished - began) * 1000,
+                    "lag_ms": (began - start - scheduled) * 1000,
+                    "error": error,
+                    "decision": {k: response.get(k) for k in DECISION_FIELDS} if response else None,
+                }
+        finally:
+            if i in issued_events:
+                replay_ids[i] = response.get("incident_id") if response else None
+                issued_events[i].set()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="replay") as pool:
+        for i, (ts, payload, _) in enumerate(entries):
+            scheduled = (ts - t0) / speedup if t0 is not None and ts is not None else 0.0
+            delay = start + scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, i, scheduled, payload)
+    return results, time.perf_counter() - start
+
+def summarize(results, wall_seconds):
+    skipped = sum(1 for r in results if r.get("skipped"))
+    results = [r for r in results if not r.get("skipped")]
+    latencies = sorted(r["latency_ms"] for r in results if not r["error"])
+    lags = sorted(r["lag_ms"] for r in results)
+    statuses = {}
+    for r in results:
+        status = r["decision"]["status"] if r["decision"] else "error"
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        "requests": len(results),
+        "skipped": skipped,
+        "errors": sum(1 for r in results if r["error"]),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(results) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {p: round(percentile(latencies, p), 2) for p in (50, 90, 99)} | {"max": round(latencies[-1], 2) if latencies else 0.0},
+        "schedule_lag_ms_p99": round(percentile(lags, 99), 2),
+        "statuses": statuses,
+    }
+
+def diff_decisions(baseline, current):
+    """
+    Compare decisions of two runs over the same log, matched by index;
+    requests skipped in either run are left out. Returns [(index, field, before, after)].
+    """
+    before = {r["index"]: r for r in baseline}
+    changes = []
+    for r in current:
+        old = before.get(r["index"])
+        if old is None or old.get("skipped") or r.get("skipped"):
+            continue
+        old_decision, new_decision = old.get("decision") or {}, r.get("decision") or {}
+        for field in DECISION_FIELDS:
+            if old_decision.get(field) != new_decision.get(field):
+                changes.append((r["index"], field, old_decision.get(field), new_decision.get(field)))
+    return changes
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay recorded assistance requests")
+    parser.add_argument("log", nargs="?", default=logging_config.REQUEST_LOG_PATH)
+    parser.add_argument("--target", default="direct", help="'direct', 'app' or a base URL like http://localhost:9000")
+    parser.add_argument("--speedup", type=float, default=1.0, help="compress inter-arrival gaps, e.g. 10 or 100")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--out", help="write per-request results (JSONL) for later comparison")
+    parser.add_argument("--compare", help="results file of a previous build to diff decisions against")
+    parser.add_argument("--cassette", help="upstream cassette file (see cassette.py)")
+    parser.add_argument("--cassette-mode", choices=(cassette.MODE_RECORD, cassette.MODE_REPLAY))
+    parser.add_argument("--cassette-latency", choices=(cassette.LATENCY_RECORDED, cassette.LATENCY_ZERO))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.cassette or args.cassette_mode:
+        # Applies to the in-process targets; a URL target uses the server's own settings
+        cassette.configure(mode=args.cassette_mode, path=args.cassette, latency=args.cassette_latency)
+    entries = read_requests(args.log)[:args.limit]
+    results, wall = replay(entries, make_target(args.target), speedup=args.speedup, max_workers=args.workers)
+    print(json.dumps(summarize(results, wall), indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = [json.loads(line) for line in f if line.strip()]
+        changes = diff_decisions(baseline, results)
+        changed = len({index for index, _, _, _ in changes})
+        print(f"\n{changed} of {len(results)} decisions changed")
+        for index, field, old, new in changes:
+            print(f"  #{index} {field}: {old!r} -> {new!r}")
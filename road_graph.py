@@ -0,0 +1,498 @@
+import array
+import heapq
+import logging
+import math
+import os
+import struct
+import sys
+
+import osm_extract
+
+logger = logging.getLogger(__name__)
+
+# Typical driving speeds (km/h) on Indian city roads, per OSM highway class
+SPEED_KMH = {
+    'motorway': 80, 'motorway_link': 50,
+    'trunk': 60, 'trunk_link': 40,
+    'primary': 45, 'primary_link': 35,
+    'secondary': 35, 'secondary_link': 30,
+    'tertiary': 30, 'tertiary_link': 25,
+    'unclassified': 25, 'residential': 20,
+    'living_street': 10, 'service': 15, 'road': 20,
+}
+
+# Driving speed assumed for the leg between a coordinate and its snapped node
+SNAP_SPEED_KMH = 15
+MAX_SNAP_METERS = 2000
+GRID_DEGREES = 0.01
+# Nodes settled per witness search while contracting; higher finds more
+# witnesses (fewer shortcuts) at a higher preprocessing cost
+WITNESS_SETTLE_LIMIT = 60
+
+MAGIC = b"RGR2"
+# magic, nodes, edges, upward CH edges, downward CH edges
+HEADER = struct.Struct("<4sIIII")
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    r = 6371000.0
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * r * math.asin(math.sqrt(a))
+
+def _oneway(tags):
+    value = tags.get('oneway')
+    if value in ('yes', '1', 'true'):
+        return 1
+    if value == '-1':
+        return -1
+    if value == 'no':
+        return 0
+    if tags.get('highway') in ('motorway', 'motorway_link') or tags.get('junction') == 'roundabout':
+        return 1
+    return 0
+
+def _contract(n, edges):
+    """
+    Contraction hierarchy over (u, v, duration_s, distance_m) edges. Nodes are
+    contracted in lazily updated edge-difference order; each contracted node
+    keeps its edges to the nodes still left, which are all higher ranked.
+    Returns (up, down): per node, lists of (other node, duration, distance,
+    middle node or -1) for edges v -> higher and higher -> v.
+    """
+    out_adj = [{} for _ in range(n)]
+    in_adj = [{} for _ in range(n)]
+    for u, v, dur, dist in edges:
+        if u != v and (v not in out_adj[u] or dur < out_adj[u][v][0]):
+            out_adj[u][v] = in_adj[v][u] = (dur, dist, -1)
+
+    def witness_dist(source, skip, max_cost):
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        while heap:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            settled += 1
+            if d > max_cost or settled > WITNESS_SETTLE_LIMIT:
+                break
+            for y, (w, _, _) in out_adj[x].items():
+                nd = d + w
+                if y != skip and nd < dist.get(y, math.inf):
+                    dist[y] = nd
+                    heapq.heappush(heap, (nd, y))
+        return dist
+
+    def shortcuts(v):
+        found = []
+        outs = out_adj[v]
+        if not outs:
+            return found
+        max_out = max(w for w, _, _ in outs.values())
+        for u, (wu, du, _) in in_adj[v].items():
+            dist = witness_dist(u, v, wu + max_out)
+            for w, (ww, dw, _) in outs.items():
+                if w != u and dist.get(w, math.inf) > wu + ww:
+                    found.append((u, w, wu + ww, du + dw))
+        return found
+
+    deleted = [0] * n
+    depth = [0] * n
+    def priority(v):
+        return len(shortcuts(v)) - len(in_adj[v]) - len(out_adj[v]) + deleted[v] + depth[v]
+
+    heap = [(priority(v), v) for v in range(n)]
+    heapq.heapify(heap)
+    up = [None] * n
+    down = [None] * n
+    while heap:
+        _, v = heapq.heappop(heap)
+        if up[v] is not None:
+            continue
+        p = priority(v)
+        if heap and p > heap[0][0]:
+            heapq.heappush(heap, (p, v))
+            continue
+        added = shortcuts(v)
+        up[v] = [(w, dur, dist, mid) for w, (dur, dist, mid) in out_adj[v].items()]
+        down[v] = [(u, dur, dist, mid) for u, (dur, dist, mid) in in_adj[v].items()]
+        for u in in_adj[v]:
+            del out_adj[u][v]
+        for w in out_adj[v]:
+            del in_adj[w][v]
+        for x in set(in_adj[v]) | set(out_adj[v]):
+            deleted[x] += 1
+            depth[x] = max(depth[x], depth[v] + 1)
+        out_adj[v] = in_adj[v] = None
+        for u, w, dur, dist in added:
+            if w not in out_adj[u] or dur < out_adj[u][w][0]:
+                out_adj[u][w] = in_adj[w][u] = (dur, dist, v)
+    return up, down
+
+def _ch_arrays(lists):
+    offsets = array.array('I', [0])
+    others, durations, distances, mids = array.array('I'), array.array('f'), array.array('f'), array.array('i')
+    for entries in lists:
+        for other, dur, dist, mid in entries:
+            others.append(other)
+            durations.append(dur)
+            distances.append(dist)
+            mids.append(mid)
+        offsets.append(len(others))
+    return offsets, others, durations, distances, mids
+
+def _csr(n, edges):
+    """
+    Build compressed adjacency arrays from (u, v, duration_s, distance_m) tuples.
+    """
+    edges.sort(key=lambda e: e[0])
+    offsets = array.array('I', [0]) * (n + 1)
+    for u, _, _, _ in edges:
+        offsets[u + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    targets = array.array('I', (e[1] for e in edges))
+    durations = array.array('f', (e[2] for e in edges))
+    distances = array.array('f', (e[3] for e in edges))
+    return offsets, targets, durations, distances
+
+def build_graph(extract_path, output_path, bbox=None):
+    """
+    Preprocess a local OSM extract into a routable graph file.
+    Keeps the largest connected road network inside bbox and adds a
+    contraction hierarchy for point-to-point queries.
+    """
+    ways = []
+    needed = set()
+    for el in osm_extract.iter_elements(extract_path):
+        if el['type'] != 'way':
+            continue
+        speed = SPEED_KMH.get(el['tags'].get('highway'))
+        if speed and len(el['refs']) > 1:
+            ways.append((el['refs'], speed, _oneway(el['tags'])))
+            needed.update(el['refs'])
+
+    coords = {}
+    for el in osm_extract.iter_elements(extract_path):
+        if el['type'] == 'node' and el['id'] in needed and osm_extract.in_bbox(el['lat'], el['lon'], bbox):
+            coords[el['id']] = (el['lat'], el['lon'])
+    logger.info("Read %d road ways, %d nodes", len(ways), len(coords))
+
+    index = {}
+    raw_edges = []
+    for refs, speed, oneway in ways:
+        for a, b in zip(refs, refs[1:]):
+            if a not in coords or b not in coords:
+                continue
+            u = index.setdefault(a, len(index))
+            v = index.setdefault(b, len(index))
+            dist = haversine_m(*coords[a], *coords[b])
+            dur = dist / (speed / 3.6)
+            if oneway >= 0:
+                raw_edges.append((u, v, dur, dist))
+            if oneway <= 0:
+                raw_edges.append((v, u, dur, dist))
+
+    # Keep the largest (weakly) connected component so snapping never lands on an island
+    parent = list(range(len(index)))
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for u, v, _, _ in raw_edges:
+        ru, rv = find(u), find(v)
+        if ru != rv:
+            parent[ru] = rv
+    sizes = {}
+    for i in range(len(index)):
+        r = find(i)
+        sizes[r] = sizes.get(r, 0) + 1
+    if not sizes:
+        raise ValueError(f"No drivable roads found in {extract_path}")
+    main = max(sizes, key=sizes.get)
+
+    remap = {}
+    lats = array.array('d')
+    lons = array.array('d')
+    for osm_id, i in index.items():
+        if find(i) == main:
+            remap[i] = len(remap)
+            lat, lon = coords[osm_id]
+            lats.append(lat)
+            lons.append(lon)
+    n = len(remap)
+    edges = [(remap[u], remap[v], dur, dist) for u, v, dur, dist in raw_edges if u in remap]
+    offsets, targets, durations, distances = _csr(n, edges)
+    up, down = _contract(n, edges)
+    up_arrays = _ch_arrays(up)
+    down_arrays = _ch_arrays(down)
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, n, len(targets), len(up_arrays[1]), len(down_arrays[1])))
+        for arr in (lats, lons, offsets, targets, durations, distances, *up_arrays, *down_arrays):
+            arr.tofile(f)
+    os.replace(tmp_path, output_path)
+    logger.info("Wrote road graph with %d nodes, %d edges to %s", n, len(targets), output_path)
+    return n, len(targets)
+
+class RoadGraph:
+    """
+    In-process router over a graph file written by build_graph.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, n, m, n_up, n_down = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a road graph file")
+            def read(typecode, count):
+                arr = array.array(typecode)
+                arr.fromfile(f, count)
+                return arr
+            self.lats = read('d', n)
+            self.lons = read('d', n)
+            self.offsets = read('I', n + 1)
+            self.targets = read('I', m)
+            self.durations = read('f', m)
+            self.distances = read('f', m)
+            # Contraction hierarchy: edges to higher ranked nodes, and from them
+            self.up = (read('I', n + 1), read('I', n_up), read('f', n_up), read('f', n_up), read('i', n_up))
+            self.down = (read('I', n + 1), read('I', n_down), read('f', n_down), read('f', n_down), read('i', n_down))
+        self.num_nodes = n
+        self.grid = {}
+        for i in range(n):
+            cell = (int(self.lats[i] // GRID_DEGREES), int(self.lons[i] // GRID_DEGREES))
+            self.grid.setdefault(cell, []).append(i)
+        logger.info("Loaded road graph %s (%d nodes, %d edges)", path, n, m)
+
+    def nearest_node(self, lat, lon):
+        """
+        Snap a coordinate to the closest graph node. Returns (node, meters) or (None, inf).
+        """
+        cy, cx = int(lat // GRID_DEGREES), int(lon // GRID_DEGREES)
+        best, best_d = None, math.inf
+        max_rings = int(MAX_SNAP_METERS / (GRID_DEGREES * 111000)) + 1
+        for ring in range(max_rings + 1):
+            for dy in range(-ring, ring + 1):
+                for dx in range(-ring, ring + 1):
+                    if max(abs(dy), abs(dx)) != ring:
+                        continue
+                    for i in self.grid.get((cy + dy, cx + dx), ()):
+                        d = haversine_m(lat, lon, self.lats[i], self.lons[i])
+                        if d < best_d:
+                            best, best_d = i, d
+            # Anything in the next ring is at least `ring` cells away
+            if best is not None and best_d <= ring * GRID_DEGREES * 111000 * math.cos(math.radians(lat)):
+                break
+        if best_d > MAX_SNAP_METERS:
+            return None, math.inf
+        return best, best_d
+
+    def _find(self, edges, v, other):
+        offsets, others = edges[0], edges[1]
+        for e in range(offsets[v], offsets[v + 1]):
+            if others[e] == other:
+                return e
+        raise ValueError(f"No CH edge between {v} and {other}")
+
+    def _unpack(self, u, w, mid, nodes):
+        # Append the original nodes after u on the CH edge u -> w
+        stack = [(u, w, mid)]
+        while stack:
+            a, b, m = stack.pop()
+            if m < 0:
+                nodes.append(b)
+                continue
+            # m was contracted before a and b: a -> m is stored at m as incoming, m -> b as outgoing
+            e_in = self._find(self.down, m, a)
+            e_out = self._find(self.up, m, b)
+            stack.append((m, b, self.up[4][e_out]))
+            stack.append((a, m, self.down[4][e_in]))
+
+    def shortest_path(self, source, target):
+        """
+        Bidirectional search over the contraction hierarchy between two nodes.
+        Returns (duration_s, distance_m, [nodes]) or None if unreachable.
+        """
+        up_offsets, up_others, up_durations, _, _ = self.up
+        down_offsets, down_others, down_durations, _, _ = self.down
+        dists = ({source: 0.0}, {target: 0.0})
+        parents = ({source: None}, {target: None})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        # Forward relaxes edges to higher nodes; backward walks edges from higher nodes in reverse
+        relax = ((up_offsets, up_others, up_durations), (down_offsets, down_others, down_durations))
+        # ...and each side is stalled through the other's edge set
+        stall = (relax[1], relax[0])
+        best, meet = math.inf, None
+        inf = math.inf
+        heappop, heappush = heapq.heappop, heapq.heappush
+        while heaps[0] or heaps[1]:
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            heap = heaps[side]
+            d, u = heappop(heap)
+            if d >= best:
+                # Everything left on this side is at least as far
+                heap.clear()
+                continue
+            dist = dists[side]
+            if d > dist[u]:
+                continue
+            other = dists[1 - side].get(u)
+            if other is not None and d + other < best:
+                best, meet = d + other, u
+            # Stall-on-demand: u is reached more cheaply through a higher node
+            offsets, others, weights = stall[side]
+            stalled = False
+            for e in range(offsets[u], offsets[u + 1]):
+                if dist.get(others[e], inf) + weights[e] < d:
+                    stalled = True
+                    break
+            if stalled:
+                continue
+            offsets, others, weights = relax[side]
+            parent = parents[side]
+            for e in range(offsets[u], offsets[u + 1]):
+                v = others[e]
+                nd = d + weights[e]
+                if nd < dist.get(v, inf):
+                    dist[v] = nd
+                    parent[v] = (u, e)
+                    heappush(heap, (nd, v))
+        if meet is None:
+            return None
+
+        # CH edges source -> meet (upward) and meet -> target (downward, stored at the lower end)
+        forward = []
+        v = meet
+        while parents[0][v] is not None:
+            u, e = parents[0][v]
+            forward.append((u, v, e))
+            v = u
+        forward.reverse()
+        backward = []
+        v = meet
+        while parents[1][v] is not None:
+            u, e = parents[1][v]
+            backward.append((v, u, e))
+            v = u
+        nodes = [source]
+        meters = 0.0
+        for u, v, e in forward:
+            self._unpack(u, v, self.up[4][e], nodes)
+            meters += self.up[3][e]
+        for u, v, e in backward:
+            self._unpack(u, v, self.down[4][e], nodes)
+            meters += self.down[3][e]
+        return best, meters, nodes
+
+    def durations_from(self, origin, points):
+        """
+        One-to-many travel times in seconds from origin to each point, using a
+        single Dijkstra search. Unreachable or unsnappable points get None.
+        """
+        s, s_off = self.nearest_node(origin['lat'], origin['lon'])
+        if s is None:
+            return [None] * len(points)
+        snapped = [self.nearest_node(p['lat'], p['lon']) for p in points]
+        pending = {node for node, _ in snapped if node is not None}
+        dist = {s: 0.0}
+        heap = [(0.0, s)]
+        settled = set()
+        while heap and pending:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            pending.discard(u)
+            for e in range(self.offsets[u], self.offsets[u + 1]):
+                v = self.targets[e]
+                nd = d + self.durations[e]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        snap_speed = SNAP_SPEED_KMH / 3.6
+        results = []
+        for node, off in snapped:
+            if node is None or node not in settled:
+                results.append(None)
+            else:
+                results.append(dist[node] + (s_off + off) / snap_speed)
+        return results
+
+    def route(self, start_loc, end_loc):
+        """
+        Same result shape as osrm_service.get_route, or None if either end
+        can't be snapped or there is no path.
+        """
+        s, s_off = self.nearest_node(start_loc['lat'], start_loc['lon'])
+        t, t_off = self.nearest_node(end_loc['lat'], end_loc['lon'])
+        if s is None or t is None:
+            return None
+        path = self.shortest_path(s, t)
+        if not path:
+            return None
+        seconds, meters, _ = path
+        off_road = s_off + t_off
+        seconds += off_road / (SNAP_SPEED_KMH / 3.6)
+        meters += off_road
+        return {
+            "distance_km": round(meters / 1000, 2),
+            "duration_min": round(seconds / 60)
+        }
+
+    def route_geometry(self, start_loc, end_loc):
+        """
+        The route's polyline as {"points": [(lat, lon)], "seconds": [cumulative
+        travel time at each point]}, including the off-road legs at both ends;
+        None if either end can't be snapped or there is no path.
+        """
+        s, s_off = self.nearest_node(start_loc['lat'], start_loc['lon'])
+        t, t_off = self.nearest_node(end_loc['lat'], end_loc['lon'])
+        if s is None or t is None:
+            return None
+        path = self.shortest_path(s, t)
+        if not path:
+            return None
+        snap_speed = SNAP_SPEED_KMH / 3.6
+        points = [(start_loc['lat'], start_loc['lon']), (self.lats[s], self.lons[s])]
+        seconds = [0.0, s_off / snap_speed]
+        nodes = path[2]
+        for u, v in zip(nodes, nodes[1:]):
+            # The search relaxed the fastest u -> v edge
+            step = min(self.durations[e] for e in range(self.offsets[u], self.offsets[u + 1]) if self.targets[e] == v)
+            points.append((self.lats[v], self.lons[v]))
+            seconds.append(seconds[-1] + step)
+        points.append((end_loc['lat'], end_loc['lon']))
+        seconds.append(seconds[-1] + t_off / snap_speed)
+        return {"points": points, "seconds": seconds}
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build or query the local road graph")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Preprocess an OSM XML extract")
+    build.add_argument("extract")
+    build.add_argument("output")
+    build.add_argument("--bbox", help="min_lat,min_lon,max_lat,max_lon")
+    query = sub.add_parser("route", help="Time a point-to-point query")
+    query.add_argument("graph")
+    query.add_argument("coords", nargs=4, type=float, metavar=("LAT1", "LON1", "LAT2", "LON2"))
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_graph(args.extract, args.output, bbox=osm_extract.parse_bbox(args.bbox))
+    else:
+        graph = RoadGraph(args.graph)
+        start = {"lat": args.coords[0], "lon": args.coords[1]}
+        end = {"lat": args.coords[2], "lon": args.coords[3]}
+        t0 = time.perf_counter()
+        result = graph.route(start, end)
+        print(f"{result} in {(time.perf_counter() - t0) * 1000:.3f} ms")
+        sys.exit(0 if result else 1)
@@ -0,0 +1,137 @@
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import metrics
+import osrm_service
+
+logger = logging.getLogger(__name__)
+
+# The route for the map view, as an encoded polyline (Google's format,
+# 1e-5 degree precision) after Douglas-Peucker simplification: points closer
+# than the tolerance to the simplified line are dropped, which leaves long
+# straight highway stretches as a handful of vertices.
+ROUTE_POLYLINE_TOLERANCE_METERS = float(os.getenv("ROUTE_POLYLINE_TOLERANCE_METERS", 15))
+ROUTE_POLYLINE_CACHE_SIZE = int(os.getenv("ROUTE_POLYLINE_CACHE_SIZE", 2000))
+PRECISION = 5
+METERS_PER_DEGREE = 111195.0
+
+ROUTE_POLYLINE_POINTS = metrics.Histogram(
+    "route_polyline_points", "Vertices kept in a simplified route polyline",
+    buckets=(10, 25, 50, 100, 200, 400, 800),
+)
+
+def simplify(points, tolerance_meters=ROUTE_POLYLINE_TOLERANCE_METERS):
+    """
+    Douglas-Peucker over (lat, lon) points; always keeps both ends.
+    """
+    if len(points) < 3:
+        return list(points)
+    # Equirectangular meters around the first point are accurate enough at city scale
+    kx = math.cos(math.radians(points[0][0])) * METERS_PER_DEGREE
+    xy = [(lon * kx, lat * METERS_PER_DEGREE) for lat, lon in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xy[first]
+        dx, dy = xy[last][0] - ax, xy[last][1] - ay
+        length = math.hypot(dx, dy)
+        farthest, farthest_d = None, tolerance_meters
+        for i in range(first + 1, last):
+            px, py = xy[i][0] - ax, xy[i][1] - ay
+            if length == 0:
+                d = math.hypot(px, py)
+            else:
+                d = abs(px * dy - py * dx) / length
+            if d > farthest_d:
+                farthest, farthest_d = i, d
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [p for p, k in zip(points, keep) if k]
+
+def _encode_value(value, out):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+def encode(points, precision=PRECISION):
+    """
+    Encode (lat, lon) points in the Google encoded polyline format.
+    """
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        ilat, ilon = round(lat * factor), round(lon * factor)
+        _encode_value(ilat - prev_lat, out)
+        _encode_value(ilon - prev_lon, out)
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+def decode(encoded, precision=PRECISION):
+    """
+    Inverse of encode; returns a list of (lat, lon).
+    """
+    factor = 10 ** precision
+    points = []
+    index = lat = lon = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append((lat / factor, lon / factor))
+    return points
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _route_key(start_loc, end_loc):
+    # Ends within about a meter share the encoded route
+    return (round(start_loc['lat'], 5), round(start_loc['lon'], 5), round(end_loc['lat'], 5), round(end_loc['lon'], 5))
+
+def get_polyline(start_loc, end_loc, tolerance_meters=None):
+    """
+    Encoded, simplified polyline of the route between two points, cached per
+    route; None if no route is available.
+    """
+    if not start_loc or not end_loc:
+        return None
+    tolerance_meters = ROUTE_POLYLINE_TOLERANCE_METERS if tolerance_meters is None else tolerance_meters
+    key = _route_key(start_loc, end_loc) + (tolerance_meters,)
+    with _cache_lock:
+        encoded = _cache.get(key)
+        if encoded is not None:
+            _cache.move_to_end(key)
+    metrics.cache_lookup("route_polyline", encoded is not None)
+    if encoded is not None:
+        return encoded
+
+    geometry = osrm_service.get_route_geometry(start_loc, end_loc)
+    if geometry is None:
+        return None
+    points = simplify(geometry["points"], tolerance_meters)
+    ROUTE_POLYLINE_POINTS.observe(len(points))
+    encoded = encode(points)
+    with _cache_lock:
+        _cache[key] = encoded
+        while len(_cache) > ROUTE_POLYLINE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return encoded
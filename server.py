@@ -1,20 +1,43 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import os
+import time
+from contextlib import asynccontextmanager
 import backend_logic
+import eta_correction
+import eta_grid
+import gemini_service
+import idempotency
+import metrics
+import service_areas
+import warmup
 
 import logging
+import logging_config
 
-# Configure logging to file
-logging.basicConfig(
-    filename='server.log',
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Log to a rotating JSON file from a background thread
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Precompute hub ETA grids in the background once the server is up
+    eta_grid.start_background_builder()
+    # Fold reported arrivals into the ETA correction factors
+    eta_correction.start_background_aggregator()
+    # Import the Gemini SDK and build the client off the startup path
+    gemini_service.start_background_warm_up()
+    # Prefetch POIs and hub ETA grids for historically busy areas
+    warmup.start_background_warm_up()
+    # Coverage polygons are small; load them before the first dispatch
+    service_areas.get_index()
+    yield
+    logging_config.shutdown_logging()
 
-app = FastAPI(title="Smart Roadside Assistance API")
+app = FastAPI(title="Smart Roadside Assistance API", lifespan=lifespan)
 
 # CORS Configuration - Allow frontend to communicate
 app.add_middleware(
@@ -25,7 +48,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-logging.info("Server starting up...")
+logger.info("Server starting up...")
+
+# Results of recent dispatches, so repeated submissions get the same answer
+dispatch_results = idempotency.IdempotencyStore(keep=idempotency.is_replayable)
 
 # Request Models
 class Location(BaseModel):
@@ -33,12 +59,30 @@ class Location(BaseModel):
     lon: float
 
 class AssistanceRequest(BaseModel):
-    user_text: str
+    # A follow-up to waiting_for_location may send just incident_id and user_location
+    user_text: str = ""
     user_location: Optional[Location] = None
     request_count_last_10_min: Optional[int] = 0
     cancel_count_today: Optional[int] = 0
+    incident_id: Optional[str] = None
+    # Return the mechanic's route as an encoded polyline for the map
+    include_route: bool = False
 
 # Response Models
+class EmergencyService(BaseModel):
+    category: str
+    id: str
+    name: str
+    phone: str
+    lat: float
+    lon: float
+    eta_minutes: int
+
+class ResolvedLocation(BaseModel):
+    name: str
+    lat: float
+    lon: float
+
 class AssistanceResponse(BaseModel):
     message: str
     status: str
@@ -50,6 +94,14 @@ class AssistanceResponse(BaseModel):
     mechanic_lon: Optional[float] = None
     eta_minutes: Optional[int] = None
     issue_type: Optional[str] = None
+    emergency_services: Optional[List[EmergencyService]] = None
+    incident_id: Optional[str] = None
+    # Set when the location was resolved from landmark text instead of GPS
+    resolved_location: Optional[ResolvedLocation] = None
+    # The service center whose coverage area contains the user
+    service_center_id: Optional[str] = None
+    # Simplified route from the mechanic to the user (Google encoded polyline), if requested
+    route_polyline: Optional[str] = None
 
 @app.get("/")
 def read_root():
@@ -59,13 +111,44 @@ def read_root():
 def health_check():
     return {"status": "connected", "backend_port": 8000}
 
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Dispatch pipeline, upstream, cache and fallback metrics for Prometheus.
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def render_assistance_response(result, headers=None):
+    """
+    Validate the backend result once and encode it with pydantic's compiled
+    serializer. Returning a Response skips FastAPI's second response_model
+    validation, its threadpool hop and the stdlib JSON encoder.
+    """
+    body = AssistanceResponse.model_validate(result).model_dump_json()
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/llm-usage")
+def llm_usage():
+    """
+    Gemini token and estimated cost totals per day.
+    """
+    return {"daily": gemini_service.get_daily_usage()}
+
+# response_model is kept for the OpenAPI schema; the body is already validated
 @app.post("/api/request-assistance", response_model=AssistanceResponse)
-def request_assistance(request: AssistanceRequest):
+def request_assistance(
+    request: AssistanceRequest,
+    idempotency_key: Optional[str] = Header(None),
+    x_device_id: Optional[str] = Header(None),
+):
     """
     Handle roadside assistance requests.
     Processes user input and returns mechanic assignment details.
+    Repeats with the same Idempotency-Key (or, without one, the same
+    X-Device-Id, location and text) within the window get the first result.
     """
-    logging.info(f"Received request: {request}")
+    received_at = time.time()
+    logger.info("Received request: %r", request)
     try:
         # Convert Pydantic model to dict for backend_logic
         data = {
@@ -73,6 +156,10 @@ def request_assistance(request: AssistanceRequest):
             "request_count_last_10_min": request.request_count_last_10_min,
             "cancel_count_today": request.cancel_count_today,
         }
+        if request.incident_id:
+            data["incident_id"] = request.incident_id
+        if request.include_route:
+            data["include_route"] = True
         
         # Convert Location to dict if present
         if request.user_location:
@@ -83,19 +170,67 @@ def request_assistance(request: AssistanceRequest):
         else:
             data["user_location"] = None
         
-        logging.debug(f"Calling backend_logic with data: {data}")
+        logger.debug("Calling backend_logic with data: %s", data)
         
         # Call backend logic
-        result = backend_logic.handle_assistance_request(data)
+        issued_incident_id = None
+        try:
+            key = f"key:{idempotency_key}" if idempotency_key else idempotency.derive_key(x_device_id, data)
+            if key:
+                result, replayed = dispatch_results.run(key, data, lambda: backend_logic.handle_assistance_request(data))
+            else:
+                result, replayed = backend_logic.handle_assistance_request(data), False
+            issued_incident_id = result.get("incident_id")
+        finally:
+            # Logged after dispatch so replay can map follow-ups to the incident they continue
+            logging_config.log_request(data, issued_incident_id, received_at)
         
-        logging.info(f"Backend result: {result}")
+        logger.info("Backend result: %s", result)
         
-        return AssistanceResponse(**result)
+        return render_assistance_response(result, headers={"Idempotent-Replayed": "true"} if replayed else None)
     
+    except idempotency.IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except backend_logic.UnknownIncident:
+        raise HTTPException(status_code=404, detail="Unknown or expired incident; send the request again without incident_id")
+    except backend_logic.IncidentAlreadyAssigned:
+        raise HTTPException(status_code=409, detail="Incident was already assigned")
     except Exception as e:
-        logging.error(f"Error processing request: {str(e)}", exc_info=True)
+        logger.error("Error processing request: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+class ArrivalReport(BaseModel):
+    # Epoch seconds; defaults to when the report is received
+    arrived_at: Optional[float] = None
+
+@app.post("/api/incidents/{incident_id}/arrival")
+def report_arrival(incident_id: str, report: ArrivalReport):
+    """
+    The assigned mechanic has arrived; used to learn ETA corrections.
+    """
+    recorded = backend_logic.report_arrival(incident_id, report.arrived_at)
+    if recorded is None:
+        raise HTTPException(status_code=404, detail="Unknown or unassigned incident")
+    result, first = recorded
+    if not first:
+        # Repeats don't count again; the first report is returned as-is
+        return JSONResponse(status_code=409, content=result)
+    return result
+
+class PositionUpdate(BaseModel):
+    lat: float
+    lon: float
+
+@app.post("/api/incidents/{incident_id}/position")
+def update_position(incident_id: str, position: PositionUpdate):
+    """
+    The assigned mechanic's current position; returns the refreshed ETA.
+    """
+    refreshed = backend_logic.update_position(incident_id, {"lat": position.lat, "lon": position.lon})
+    if refreshed is None:
+        raise HTTPException(status_code=404, detail="Unknown or unassigned incident")
+    return refreshed
+
 @app.get("/api/status/{distance_meters}")
 def get_status(distance_meters: int):
     """
@@ -0,0 +1,151 @@
+import json
+import logging
+import math
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Coverage areas of the service centers, from a GeoJSON FeatureCollection of
+# Polygon/MultiPolygon features with properties {id, name, lat?, lon?}.
+# Each area's bounding box is registered in the grid cells it overlaps, so a
+# lookup only runs point-in-polygon on the few areas near the point. Points no
+# area covers are assigned to the center nearest to them.
+SERVICE_AREAS_PATH = os.getenv("SERVICE_AREAS_PATH", "service_areas.geojson")
+CELL_DEGREES = 0.05
+
+def _point_in_ring(lon, lat, ring):
+    # Ray casting; ring is a list of (lon, lat), closed or not
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+def _point_in_polygon(lon, lat, polygon):
+    # polygon is [outer ring, hole, ...]
+    if not _point_in_ring(lon, lat, polygon[0]):
+        return False
+    return not any(_point_in_ring(lon, lat, hole) for hole in polygon[1:])
+
+def _polygons(geometry):
+    if geometry["type"] == "Polygon":
+        rings = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        rings = geometry["coordinates"]
+    else:
+        raise ValueError(f"Unsupported service area geometry {geometry['type']!r}")
+    return [[[(float(x), float(y)) for x, y, *_ in ring] for ring in polygon] for polygon in rings]
+
+class ServiceAreaIndex:
+    """
+    Grid-bucketed bounding boxes over the coverage polygons.
+    """
+
+    def __init__(self, features, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.areas = []
+        self._cells = {}
+        for feature in features:
+            props = feature.get("properties") or {}
+            polygons = _polygons(feature["geometry"])
+            # Outer ring vertices, without the repeated closing point
+            points = [p for polygon in polygons for p in (polygon[0][:-1] if polygon[0][0] == polygon[0][-1] else polygon[0])]
+            bbox = (min(p[1] for p in points), min(p[0] for p in points), max(p[1] for p in points), max(p[0] for p in points))
+            if props.get("lat") is not None and props.get("lon") is not None:
+                location = {"lat": float(props["lat"]), "lon": float(props["lon"])}
+            else:
+                location = {"lat": sum(p[1] for p in points) / len(points), "lon": sum(p[0] for p in points) / len(points)}
+            area = {
+                "id": str(props.get("id", len(self.areas))),
+                "name": props.get("name", ""),
+                "location": location,
+                "polygons": polygons,
+                "bbox": bbox,
+                "bbox_area": (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]),
+            }
+            index = len(self.areas)
+            self.areas.append(area)
+            for r in range(self._cell(bbox[0]), self._cell(bbox[2]) + 1):
+                for c in range(self._cell(bbox[1]), self._cell(bbox[3]) + 1):
+                    self._cells.setdefault((r, c), []).append(index)
+
+    def _cell(self, degrees):
+        return math.floor(degrees / self.cell_degrees)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f)["features"])
+
+    def find(self, lat, lon):
+        """
+        The area containing the point, as {id, name, location}; the smallest
+        one where areas overlap. None if no area covers it.
+        """
+        best = None
+        for index in self._cells.get((self._cell(lat), self._cell(lon)), ()):
+            area = self.areas[index]
+            min_lat, min_lon, max_lat, max_lon = area["bbox"]
+            if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+                continue
+            if best is not None and area["bbox_area"] >= best["bbox_area"]:
+                continue
+            if any(_point_in_polygon(lon, lat, polygon) for polygon in area["polygons"]):
+                best = area
+        if best is None:
+            return None
+        return {"id": best["id"], "name": best["name"], "location": best["location"]}
+
+    def nearest(self, lat, lon):
+        """
+        The area whose center location is nearest to the point, as {id, name,
+        location}; None if there are no areas. Scans every area.
+        """
+        kx = math.cos(math.radians(lat))
+        best = min(self.areas, default=None,
+                   key=lambda a: (a["location"]["lat"] - lat) ** 2 + ((a["location"]["lon"] - lon) * kx) ** 2)
+        if best is None:
+            return None
+        return {"id": best["id"], "name": best["name"], "location": best["location"]}
+
+_index = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+def get_index():
+    """
+    The index over SERVICE_AREAS_PATH, loaded once; None if there is no file.
+    """
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                try:
+                    _index = ServiceAreaIndex.load(SERVICE_AREAS_PATH)
+                    logger.info("Loaded %d service areas from %s", len(_index.areas), SERVICE_AREAS_PATH)
+                except FileNotFoundError:
+                    _index = None
+                except Exception as e:
+                    logger.error("Failed to load service areas %s: %s", SERVICE_AREAS_PATH, e)
+                    _index = None
+                _index_loaded = True
+    return _index
+
+def assign_center(location):
+    """
+    The center covering location, else the nearest one, with "covered" set
+    accordingly; None without service areas or a location.
+    """
+    index = get_index()
+    if index is None or not location or location.get("lat") is None:
+        return None
+    center = index.find(location["lat"], location["lon"])
+    if center is not None:
+        return dict(center, covered=True)
+    center = index.nearest(location["lat"], location["lon"])
+    return dict(center, covered=False) if center is not None else None
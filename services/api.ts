@@ -19,12 +19,13 @@ export const apiClient = {
     },
 
     // Example POST request
-    post: async (endpoint: string, data: any) => {
+    post: async (endpoint: string, data: any, headers: Record<string, string> = {}) => {
         try {
             const response = await fetch(`${BACKEND_URL}${endpoint}`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    ...headers,
                 },
                 body: JSON.stringify(data),
             });
@@ -43,6 +44,20 @@ export interface AssistanceRequestPayload {
     user_location?: { lat: number; lon: number } | null;
     request_count_last_10_min?: number;
     cancel_count_today?: number;
+    // Returned with waiting_for_location; send it back with the location
+    incident_id?: string;
+    // Ask for the mechanic's route as an encoded polyline
+    include_route?: boolean;
+}
+
+export interface EmergencyServicePayload {
+    category: string;
+    id: string;
+    name: string;
+    phone: string;
+    lat: number;
+    lon: number;
+    eta_minutes: number;
 }
 
 export interface AssistanceResponsePayload {
@@ -56,11 +71,29 @@ export interface AssistanceResponsePayload {
     mechanic_lon?: number;
     eta_minutes?: number;
     issue_type?: string;
+    emergency_services?: EmergencyServicePayload[];
+    incident_id?: string;
+    // Set when the location was resolved from landmark text instead of GPS
+    resolved_location?: { name: string; lat: number; lon: number };
+    service_center_id?: string;
+    // Simplified route from the mechanic to the user, Google encoded polyline format
+    route_polyline?: string;
 }
 
+// Stable per-browser id; lets the backend collapse repeated "Request help" taps
+const getDeviceId = (): string => {
+    const key = 'roadside_device_id';
+    let id = localStorage.getItem(key);
+    if (!id) {
+        id = crypto.randomUUID();
+        localStorage.setItem(key, id);
+    }
+    return id;
+};
+
 export const submitAssistanceRequest = async (
     payload: AssistanceRequestPayload
 ): Promise<AssistanceResponsePayload> => {
-    return apiClient.post('/api/request-assistance', payload);
+    return apiClient.post('/api/request-assistance', payload, { 'X-Device-Id': getDeviceId() });
 };
 
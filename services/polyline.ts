@@ -0,0 +1,30 @@
+/**
+ * Google encoded polyline decoding, for routes returned by the backend.
+ */
+
+export const decodePolyline = (encoded: string, precision: number = 5): [number, number][] => {
+    const factor = Math.pow(10, precision);
+    const points: [number, number][] = [];
+    let index = 0;
+    let lat = 0;
+    let lon = 0;
+
+    const nextValue = (): number => {
+        let shift = 0;
+        let result = 0;
+        let byte: number;
+        do {
+            byte = encoded.charCodeAt(index++) - 63;
+            result |= (byte & 0x1f) << shift;
+            shift += 5;
+        } while (byte >= 0x20);
+        return result & 1 ? ~(result >> 1) : result >> 1;
+    };
+
+    while (index < encoded.length) {
+        lat += nextValue();
+        lon += nextValue();
+        points.push([lat / factor, lon / factor]);
+    }
+    return points;
+};
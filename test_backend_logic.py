@@ -0,0 +1,125 @@
+import contextlib
+
+import backend_logic
+import eta_grid
+import gemini_service
+import incident_store
+import osm_service
+import osrm_service
+import service_areas
+import triage_classifier
+from test_service_areas import square
+
+LOCATION = {"lat": 21.1458, "lon": 79.0882}
+GARAGE = {"id": 11, "name": "Sitabuldi Motors", "phone": "+91 1111111111", "lat": 21.15, "lon": 79.09, "type": "car_repair"}
+HOSPITAL = {"id": 12, "name": "City Hospital", "phone": "+91 2222222222", "lat": 21.14, "lon": 79.08, "type": "hospital"}
+POLICE = {"id": 13, "name": "Sitabuldi Police", "phone": "+91 3333333333", "lat": 21.14, "lon": 79.09, "type": "police"}
+ACCIDENT = {"user_text": "accident on the highway", "user_location": LOCATION}
+
+@contextlib.contextmanager
+def upstreams(nearby=(), emergency=None):
+    """
+    Stub out triage, POI discovery and routing; yields the texts sent to triage.
+    Triage always falls back to the keyword rules.
+    """
+    triaged = []
+    stubs = {
+        (triage_classifier, "classify"): lambda text, threshold=None: triaged.append(text),
+        (gemini_service, "analyze_request"): lambda text, variant=None: None,
+        (osm_service, "get_real_assistance"): lambda lat, lon, issue_type='general': [dict(s) for s in nearby],
+        (osm_service, "get_emergency_assistance"): lambda lat, lon: dict(emergency or {}),
+        (osrm_service, "get_route"): lambda origin, destination: {"duration_min": 10},
+        (eta_grid, "lookup"): lambda origin, destination: None,
+        (eta_grid, "register_hub"): lambda hub: None,
+    }
+    originals = {(module, name): getattr(module, name) for module, name in stubs}
+    for (module, name), stub in stubs.items():
+        setattr(module, name, stub)
+    try:
+        yield triaged
+    finally:
+        for (module, name), original in originals.items():
+            setattr(module, name, original)
+
+def test_follow_up_resumes_with_stored_triage():
+    with upstreams(nearby=[GARAGE]) as triaged:
+        waiting = backend_logic.handle_assistance_request({"user_text": "stuck, car on fire, help, emergency, danger", "user_location": None})
+        assert waiting["status"] == "waiting_for_location" and waiting["priority"] == "emergency"
+
+        result = backend_logic.handle_assistance_request({"incident_id": waiting["incident_id"], "user_text": "", "user_location": LOCATION})
+        # Only the first request was triaged; the follow-up kept its priority
+        assert triaged == ["stuck, car on fire, help, emergency, danger"]
+        assert result["incident_id"] == waiting["incident_id"]
+        assert result["priority"] == "emergency"
+        assert incident_store.get(waiting["incident_id"])["location"] == LOCATION
+
+def test_follow_up_with_unknown_incident_is_rejected():
+    with upstreams(nearby=[GARAGE]) as triaged:
+        try:
+            backend_logic.handle_assistance_request({"incident_id": "no-such-incident", "user_text": "", "user_location": LOCATION})
+        except backend_logic.UnknownIncident:
+            pass
+        else:
+            raise AssertionError("an unknown incident was dispatched")
+        assert triaged == []
+
+def test_follow_up_to_assigned_incident_is_rejected():
+    with upstreams(nearby=[GARAGE]):
+        waiting = backend_logic.handle_assistance_request({"user_text": "flat tyre", "user_location": None})
+        follow_up = {"incident_id": waiting["incident_id"], "user_text": "", "user_location": LOCATION}
+        assert backend_logic.handle_assistance_request(follow_up)["status"] == "assigned"
+        assigned_at = incident_store.get(waiting["incident_id"])["assigned_at"]
+        try:
+            backend_logic.handle_assistance_request(follow_up)
+        except backend_logic.IncidentAlreadyAssigned:
+            pass
+        else:
+            raise AssertionError("an assigned incident was dispatched again")
+        assert incident_store.get(waiting["incident_id"])["assigned_at"] == assigned_at
+
+def test_accident_lists_emergency_services():
+    with upstreams(emergency={"hospital": HOSPITAL, "police": POLICE, "mechanic": GARAGE}):
+        result = backend_logic.handle_assistance_request(dict(ACCIDENT))
+    assert result["issue_type"] == "accident" and result["status"] == "assigned"
+    services = result["emergency_services"]
+    assert [(s["category"], s["id"], s["name"]) for s in services] == [
+        ("hospital", "12", "City Hospital"), ("police", "13", "Sitabuldi Police"), ("mechanic", "11", "Sitabuldi Motors")]
+    assert all(s["eta_minutes"] is not None for s in services)
+    # The mechanic is the one assigned, not the first responder
+    assert result["mechanic_id"] == "11" and result["mechanic_name"] == "Sitabuldi Motors"
+    assert incident_store.get(result["incident_id"])["mechanic_id"] == "11"
+
+def test_accident_without_mechanic_leaves_mechanic_unset():
+    with upstreams(emergency={"hospital": HOSPITAL, "police": POLICE, "mechanic": None}):
+        result = backend_logic.handle_assistance_request(dict(ACCIDENT, include_route=True))
+    assert [s["category"] for s in result["emergency_services"]] == ["hospital", "police"]
+    assert not any(key.startswith("mechanic_") for key in result)
+    assert result["eta_minutes"] is None and "route_polyline" not in result
+    assert "No mechanic was found nearby" in result["message"]
+    # Arrivals and positions are not tracked against the hospital
+    assert incident_store.get(result["incident_id"])["mechanic_id"] is None
+    assert backend_logic.report_arrival(result["incident_id"]) is None
+    assert backend_logic.update_position(result["incident_id"], {"lat": 21.14, "lon": 79.08}) is None
+
+def test_service_center_from_coverage_area():
+    index = service_areas.ServiceAreaIndex([square("sitabuldi", 21.14, 79.08, 0.02), square("hingna", 21.10, 78.98, 0.05)])
+    original = service_areas._index, service_areas._index_loaded
+    service_areas._index, service_areas._index_loaded = index, True
+    try:
+        with upstreams(nearby=[GARAGE]):
+            covered = backend_logic.handle_assistance_request({"user_text": "flat tyre", "user_location": LOCATION})
+            assert covered["service_center_id"] == "sitabuldi"
+            # Outside every area: the nearest center
+            outside = backend_logic.handle_assistance_request({"user_text": "flat tyre", "user_location": {"lat": 21.12, "lon": 79.05}})
+            assert outside["service_center_id"] == "hingna"
+    finally:
+        service_areas._index, service_areas._index_loaded = original
+
+if __name__ == "__main__":
+    test_follow_up_resumes_with_stored_triage()
+    test_follow_up_with_unknown_incident_is_rejected()
+    test_follow_up_to_assigned_incident_is_rejected()
+    test_accident_lists_emergency_services()
+    test_accident_without_mechanic_leaves_mechanic_unset()
+    test_service_center_from_coverage_area()
+    print("backend_logic tests passed")
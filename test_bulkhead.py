@@ -0,0 +1,45 @@
+import threading
+from concurrent.futures import TimeoutError
+
+import bulkhead
+import upstream_scheduler
+
+def test_full_bulkhead_rejects_or_runs_on_caller():
+    release = threading.Event()
+    rejecting = bulkhead.Bulkhead("test_reject", workers=1, queue=1)
+    futures = [rejecting.submit(release.wait), rejecting.submit(release.wait)]
+    try:
+        rejecting.submit(lambda: None)
+        assert False, "expected BulkheadFull"
+    except bulkhead.BulkheadFull as e:
+        print(e)
+
+    caller_runs = bulkhead.Bulkhead("test_caller_runs", workers=1, queue=0, policy=bulkhead.POLICY_CALLER_RUNS)
+    blocked = caller_runs.submit(release.wait)
+    assert caller_runs.submit(threading.current_thread).result() is threading.current_thread()
+
+    release.set()
+    for future in futures + [blocked]:
+        future.result(timeout=5)
+    assert rejecting.submit(lambda: 42).result(timeout=5) == 42
+    assert bulkhead.REJECTED.value(bulkhead="test_reject", policy="reject") == 1
+
+def test_context_and_timeout():
+    pool = bulkhead.Bulkhead("test_context", workers=2, queue=2)
+    with upstream_scheduler.request_scope():
+        upstream_scheduler.set_priority("emergency")
+        assert pool.call(upstream_scheduler.current_priority, timeout=5) == "emergency"
+
+    release = threading.Event()
+    try:
+        pool.call(release.wait, timeout=0.05)
+        assert False, "expected TimeoutError"
+    except TimeoutError:
+        pass
+    release.set()
+    assert bulkhead.TIMEOUTS.value(bulkhead="test_context") == 1
+
+if __name__ == "__main__":
+    test_full_bulkhead_rejects_or_runs_on_caller()
+    test_context_and_timeout()
+    print("Bulkhead tests passed!")
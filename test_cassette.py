@@ -0,0 +1,40 @@
+import os
+import tempfile
+import time
+
+import cassette
+
+def test_record_then_replay_without_latency():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cassette.jsonl.gz")
+        try:
+            cassette.configure(mode=cassette.MODE_RECORD, path=path)
+            def slow_upstream():
+                time.sleep(0.05)
+                return {"code": "Ok", "routes": [{"distance": 1200, "duration": 300}]}
+            recorded = cassette.call("osrm_route", "http://osrm/route/a;b", slow_upstream)
+            try:
+                cassette.call("overpass", "query", lambda: 1 / 0)
+            except ZeroDivisionError:
+                pass
+
+            cassette.configure(mode=cassette.MODE_REPLAY, latency=cassette.LATENCY_ZERO)
+            start = time.perf_counter()
+            replayed = cassette.call("osrm_route", "http://osrm/route/a;b", lambda: None)
+            assert replayed == recorded
+            assert time.perf_counter() - start < 0.05
+
+            # Recorded failures fail again, unknown calls are misses
+            for upstream, key, expected in (("overpass", "query", cassette.ReplayedError),
+                                            ("gemini", "prompt", cassette.CassetteMiss)):
+                try:
+                    cassette.call(upstream, key, lambda: None)
+                    assert False, "expected an exception"
+                except expected:
+                    pass
+        finally:
+            cassette.configure(mode=cassette.MODE_OFF)
+
+if __name__ == "__main__":
+    test_record_then_replay_without_latency()
+    print("Cassette tests passed!")
@@ -0,0 +1,103 @@
+import os
+import tempfile
+
+import eta_correction
+
+# Monday 2026-10-19 18:00 IST, Nagpur evening rush hour
+RUSH_HOUR = 1792413000.0
+
+def test_factors_learned_per_tile_and_hour():
+    model = eta_correction.EtaCorrection()
+    assert eta_correction.hour_of_week(RUSH_HOUR) == 18
+    for _ in range(50):
+        assert model.observe(21.145, 79.088, 10, 20, RUSH_HOUR)
+    # Implausible reports are ignored
+    assert not model.observe(21.145, 79.088, 10, 200, RUSH_HOUR)
+
+    rush = model.factor(21.145, 79.088, RUSH_HOUR)
+    print(f"Rush-hour factor in the observed tile: {rush:.2f}")
+    assert 1.8 < rush <= 2.0
+    # Another tile at the same hour gets the shrunk city-wide factor; other hours stay near 1
+    assert 1.0 < model.factor(21.30, 79.20, RUSH_HOUR) < rush
+    assert model.factor(21.145, 79.088, RUSH_HOUR + 6 * 3600) == 1.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "eta_correction.bin")
+        model.save(path)
+        loaded = eta_correction.EtaCorrection.load(path)
+    assert abs(loaded.factor(21.145, 79.088, RUSH_HOUR) - rush) < 1e-6
+
+def test_correct_leaves_failures_alone():
+    assert eta_correction.correct(-1, {"lat": 21.1, "lon": 79.0}) == -1
+    assert eta_correction.correct(10, None) == 10
+
+def test_arrival_reported_once_and_fallbacks_skipped():
+    import backend_logic
+    import incident_store
+
+    location = {"lat": 21.145, "lon": 79.088}
+    routed = incident_store.create({"assigned_at": RUSH_HOUR, "predicted_eta": 10, "eta_fallback": False, "location": location, "mechanic_id": "1"})
+    guessed = incident_store.create({"assigned_at": RUSH_HOUR, "predicted_eta": 15, "eta_fallback": True, "location": location, "mechanic_id": "1"})
+    queued = eta_correction._queue.qsize()
+
+    report, first = backend_logic.report_arrival(routed, RUSH_HOUR + 1200)
+    assert first and report["observed_minutes"] == 20.0
+    assert eta_correction._queue.qsize() == queued + 1
+    # A repeat gets the first report back and adds nothing
+    repeat, first = backend_logic.report_arrival(routed, RUSH_HOUR + 3600)
+    assert not first and repeat == report
+    assert eta_correction._queue.qsize() == queued + 1
+
+    # The 15 minute default is not a routing estimate to correct
+    _, first = backend_logic.report_arrival(guessed, RUSH_HOUR + 1200)
+    assert first and eta_correction._queue.qsize() == queued + 1
+    assert backend_logic.report_arrival("unknown") is None
+
+def test_workers_share_one_file():
+    original = eta_correction._model, eta_correction._unsaved, eta_correction._file_version
+
+    def start_worker():
+        eta_correction._model = eta_correction.EtaCorrection()
+        eta_correction._unsaved = eta_correction.EtaCorrection()
+        eta_correction._file_version = None
+
+    def observe(lat, lon, n, ts):
+        for _ in range(n):
+            eta_correction._model.observe(lat, lon, 10, 20, ts)
+            eta_correction._unsaved.observe(lat, lon, 10, 20, ts)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "eta_correction.bin")
+            start_worker()
+            observe(21.145, 79.088, 20, RUSH_HOUR)
+            eta_correction._sync(path)
+            first, first_version = eta_correction._model, eta_correction._file_version
+
+            # A second worker saves its own arrivals without losing the first one's
+            start_worker()
+            late = RUSH_HOUR + 3 * 3600
+            observe(21.305, 79.205, 30, late)
+            eta_correction._sync(path)
+            saved = eta_correction.EtaCorrection.load(path)
+            assert saved.global_counts[eta_correction.hour_of_week(RUSH_HOUR)] == 20
+            assert saved.global_counts[eta_correction.hour_of_week(late)] == 30
+            assert len(saved.tiles) == 2
+            assert eta_correction._model.factor(21.145, 79.088, RUSH_HOUR) > 1.5
+
+            # The first worker picks up the second one's factors when it reloads
+            eta_correction._model, eta_correction._unsaved = first, eta_correction.EtaCorrection()
+            eta_correction._file_version = first_version
+            assert first.factor(21.305, 79.205, late) == 1.0
+            assert eta_correction._reload(path)
+            assert eta_correction._model.factor(21.305, 79.205, late) > 1.5
+            assert not eta_correction._reload(path)
+    finally:
+        eta_correction._model, eta_correction._unsaved, eta_correction._file_version = original
+
+if __name__ == "__main__":
+    test_factors_learned_per_tile_and_hour()
+    test_correct_leaves_failures_alone()
+    test_arrival_reported_once_and_fallbacks_skipped()
+    test_workers_share_one_file()
+    print("ETA correction tests passed!")
@@ -0,0 +1,69 @@
+import os
+import tempfile
+
+import eta_grid
+import osrm_service
+import road_graph
+from test_road_graph import write_grid_extract
+
+def test_grid_lookup_matches_direct_route():
+    with tempfile.TemporaryDirectory() as tmp:
+        extract = os.path.join(tmp, "grid.osm")
+        graph_path = os.path.join(tmp, "grid.bin")
+        write_grid_extract(extract, size=11)
+        road_graph.build_graph(extract, graph_path)
+        graph = road_graph.RoadGraph(graph_path)
+        osrm_service._local_graph, osrm_service._local_graph_loaded = graph, True
+        try:
+            hub = {"lat": 21.125, "lon": 79.075}
+            grid = eta_grid.build_grid(hub, radius_km=2, step=0.0025)
+
+            path = os.path.join(tmp, "hub.grid")
+            grid.save(path)
+            loaded = eta_grid.EtaGrid.load(path)
+            assert (loaded.rows, loaded.cols) == (grid.rows, grid.cols)
+
+            user = {"lat": 21.132, "lon": 79.081}
+            interpolated = loaded.lookup_seconds(user["lat"], user["lon"])
+            direct = graph.durations_from(hub, [user])[0]
+            print(f"Interpolated {interpolated:.0f}s vs direct {direct:.0f}s")
+            assert abs(interpolated - direct) < 120
+            # Outside the lattice there is no answer and OSRM is used instead
+            assert loaded.lookup_seconds(21.3, 79.3) is None
+        finally:
+            osrm_service._local_graph, osrm_service._local_graph_loaded = None, False
+
+def test_learned_hubs_are_capped():
+    original = eta_grid.ETA_GRID_MAX_HUBS, dict(eta_grid._grids), set(eta_grid._pinned)
+    eta_grid.ETA_GRID_MAX_HUBS = 2
+    eta_grid._grids.clear()
+    eta_grid._pinned.clear()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            hubs = [{"lat": 21.1 + i * 0.01, "lon": 79.0} for i in range(4)]
+            eta_grid._pinned.add(eta_grid.hub_key(hubs[0]))
+            for hub in hubs[:3]:
+                grid = eta_grid.EtaGrid.around(hub, radius_km=0.5)
+                key = eta_grid.hub_key(hub)
+                grid.save(eta_grid._grid_path(key, tmp))
+                with eta_grid._grids_lock:
+                    eta_grid._store_grid(key, grid, tmp)
+                # Looking a hub up makes it recently used
+                eta_grid.lookup(hubs[0], hubs[0])
+            # The pinned hub stays; the least recently used learned hub goes, with its file
+            assert list(eta_grid._grids) == [eta_grid.hub_key(hubs[2]), eta_grid.hub_key(hubs[0])]
+            assert sorted(os.listdir(tmp)) == sorted(f"{k}.grid" for k in eta_grid._grids)
+
+            eta_grid._grids.clear()
+            assert eta_grid.load_grids(tmp) == 2
+    finally:
+        eta_grid.ETA_GRID_MAX_HUBS = original[0]
+        eta_grid._grids.clear()
+        eta_grid._grids.update(original[1])
+        eta_grid._pinned.clear()
+        eta_grid._pinned.update(original[2])
+
+if __name__ == "__main__":
+    test_grid_lookup_matches_direct_route()
+    test_learned_hubs_are_capped()
+    print("ETA grid tests passed!")
@@ -0,0 +1,79 @@
+import os
+import tempfile
+
+import gazetteer
+
+EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+<node id="1" lat="21.1466" lon="79.0888"><tag k="name" v="Zero Mile"/><tag k="historic" v="monument"/></node>
+<node id="2" lat="21.1520" lon="79.0810"><tag k="name" v="Sitabuldi Fort"/><tag k="historic" v="fort"/></node>
+<node id="3" lat="21.1400" lon="79.0900"><tag k="name" v="Zero Mile Metro Station"/><tag k="railway" v="station"/></node>
+<node id="4" lat="21.1300" lon="79.0700"/>
+<node id="5" lat="21.1310" lon="79.0720"/>
+<node id="6" lat="21.1000" lon="79.0000"><tag k="amenity" v="bench"/></node>
+<way id="10"><nd ref="4"/><nd ref="5"/><tag k="highway" v="primary"/><tag k="name" v="Wardha Road"/></way>
+</osm>
+"""
+
+def test_build_and_resolve():
+    with tempfile.TemporaryDirectory() as tmp:
+        extract = os.path.join(tmp, "city.osm")
+        path = os.path.join(tmp, "gazetteer.json")
+        with open(extract, "w") as f:
+            f.write(EXTRACT)
+        assert gazetteer.build_gazetteer(extract, path) == 4
+        g = gazetteer.Gazetteer.load(path)
+
+    exact = g.resolve("the Zero Mile")
+    print(exact)
+    assert exact["name"] == "Zero Mile" and exact["match"] == "exact"
+
+    prefix = g.resolve("sitabuldi")
+    assert prefix["name"] == "Sitabuldi Fort" and prefix["match"] == "prefix"
+
+    fuzzy = g.resolve("wardah road")
+    assert fuzzy["name"] == "Wardha Road" and fuzzy["match"] == "fuzzy"
+    # Centroid of the way's nodes
+    assert abs(fuzzy["lat"] - 21.1305) < 1e-6
+
+    assert g.resolve("somewhere else entirely") is None
+
+def test_ordinary_words_do_not_resolve():
+    g = gazetteer.Gazetteer([
+        ("Home Needs Store", 21.14, 79.08, "shop=supermarket"),
+        ("Stock", 21.15, 79.09, "shop=clothes"),
+        ("Help Line Office", 21.16, 79.07, "amenity=office"),
+        ("Sitabuldi Fort", 21.152, 79.081, "historic=fort"),
+    ])
+    for text in ("home", "stuck", "help", "road", "car", "my car broke down"):
+        assert g.resolve(text) is None, (text, g.resolve(text))
+    # A prefix that covers most of the name still resolves
+    assert g.resolve("sitabuldi")["name"] == "Sitabuldi Fort"
+
+def test_location_text_needs_whole_words():
+    import backend_logic
+    assert backend_logic.extract_location_text("Flat tyre, battery dead") is None
+    assert backend_logic.extract_location_text("Flat tyre near Zero Mile, please hurry") == "zero mile"
+    assert backend_logic.extract_location_text("stuck at the railway station") == "railway station"
+
+def test_landmark_followed_by_more_words():
+    import backend_logic
+    g = gazetteer.Gazetteer([
+        ("Zero Mile", 21.1466, 79.0888, "historic=monument"),
+        ("Zero Mile Metro Station", 21.14, 79.09, "railway=station"),
+        ("Sitabuldi Fort", 21.152, 79.081, "historic=fort"),
+    ])
+    for text, name in (("stuck near zero mile with a flat tyre", "Zero Mile"),
+                       ("at sitabuldi fort area", "Sitabuldi Fort"),
+                       ("near zero mile metro station and the battery is dead", "Zero Mile Metro Station"),
+                       ("near zero mile", "Zero Mile")):
+        resolved = g.resolve(backend_logic.extract_location_text(text))
+        assert resolved and resolved["name"] == name, (text, resolved)
+    assert g.resolve("near my house with a flat tyre") is None
+
+if __name__ == "__main__":
+    test_build_and_resolve()
+    test_ordinary_words_do_not_resolve()
+    test_location_text_needs_whole_words()
+    test_landmark_followed_by_more_words()
+    print("Gazetteer tests passed!")
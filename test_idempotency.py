@@ -0,0 +1,70 @@
+import threading
+import time
+
+import idempotency
+
+def test_concurrent_duplicates_run_once():
+    store = idempotency.IdempotencyStore(max_entries=10, ttl=60)
+    calls = []
+    def dispatch():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"mechanic_id": str(len(calls))}
+
+    data = {"user_text": "flat tyre", "user_location": {"lat": 21.1458, "lon": 79.0882}}
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.run("key:a", data, dispatch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    print(results)
+    assert len(calls) == 1
+    assert all(result == {"mechanic_id": "1"} for result, _ in results)
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+
+    try:
+        store.run("key:a", dict(data, user_text="battery"), dispatch)
+        assert False, "expected IdempotencyConflict"
+    except idempotency.IdempotencyConflict:
+        pass
+
+def test_derived_key_and_failures():
+    data = {"user_text": "Flat  tyre ", "user_location": {"lat": 21.14581, "lon": 79.08822}}
+    jittered = {"user_text": "flat tyre", "user_location": {"lat": 21.14584, "lon": 79.08819}}
+    assert idempotency.derive_key("device-1", data) == idempotency.derive_key("device-1", jittered)
+    assert idempotency.derive_key("device-2", data) != idempotency.derive_key("device-1", data)
+    assert idempotency.derive_key(None, data) is None
+    assert idempotency.derive_key("device-1", dict(data, include_route=True)) != idempotency.derive_key("device-1", data)
+    assert idempotency.derive_key("device-1", dict(data, include_route=False)) == idempotency.derive_key("device-1", data)
+
+    store = idempotency.IdempotencyStore(max_entries=1, ttl=60)
+    def fail():
+        raise RuntimeError("upstream down")
+    try:
+        store.run("key:b", data, fail)
+    except RuntimeError:
+        pass
+    # Failures are not remembered
+    assert store.run("key:b", data, lambda: "ok") == ("ok", False)
+    # Bounded: the oldest key is evicted
+    store.run("key:c", data, lambda: "c")
+    assert store.run("key:b", data, lambda: "again") == ("again", False)
+
+def test_unreplayable_results_run_again():
+    store = idempotency.IdempotencyStore(max_entries=10, ttl=60, keep=idempotency.is_replayable)
+    data = {"user_text": "accident", "user_location": {"lat": 21.1458, "lon": 79.0882}}
+    outage = {"status": "no_services_found", "message": "Please call 112"}
+    assert store.run("key:d", data, lambda: outage) == (outage, False)
+    assert len(store) == 0
+    # The retap after the outage dispatches again, and that result is kept
+    assigned = {"status": "assigned", "mechanic_id": "7"}
+    assert store.run("key:d", data, lambda: assigned) == (assigned, False)
+    assert store.run("key:d", data, lambda: outage) == (assigned, True)
+
+if __name__ == "__main__":
+    test_concurrent_duplicates_run_once()
+    test_derived_key_and_failures()
+    test_unreplayable_results_run_again()
+    print("Idempotency tests passed!")
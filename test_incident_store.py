@@ -0,0 +1,29 @@
+import time
+
+import incident_store
+
+def test_create_get_and_expiry():
+    store = incident_store.IncidentStore(max_entries=2, ttl=0.2)
+    first = store.create({"issue_type": "tyre", "priority": "normal"})
+    assert store.get(first) == {"issue_type": "tyre", "priority": "normal"}
+    assert store.get("unknown") is None
+
+    # Callers get copies
+    store.get(first)["priority"] = "emergency"
+    assert store.get(first)["priority"] == "normal"
+
+    second = store.create({"issue_type": "battery"})
+    store.get(first)  # most recently used
+    store.create({"issue_type": "engine"})
+    assert store.get(second) is None and store.get(first) is not None
+
+    assert store.mark_once(first, "arrived_at", 1.0)
+    assert not store.mark_once(first, "arrived_at", 2.0)
+    assert store.get(first)["arrived_at"] == 1.0
+
+    time.sleep(0.25)
+    assert store.get(first) is None
+
+if __name__ == "__main__":
+    test_create_get_and_expiry()
+    print("Incident store tests passed!")
@@ -0,0 +1,79 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import tempfile
+
+import logging_config
+
+def _record(level, msg, *args):
+    return logging.LogRecord("test", level, __file__, 1, msg, args, None)
+
+def test_sampling_by_level():
+    sampler = logging_config.SamplingFilter({logging.DEBUG: 0.25, logging.INFO: 1.0})
+    random.seed(7)
+    kept = sum(sampler.filter(_record(logging.DEBUG, "debug")) for _ in range(4000))
+    print(f"Kept {kept} of 4000 DEBUG records at rate 0.25")
+    assert 800 < kept < 1200
+    assert all(sampler.filter(_record(logging.INFO, "info")) for _ in range(100))
+
+    # Levels without a rate, like WARNING, are always kept
+    assert all(sampler.filter(_record(logging.WARNING, "warning")) for _ in range(100))
+
+    never = logging_config.SamplingFilter({logging.DEBUG: 0.0})
+    dropped = logging_config.LOG_SAMPLED_OUT.value(level="DEBUG")
+    assert not never.filter(_record(logging.DEBUG, "debug"))
+    assert logging_config.LOG_SAMPLED_OUT.value(level="DEBUG") == dropped + 1
+
+def test_queue_handler_drops_when_full():
+    handler = logging_config.LazyQueueHandler(queue.Queue(maxsize=1))
+    dropped = logging_config.LOG_DROPPED.value()
+    first = _record(logging.INFO, "kept %s", 1)
+    handler.emit(first)
+    handler.emit(_record(logging.INFO, "dropped"))
+    assert logging_config.LOG_DROPPED.value() == dropped + 1
+    # The record is enqueued unformatted; the listener interpolates it
+    queued = handler.queue.get_nowait()
+    assert queued is first and queued.args == (1,)
+
+def test_listener_writes_json_lines():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "server.log")
+        file_handler = logging_config.MeteredRotatingFileHandler(path, maxBytes=1024 * 1024, backupCount=1)
+        file_handler.setFormatter(logging_config.JsonFormatter())
+        file_handler.addFilter(logging_config.ExcludeDataLogsFilter())
+        log_queue = queue.Queue()
+        listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+
+        logger = logging.getLogger("test_logging_config")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        queue_handler = logging_config.LazyQueueHandler(log_queue)
+        logger.addHandler(queue_handler)
+        data_logger = logging.getLogger(logging_config.REQUEST_LOGGER)
+        writes = logging_config.LOG_WRITE_SECONDS.count()
+        listener.start()
+        try:
+            logger.info("Dispatched %s in %d ms", "incident-1", 42, extra={"incident_id": "incident-1"})
+            # Data log records never reach the server log
+            file_handler.handle(logging.LogRecord(data_logger.name, logging.INFO, __file__, 1, "x", (), None))
+        finally:
+            listener.stop()
+            logger.removeHandler(queue_handler)
+            file_handler.close()
+
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        assert len(lines) == 1
+        assert logging_config.LOG_WRITE_SECONDS.count() == writes + 1
+        entry = lines[0]
+        assert entry["msg"] == "Dispatched incident-1 in 42 ms"
+        assert entry["level"] == "INFO" and entry["incident_id"] == "incident-1"
+
+if __name__ == "__main__":
+    test_sampling_by_level()
+    test_queue_handler_drops_when_full()
+    test_listener_writes_json_lines()
+    print("logging_config tests passed")
@@ -0,0 +1,30 @@
+import metrics
+
+def test_histogram_and_counter_rendering():
+    hist = metrics.Histogram("test_latency_seconds", "Test latency", buckets=(0.1, 1.0))
+    hist.observe(0.05, stage="a")
+    hist.observe(0.5, stage="a")
+    counter = metrics.Counter("test_events_total", "Test events")
+    counter.inc(kind="x")
+    counter.inc(2, kind="x")
+
+    text = metrics.render()
+    print(text)
+    assert 'test_latency_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_count{stage="a"} 2' in text
+    assert 'test_events_total{kind="x"} 3.0' in text
+
+def test_spans_are_collected_per_trace():
+    with metrics.trace() as spans:
+        with metrics.span("triage"):
+            pass
+        with metrics.span("eta"):
+            pass
+    assert [stage for stage, _ in spans] == ["triage", "eta"]
+    assert metrics.DISPATCH_STAGE_SECONDS.count(stage="eta") >= 1
+
+if __name__ == "__main__":
+    test_histogram_and_counter_rendering()
+    test_spans_are_collected_per_trace()
+    print("Metrics tests passed!")
@@ -0,0 +1,67 @@
+import os
+import random
+import tempfile
+import time
+
+import nearest_raster
+import poi_index
+
+def random_pois(n, seed=0, size=0.3, categories=poi_index.CATEGORIES):
+    rng = random.Random(seed)
+    return [{'id': i, 'category': rng.choice(categories), 'name': f"POI {i}", 'phone': '', 'type': '',
+             'lat': 21.0 + rng.random() * size, 'lon': 79.0 + rng.random() * size} for i in range(n)]
+
+def test_raster_matches_brute_force():
+    pois = random_pois(300)
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "poi.bin")
+        raster_path = os.path.join(tmp, "raster.bin")
+        poi_index.build_index(pois, index_path)
+        index = poi_index.PoiIndex(index_path)
+        nearest_raster.build_raster(index, raster_path, cell_degrees=0.005)
+        raster = nearest_raster.NearestRaster(raster_path)
+        assert raster.index_checksum == index.checksum()
+
+        rng = random.Random(1)
+        exact = 0
+        points = [(21.0 + rng.random() * 0.3, 79.0 + rng.random() * 0.3) for _ in range(500)]
+        start = time.perf_counter()
+        for lat, lon in points:
+            category = rng.choice(poi_index.CATEGORIES)
+            found = min((poi_index._distance_m(lat, lon, *index.position(i)), i)
+                        for i in raster.candidates(lat, lon, category))
+            expected = min(poi_index._distance_m(lat, lon, p['lat'], p['lon']) for p in pois if p['category'] == category)
+            exact += abs(found[0] - expected) < 1e-6
+        print(f"{exact}/{len(points)} exact, {(time.perf_counter() - start) / len(points) * 1e6:.0f} us per lookup incl. brute force")
+        assert exact == len(points)
+
+        assert raster.candidates(25.0, 79.0, 'hospital') is None
+
+def test_dense_raster_is_exact():
+    # ~100 m between garages, denser than the default 0.002 degree cells
+    pois = random_pois(2000, seed=2, size=0.05, categories=('car_repair',))
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "poi.bin")
+        raster_path = os.path.join(tmp, "raster.bin")
+        poi_index.build_index(pois, index_path)
+        index = poi_index.PoiIndex(index_path)
+        start = time.perf_counter()
+        nearest_raster.build_raster(index, raster_path, margin=0.01)
+        print(f"Dense raster built in {time.perf_counter() - start:.1f} s")
+        raster = nearest_raster.NearestRaster(raster_path)
+
+        rng = random.Random(3)
+        sizes = []
+        for _ in range(2000):
+            lat, lon = 20.995 + rng.random() * 0.06, 78.995 + rng.random() * 0.06
+            candidates = raster.candidates(lat, lon, 'car_repair')
+            sizes.append(len(candidates))
+            found = min(poi_index._distance_m(lat, lon, *index.position(i)) for i in candidates)
+            expected = min(poi_index._distance_m(lat, lon, p['lat'], p['lon']) for p in pois)
+            assert abs(found - expected) < 1e-6, (lat, lon, found, expected)
+        print(f"{sum(sizes) / len(sizes):.1f} candidates per cell on average")
+
+if __name__ == "__main__":
+    test_raster_matches_brute_force()
+    test_dense_raster_is_exact()
+    print("Nearest raster tests passed!")
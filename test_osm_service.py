@@ -0,0 +1,79 @@
+import nearest_raster
+import osm_service
+import poi_index
+
+PLACES = {
+    'car_repair': [{'id': 1, 'name': 'Far Garage', 'lat': 21.20, 'lon': 79.10},
+                   {'id': 2, 'name': 'Near Garage', 'lat': 21.15, 'lon': 79.09}],
+    'hospital': [{'id': 3, 'name': 'City Hospital', 'lat': 21.14, 'lon': 79.08}],
+    'police': [],
+}
+
+def _patched(test):
+    def run():
+        calls = []
+
+        def query_overpass(lat, lon, types=['car_repair'], radius=10000):
+            calls.append(tuple(types))
+            results = [dict(p) for t in types for p in PLACES[t]]
+            return sorted(results, key=lambda x: (x['lat'] - lat)**2 + (x['lon'] - lon)**2)
+
+        original = (osm_service.query_overpass, poi_index.get_index, nearest_raster.nearest,
+                    osm_service.CACHE_TTL_SECONDS, osm_service.CACHE_MAX_TILES, dict(osm_service._cache))
+        osm_service.query_overpass = query_overpass
+        poi_index.get_index = lambda: None
+        nearest_raster.nearest = lambda lat, lon, category: None
+        osm_service._cache.clear()
+        try:
+            test(calls)
+        finally:
+            (osm_service.query_overpass, poi_index.get_index, nearest_raster.nearest,
+             osm_service.CACHE_TTL_SECONDS, osm_service.CACHE_MAX_TILES, cache) = original
+            osm_service._cache.clear()
+            osm_service._cache.update(cache)
+    run.__name__ = test.__name__
+    return run
+
+@_patched
+def test_tile_cache_hits_and_expiry(calls):
+    first = osm_service.fetch_nearby(21.1458, 79.0882)
+    assert [p['name'] for p in first] == ['Near Garage', 'Far Garage']
+    # Same ~500 m tile: served from the cache
+    osm_service.fetch_nearby(21.1459, 79.0883)
+    assert len(calls) == 1
+
+    osm_service.CACHE_TTL_SECONDS = 0
+    osm_service.fetch_nearby(21.1458, 79.0882)
+    assert len(calls) == 2
+    # The expired entry was replaced, not kept alongside
+    assert len(osm_service._cache) == 1
+
+@_patched
+def test_tile_cache_is_bounded(calls):
+    osm_service.CACHE_MAX_TILES = 3
+    for i in range(5):
+        osm_service.fetch_nearby(21.0 + i * 0.1, 79.0)
+    assert len(osm_service._cache) == 3
+    # Reading a tile makes it the most recently used, so it outlives older ones
+    osm_service.fetch_nearby(21.2, 79.0)
+    osm_service.fetch_nearby(22.0, 79.0)
+    assert len(calls) == 6
+    osm_service.fetch_nearby(21.2, 79.0)
+    assert len(calls) == 6
+    osm_service.fetch_nearby(21.3, 79.0)
+    assert len(calls) == 7
+
+@_patched
+def test_emergency_assistance_per_category(calls):
+    nearest = osm_service.get_emergency_assistance(21.1458, 79.0882)
+    assert list(nearest) == list(osm_service.EMERGENCY_CATEGORIES)
+    assert nearest['hospital']['name'] == 'City Hospital'
+    assert nearest['mechanic']['name'] == 'Near Garage'
+    assert nearest['police'] is None
+    assert sorted(calls) == [('car_repair',), ('hospital',), ('police',)]
+
+if __name__ == "__main__":
+    test_tile_cache_hits_and_expiry()
+    test_tile_cache_is_bounded()
+    test_emergency_assistance_per_category()
+    print("osm_service tests passed")
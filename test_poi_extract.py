@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+import poi_extract
+import poi_index
+
+def write_poi_extract(path, garages=40):
+    """
+    A row of garage nodes between untagged nodes, a hospital drawn as a
+    closed way, and an untagged road.
+    """
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6">',
+             '  <bounds minlat="21.0" minlon="79.0" maxlat="21.2" maxlon="79.2"/>']
+    for i in range(1, garages + 1):
+        lines.append(f'  <node id="{i}" lat="{21.10 + i * 0.001}" lon="79.05">')
+        lines.append(f'    <tag k="amenity" v="car_repair"/><tag k="name" v="Garage {i}"/><tag k="phone" v="+91 {i}"/>')
+        lines.append('  </node>')
+        lines.append(f'  <node id="{1000 + i}" lat="{21.10 + i * 0.001}" lon="79.06"/>')
+    for i, (lat, lon) in enumerate([(21.15, 79.10), (21.15, 79.102), (21.152, 79.102), (21.152, 79.10)]):
+        lines.append(f'  <node id="{2000 + i}" lat="{lat}" lon="{lon}"/>')
+    refs = "".join(f'<nd ref="{2000 + i}"/>' for i in (0, 1, 2, 3, 0))
+    lines.append(f'  <way id="500">{refs}<tag k="amenity" v="hospital"/><tag k="name" v="City Hospital"/></way>')
+    lines.append('  <way id="501"><nd ref="1001"/><nd ref="1002"/><tag k="highway" v="residential"/></way>')
+    lines.append('</osm>')
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+def test_blocks_cover_every_element():
+    with tempfile.TemporaryDirectory() as tmp:
+        extract = os.path.join(tmp, "pois.osm")
+        write_poi_extract(extract)
+        blocks = poi_extract.split_blocks(extract, chunk_bytes=512)
+        print(f"{len(blocks)} blocks")
+        assert len(blocks) > 5
+        assert all(a[1] == b[0] for a, b in zip(blocks, blocks[1:]))
+
+        serial = poi_extract.extract_pois(extract, workers=1, chunk_bytes=1 << 30)
+        parallel = poi_extract.extract_pois(extract, workers=2, chunk_bytes=512)
+    key = lambda p: (p['category'], p['id'])
+    assert sorted(serial, key=key) == sorted(parallel, key=key)
+    assert len(parallel) == 41
+    hospital = next(p for p in parallel if p['category'] == 'hospital')
+    # Centroid of the closed way's nodes (the closing node counts twice)
+    assert hospital['osm_type'] == 'way' and hospital['name'] == "City Hospital"
+    assert abs(hospital['lat'] - 21.1508) < 1e-9 and abs(hospital['lon'] - 79.1008) < 1e-9
+
+def test_build_from_extract_with_bbox():
+    with tempfile.TemporaryDirectory() as tmp:
+        extract = os.path.join(tmp, "pois.osm")
+        index_path = os.path.join(tmp, "poi_index.bin")
+        way_nodes_path = os.path.join(tmp, "poi_way_nodes.bin")
+        write_poi_extract(extract)
+        assert poi_extract.build_from_extract(extract, index_path, workers=2, chunk_bytes=512,
+                                              way_nodes_path=way_nodes_path) == 41
+        # The hospital way's nodes are kept for poi_updates
+        way_refs, coords = poi_extract.load_way_nodes(way_nodes_path)
+        assert way_refs == {500: [2000, 2001, 2002, 2003, 2000]}
+        assert sorted(coords) == [2000, 2001, 2002, 2003] and coords[2001] == (21.15, 79.102)
+
+        count = poi_extract.build_from_extract(extract, index_path, bbox=(21.0, 79.0, 21.12, 79.2), workers=2,
+                                               chunk_bytes=512, way_nodes_path=way_nodes_path)
+        assert count == 20
+        assert poi_extract.load_way_nodes(way_nodes_path) == ({}, {})
+        index = poi_index.PoiIndex(index_path)
+        nearest = index.nearest(21.101, 79.05, 'car_repair', limit=1)
+        print(f"Nearest garage: {nearest}")
+        assert nearest[0]['name'] == "Garage 1"
+        assert index.nearest(21.15, 79.10, 'hospital') == []
+
+if __name__ == "__main__":
+    test_blocks_cover_every_element()
+    test_build_from_extract_with_bbox()
+    print("POI extract tests passed!")
@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+import poi_index
+
+def sample_pois():
+    pois = []
+    for i in range(50):
+        pois.append({'id': 1000 + i, 'category': 'car_repair', 'name': f"Garage {i}", 'phone': '+91 9822000000',
+                     'type': 'car_repair', 'lat': 21.10 + i * 0.002, 'lon': 79.05 + i * 0.001})
+    pois.append({'id': 1, 'category': 'hospital', 'name': 'Mayo Hospital', 'phone': '+91 7122000000',
+                 'type': 'hospital', 'lat': 21.15, 'lon': 79.09, 'osm_type': 'way'})
+    return pois
+
+def test_nearest_matches_brute_force():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "poi.bin")
+        assert poi_index.build_index(sample_pois(), path) == 51
+        index = poi_index.PoiIndex(path)
+
+        lat, lon = 21.13, 79.07
+        nearest = index.nearest(lat, lon, 'car_repair', limit=5)
+        expected = sorted((p for p in sample_pois() if p['category'] == 'car_repair'),
+                          key=lambda p: poi_index._distance_m(lat, lon, p['lat'], p['lon']))[:5]
+        print([p['name'] for p in nearest])
+        assert [p['id'] for p in nearest] == [p['id'] for p in expected]
+
+        hospital = index.nearest(lat, lon, 'hospital')[0]
+        assert hospital['name'] == 'Mayo Hospital' and hospital['osm_type'] == 'way'
+        assert index.nearest(lat, lon, 'police') == []
+
+def test_rebuilt_index_is_swapped_in():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "poi.bin")
+        poi_index.build_index(sample_pois(), path)
+        first = poi_index.get_index(path)
+        assert first.count == 51
+
+        poi_index.build_index(sample_pois()[:10], path)
+        poi_index._index_checked = 0.0
+        second = poi_index.get_index(path)
+        assert second is not first and second.count == 10
+        # The old mapping stays readable for requests already using it
+        assert first.record(0)['name']
+        poi_index._index = None
+
+if __name__ == "__main__":
+    test_nearest_matches_brute_force()
+    test_rebuilt_index_is_swapped_in()
+    print("POI index tests passed!")
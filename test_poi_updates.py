@@ -0,0 +1,140 @@
+import gzip
+import os
+import tempfile
+
+import nearest_raster
+import poi_extract
+import poi_index
+import poi_updates
+
+CHANGE = """<?xml version="1.0" encoding="UTF-8"?>
+<osmChange version="0.6">
+  <create>
+    <node id="10" lat="21.13" lon="79.07"><tag k="amenity" v="police"/><tag k="name" v="New Chowki"/></node>
+    <node id="20" lat="21.15" lon="79.10"/>
+    <node id="21" lat="21.15" lon="79.102"/>
+    <way id="30"><nd ref="20"/><nd ref="21"/><tag k="amenity" v="hospital"/><tag k="name" v="Ward"/></way>
+  </create>
+  <modify>
+    <node id="1" lat="21.101" lon="79.05"><tag k="amenity" v="car_repair"/><tag k="name" v="Garage One"/></node>
+    <node id="2" lat="21.102" lon="79.05"><tag k="name" v="Closed Garage"/></node>
+  </modify>
+  <delete>
+    <node id="3" lat="21.103" lon="79.05"/>
+    <node id="99"/>
+  </delete>
+</osmChange>
+"""
+
+def test_change_applied_and_sequence_recorded():
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "poi_index.bin")
+        state_path = os.path.join(tmp, "state.json")
+        change_path = os.path.join(tmp, "123.osc.gz")
+        garages = [{'id': i, 'lat': 21.10 + i * 0.001, 'lon': 79.05, 'category': 'car_repair',
+                    'name': f"Garage {i}", 'phone': "", 'type': 'car_repair'} for i in (1, 2, 3, 4)]
+        poi_index.build_index(garages, index_path)
+        with gzip.open(change_path, "wt") as f:
+            f.write(CHANGE)
+
+        changes = poi_updates.parse_change(change_path)
+        assert [(a, el['type'], el['id']) for a, el in changes][:4] == [
+            ("create", "node", 10), ("create", "node", 20), ("create", "node", 21), ("create", "way", 30)]
+        assert changes[-1] == ("delete", {'type': 'node', 'id': 99, 'lat': None, 'lon': None, 'tags': {}})
+
+        way_nodes_path = os.path.join(tmp, "poi_way_nodes.bin")
+        reached = poi_updates.update([(change_path, 123)], index_path=index_path, state_path=state_path,
+                                     raster_path=os.path.join(tmp, "no_raster.bin"), way_nodes_path=way_nodes_path)
+        assert reached == 123
+        assert poi_updates.read_state(state_path)["sequence"] == 123
+
+        pois = poi_updates.load_pois(index_path)
+        print(f"POIs after the diff: {sorted((p['category'], p['name']) for p in pois.values())}")
+        assert sorted(pois) == [('node', 1), ('node', 4), ('node', 10), ('way', 30)]
+        assert pois[('node', 1)]['name'] == "Garage One"
+        assert pois[('way', 30)]['category'] == 'hospital'
+        assert abs(pois[('way', 30)]['lon'] - 79.101) < 1e-9
+        assert poi_extract.load_way_nodes(way_nodes_path) == ({30: [20, 21]}, {20: (21.15, 79.10), 21: (21.15, 79.102)})
+
+        # An already applied sequence leaves the index alone
+        mtime = os.stat(index_path).st_mtime_ns
+        assert poi_updates.update([(change_path, 123)], index_path=index_path, state_path=state_path,
+                                  way_nodes_path=way_nodes_path) == 123
+        assert os.stat(index_path).st_mtime_ns == mtime
+
+def test_modified_way_keeps_position_without_node_coords():
+    pois = {('way', 5): {'id': 5, 'osm_type': 'way', 'category': 'hospital', 'name': "Old",
+                         'lat': 21.2, 'lon': 79.2, 'phone': "", 'type': 'hospital'}}
+    changes = [
+        ("modify", {'type': 'way', 'id': 5, 'refs': [7, 8], 'tags': {'amenity': 'hospital', 'name': "Renamed"}}),
+        ("create", {'type': 'way', 'id': 6, 'refs': [7, 8], 'tags': {'amenity': 'police'}}),
+    ]
+    counts = poi_updates.apply_changes(pois, changes)
+    assert counts == {"created": 0, "modified": 1, "deleted": 0, "unlocated": 1}
+    assert pois[('way', 5)]['name'] == "Renamed" and pois[('way', 5)]['lat'] == 21.2
+
+HOSPITAL = {'id': 5, 'osm_type': 'way', 'category': 'hospital', 'name': "City Hospital",
+            'lat': 21.151, 'lon': 79.101, 'phone': "", 'type': 'hospital'}
+HOSPITAL_TAGS = {'amenity': 'hospital', 'name': "City Hospital"}
+
+def _hospital_way_nodes():
+    return {5: [1, 2, 3, 4]}, {1: (21.15, 79.10), 2: (21.15, 79.102), 3: (21.152, 79.102), 4: (21.152, 79.10)}
+
+def test_way_placed_from_all_its_nodes():
+    # One corner moves 15 km away; the centroid moves a quarter of that, not all of it
+    moved_corner = ("modify", {'type': 'node', 'id': 4, 'lat': 21.152, 'lon': 79.244, 'tags': {}})
+    modified_way = ("modify", {'type': 'way', 'id': 5, 'refs': [1, 2, 3, 4], 'tags': HOSPITAL_TAGS})
+    for changes in ([moved_corner, modified_way], [moved_corner]):
+        pois = {('way', 5): dict(HOSPITAL)}
+        way_nodes = _hospital_way_nodes()
+        counts = poi_updates.apply_changes(pois, changes, way_nodes=way_nodes)
+        assert counts["modified"] == 1 and counts["unlocated"] == 0
+        assert abs(pois[('way', 5)]['lon'] - 79.137) < 1e-9 and abs(pois[('way', 5)]['lat'] - 21.151) < 1e-9
+        assert way_nodes[1][4] == (21.152, 79.244)
+
+    # Without the other corners the way stays where it was
+    pois = {('way', 5): dict(HOSPITAL)}
+    poi_updates.apply_changes(pois, [moved_corner, modified_way])
+    assert (pois[('way', 5)]['lat'], pois[('way', 5)]['lon']) == (21.151, 79.101)
+
+def test_state_held_at_unlocated_way():
+    newly_tagged = """<osmChange version="0.6"><modify>
+    <way id="6"><nd ref="7"/><nd ref="8"/><tag k="amenity" v="police"/></way>
+    </modify></osmChange>"""
+    renamed = """<osmChange version="0.6"><modify>
+    <way id="5"><nd ref="1"/><nd ref="2"/><nd ref="3"/><nd ref="4"/><tag k="amenity" v="hospital"/><tag k="name" v="Renamed"/></way>
+    </modify></osmChange>"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "poi_index.bin")
+        state_path = os.path.join(tmp, "state.json")
+        way_nodes_path = os.path.join(tmp, "poi_way_nodes.bin")
+        poi_index.build_index([HOSPITAL], index_path)
+        poi_extract.save_way_nodes(way_nodes_path, *_hospital_way_nodes())
+        poi_updates.write_state(100, state_path)
+        diffs = []
+        for sequence, text in ((101, newly_tagged), (102, renamed)):
+            diffs.append((os.path.join(tmp, f"{sequence}.osc"), sequence))
+            with open(diffs[-1][0], "w") as f:
+                f.write(text)
+
+        raster_path = os.path.join(tmp, "nearest_raster.bin")
+        nearest_raster.build_raster(poi_index.PoiIndex(index_path), raster_path, cell_degrees=0.01, margin=0.01)
+        kwargs = dict(index_path=index_path, state_path=state_path, way_nodes_path=way_nodes_path,
+                      raster_path=raster_path)
+        assert poi_updates.update(diffs, **kwargs) == 100
+        # The raster was rebuilt for the new index at its own resolution
+        raster = nearest_raster.NearestRaster(raster_path)
+        assert raster.cell_degrees == 0.01
+        assert raster.index_checksum == poi_index.PoiIndex(index_path).checksum()
+        # Later diffs still reach the index; the unplaced way is retried next time
+        pois = poi_updates.load_pois(index_path)
+        assert pois[('way', 5)]['name'] == "Renamed" and ('way', 6) not in pois
+        assert poi_updates.read_state(state_path)["sequence"] == 100
+        assert poi_updates.update(diffs, **kwargs) == 100
+
+if __name__ == "__main__":
+    test_change_applied_and_sequence_recorded()
+    test_modified_way_keeps_position_without_node_coords()
+    test_way_placed_from_all_its_nodes()
+    test_state_held_at_unlocated_way()
+    print("POI update tests passed!")
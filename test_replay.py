@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+
+import replay
+
+def test_read_requests_keeps_request_fields():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "request_log.jsonl")
+        with open(path, "w") as f:
+            f.write(json.dumps({"ts": 20.0, "incident_id": "inc-1", "user_location": {"lat": 21.1, "lon": 79.0},
+                                "issued_incident_id": "inc-1"}) + "\n")
+            f.write("\n")
+            f.write(json.dumps({"ts": 10.0, "user_text": "flat tyre", "include_route": True, "unrelated": 1}) + "\n")
+        entries = replay.read_requests(path)
+
+    assert [ts for ts, _, _ in entries] == [10.0, 20.0]
+    assert entries[0][1:] == ({"user_text": "flat tyre", "include_route": True}, None)
+    # A follow-up with only a location still replays as a follow-up
+    assert entries[1][1] == {"user_text": "", "incident_id": "inc-1", "user_location": {"lat": 21.1, "lon": 79.0}}
+    assert entries[1][2] == "inc-1"
+
+def test_request_log_records_issued_incident():
+    import logging
+    import logging_config
+    captured = []
+    handler = logging.Handler()
+    handler.emit = captured.append
+    logger = logging.getLogger(logging_config.REQUEST_LOGGER)
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    try:
+        logging_config.log_request({"user_text": "flat tyre"}, "inc-7", received_at=100.0)
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+    entry = json.loads(logging_config.DataLogFormatter().format(captured[-1]))
+    assert entry == {"user_text": "flat tyre", "issued_incident_id": "inc-7", "ts": 100.0}
+
+def test_follow_ups_use_replayed_incident_ids():
+    entries = [
+        (0.0, {"user_text": "flat tyre"}, "old-1"),
+        (0.01, {"user_text": "", "incident_id": "old-1", "user_location": {"lat": 21.1, "lon": 79.0}}, "old-1"),
+        # Its original request isn't in this part of the log
+        (0.02, {"user_text": "", "incident_id": "old-9", "user_location": {"lat": 21.1, "lon": 79.0}}, "old-9"),
+    ]
+    sent = []
+
+    def call(payload):
+        sent.append(payload)
+        if payload.get("incident_id"):
+            return {"status": "assigned", "incident_id": payload["incident_id"]}
+        return {"status": "waiting_for_location", "incident_id": "new-1"}
+
+    results, wall = replay.replay(entries, call, speedup=10.0, max_workers=4)
+    assert [p.get("incident_id") for p in sent] == [None, "new-1"]
+    assert results[1]["decision"]["status"] == "assigned"
+    assert results[2]["skipped"]
+    summary = replay.summarize(results, wall)
+    assert summary["requests"] == 2 and summary["skipped"] == 1 and summary["errors"] == 0
+
+def test_diff_decisions_by_index():
+    baseline = [
+        {"index": 0, "decision": {"status": "assigned", "mechanic_id": "m1", "eta_minutes": 12}},
+        {"index": 1, "decision": None},
+        {"index": 2, "decision": {"status": "assigned", "mechanic_id": "m2"}},
+    ]
+    current = [
+        {"index": 0, "decision": {"status": "assigned", "mechanic_id": "m3", "eta_minutes": 12}},
+        {"index": 1, "decision": {"status": "waiting_for_location"}},
+        {"index": 3, "decision": {"status": "assigned"}},
+    ]
+    changes = replay.diff_decisions(baseline, current)
+    assert changes == [
+        (0, "mechanic_id", "m1", "m3"),
+        (1, "status", None, "waiting_for_location"),
+    ]
+
+if __name__ == "__main__":
+    test_read_requests_keeps_request_fields()
+    test_request_log_records_issued_incident()
+    test_follow_ups_use_replayed_incident_ids()
+    test_diff_decisions_by_index()
+    print("replay tests passed")
@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+import road_graph
+
+def write_grid_extract(path, size=6, step=0.005, origin=(21.10, 79.05)):
+    """
+    Write a small OSM XML extract: a size x size grid of residential roads,
+    with one one-way primary road along the bottom row.
+    """
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6">']
+    for r in range(size):
+        for c in range(size):
+            node_id = r * size + c + 1
+            lines.append(f'<node id="{node_id}" lat="{origin[0] + r * step}" lon="{origin[1] + c * step}"/>')
+    way_id = 1000
+    for r in range(size):
+        refs = "".join(f'<nd ref="{r * size + c + 1}"/>' for c in range(size))
+        tags = '<tag k="highway" v="primary"/><tag k="oneway" v="yes"/>' if r == 0 else '<tag k="highway" v="residential"/>'
+        lines.append(f'<way id="{way_id}">{refs}{tags}</way>')
+        way_id += 1
+    for c in range(size):
+        refs = "".join(f'<nd ref="{r * size + c + 1}"/>' for r in range(size))
+        lines.append(f'<way id="{way_id}">{refs}<tag k="highway" v="residential"/></way>')
+        way_id += 1
+    lines.append('</osm>')
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+
+def test_local_route_matches_grid_distance():
+    with tempfile.TemporaryDirectory() as tmp:
+        extract = os.path.join(tmp, "grid.osm")
+        graph_path = os.path.join(tmp, "grid.bin")
+        write_grid_extract(extract)
+        nodes, edges = road_graph.build_graph(extract, graph_path)
+        assert nodes == 36
+
+        graph = road_graph.RoadGraph(graph_path)
+        start = {"lat": 21.10, "lon": 79.05}
+        end = {"lat": 21.10 + 0.025, "lon": 79.05 + 0.025}
+        route = graph.route(start, end)
+        print(f"Grid route: {route}")
+        # Manhattan distance across the grid is ~5.5 km
+        assert 5.0 < route["distance_km"] < 6.0
+        assert route["duration_min"] > 0
+
+def test_oneway_is_respected():
+    with tempfile.TemporaryDirectory() as tmp:
+        extract = os.path.join(tmp, "grid.osm")
+        graph_path = os.path.join(tmp, "grid.bin")
+        write_grid_extract(extract)
+        road_graph.build_graph(extract, graph_path)
+        graph = road_graph.RoadGraph(graph_path)
+
+        west = {"lat": 21.10, "lon": 79.05}
+        east = {"lat": 21.10, "lon": 79.075}
+        forward = graph.route(west, east)
+        backward = graph.route(east, west)
+        print(f"With the one-way: {forward}, against it: {backward}")
+        # Going back has to detour through the residential row above
+        assert backward["distance_km"] > forward["distance_km"]
+        assert backward["duration_min"] > forward["duration_min"]
+
+if __name__ == "__main__":
+    test_local_route_matches_grid_distance()
+    test_oneway_is_respected()
+    print("Road graph tests passed!")
@@ -0,0 +1,39 @@
+import route_polyline
+
+def test_encode_matches_reference():
+    # The example from Google's encoded polyline format documentation
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    encoded = route_polyline.encode(points)
+    assert encoded == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert route_polyline.decode(encoded) == points
+
+def test_simplify_keeps_corners_only():
+    # A straight 2 km road with ~1 m jitter, then a right-angle turn
+    straight = [(21.10 + (0.00001 if i % 2 else 0), 79.05 + i * 0.001) for i in range(20)]
+    turn = [(21.10 + i * 0.001, 79.069) for i in range(1, 20)]
+    simplified = route_polyline.simplify(straight + turn, tolerance_meters=15)
+    print(f"{len(straight + turn)} points simplified to {simplified}")
+    assert simplified == [straight[0], straight[-1], turn[-1]]
+    assert len(route_polyline.encode(simplified)) < len(route_polyline.encode(straight + turn)) / 5
+
+def test_polyline_cached_per_route():
+    calls = []
+    original = route_polyline.osrm_service.get_route_geometry
+    def fake_geometry(start, end):
+        calls.append((start, end))
+        return {"points": [(start['lat'], start['lon']), (end['lat'], end['lon'])]}
+    route_polyline.osrm_service.get_route_geometry = fake_geometry
+    try:
+        start, end = {"lat": 21.1407, "lon": 79.0887}, {"lat": 21.1458, "lon": 79.0882}
+        first = route_polyline.get_polyline(start, end)
+        assert route_polyline.get_polyline(dict(start), dict(end)) == first
+        assert len(calls) == 1
+        assert route_polyline.decode(first) == [(21.1407, 79.0887), (21.1458, 79.0882)]
+    finally:
+        route_polyline.osrm_service.get_route_geometry = original
+
+if __name__ == "__main__":
+    test_encode_matches_reference()
+    test_simplify_keeps_corners_only()
+    test_polyline_cached_per_route()
+    print("Route polyline tests passed!")
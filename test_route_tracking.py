@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+import osrm_service
+import road_graph
+from test_road_graph import write_grid_extract
+
+def test_position_updates_reuse_the_cached_route():
+    with tempfile.TemporaryDirectory() as tmp:
+        extract = os.path.join(tmp, "grid.osm")
+        graph_path = os.path.join(tmp, "grid.bin")
+        write_grid_extract(extract)
+        road_graph.build_graph(extract, graph_path)
+        graph = road_graph.RoadGraph(graph_path)
+
+    fetches = []
+    original_graph = osrm_service._local_graph, osrm_service._local_graph_loaded
+    original_fetch = osrm_service.get_route_geometry
+    def counting_fetch(start, end):
+        fetches.append(start)
+        return original_fetch(start, end)
+    osrm_service._local_graph, osrm_service._local_graph_loaded = graph, True
+    osrm_service.get_route_geometry = counting_fetch
+    try:
+        start = {"lat": 21.10, "lon": 79.05}
+        end = {"lat": 21.125, "lon": 79.075}
+        geometry = graph.route_geometry(start, end)
+        assert geometry["points"][0] == (21.10, 79.05)
+        assert geometry["seconds"] == sorted(geometry["seconds"])
+
+        first = osrm_service.remaining_route("incident-1", start, end)
+        # Halfway along the cached polyline, slightly off the road
+        lat, lon = geometry["points"][len(geometry["points"]) // 2]
+        halfway = osrm_service.remaining_route("incident-1", {"lat": lat + 0.0003, "lon": lon}, end)
+        print(f"At the start: {first}, halfway: {halfway}")
+        assert len(fetches) == 1
+        assert not halfway["rerouted"]
+        assert 0 < halfway["duration_min"] < first["duration_min"]
+        assert 0 < halfway["distance_km"] < first["distance_km"]
+
+        # Far from the route: fetched again from the new position
+        detour = osrm_service.remaining_route("incident-1", {"lat": 21.125, "lon": 79.05}, end)
+        print(f"After a detour: {detour}")
+        assert detour["rerouted"]
+        assert len(fetches) == 2
+
+        osrm_service.forget_route("incident-1")
+        assert "incident-1" not in osrm_service._tracked_routes
+    finally:
+        osrm_service._local_graph, osrm_service._local_graph_loaded = original_graph
+        osrm_service.get_route_geometry = original_fetch
+
+def test_projection_onto_polyline():
+    geometry = {"points": [(21.0, 79.0), (21.0, 79.01), (21.01, 79.01)]}
+    segment, fraction, off_route = osrm_service.project_onto_route(geometry, {"lat": 21.0005, "lon": 79.005})
+    assert segment == 0
+    assert abs(fraction - 0.5) < 1e-6
+    assert 50 < off_route < 60
+
+if __name__ == "__main__":
+    test_position_updates_reuse_the_cached_route()
+    test_projection_onto_polyline()
+    print("Route tracking tests passed!")
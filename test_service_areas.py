@@ -0,0 +1,54 @@
+import random
+import time
+
+import service_areas
+
+def square(id, lat, lon, size, hole=None):
+    ring = [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+    coordinates = [ring] + ([hole] if hole else [])
+    return {"type": "Feature", "properties": {"id": id, "name": f"Center {id}"},
+            "geometry": {"type": "Polygon", "coordinates": coordinates}}
+
+def test_point_in_polygon_with_holes_and_overlap():
+    hole = [[79.04, 21.04], [79.06, 21.04], [79.06, 21.06], [79.04, 21.06], [79.04, 21.04]]
+    index = service_areas.ServiceAreaIndex([
+        square("city", 21.0, 79.0, 0.1, hole=hole),
+        # Smaller area inside the city's bounding box wins where they overlap
+        square("depot", 21.08, 79.08, 0.01),
+    ])
+    assert index.find(21.01, 79.01)["id"] == "city"
+    assert index.find(21.05, 79.05) is None  # in the hole
+    assert index.find(21.085, 79.085)["id"] == "depot"
+    assert index.find(22.0, 79.0) is None
+    print(index.find(21.01, 79.01))
+
+def test_many_areas():
+    features = [square(f"{r}-{c}", 20 + r * 0.1, 78 + c * 0.1, 0.1) for r in range(20) for c in range(25)]
+    index = service_areas.ServiceAreaIndex(features)
+    rng = random.Random(0)
+    points = [(20 + rng.random() * 2, 78 + rng.random() * 2.5) for _ in range(2000)]
+    start = time.perf_counter()
+    for lat, lon in points:
+        area = index.find(lat, lon)
+        r, c = (int(x) for x in area["id"].split("-"))
+        assert 20 + r * 0.1 <= lat <= 20 + (r + 1) * 0.1
+    print(f"{(time.perf_counter() - start) / len(points) * 1e6:.1f} us per lookup over {len(features)} areas")
+
+def test_uncovered_points_go_to_the_nearest_center():
+    index = service_areas.ServiceAreaIndex([square("west", 21.0, 79.0, 0.1), square("east", 21.0, 79.3, 0.1)])
+    original = service_areas._index, service_areas._index_loaded
+    service_areas._index, service_areas._index_loaded = index, True
+    try:
+        assert service_areas.assign_center({"lat": 21.05, "lon": 79.05}) == dict(index.find(21.05, 79.05), covered=True)
+        # Between the areas, nearer to the east one's centroid
+        east = service_areas.assign_center({"lat": 21.05, "lon": 79.22})
+        assert east["id"] == "east" and not east["covered"]
+        assert service_areas.assign_center(None) is None
+    finally:
+        service_areas._index, service_areas._index_loaded = original
+
+if __name__ == "__main__":
+    test_point_in_polygon_with_holes_and_overlap()
+    test_many_areas()
+    test_uncovered_points_go_to_the_nearest_center()
+    print("Service area tests passed!")
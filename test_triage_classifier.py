@@ -0,0 +1,52 @@
+import os
+import tempfile
+import time
+
+import triage_classifier
+
+LABELS = [
+    ("my tyre is flat", "Tyre", "Low"),
+    ("flat tire on the highway", "Tyre", "Medium"),
+    ("puncture in rear tyre", "Tyre", "Low"),
+    ("tyre burst while driving", "Tyre", "High"),
+    ("battery is dead car won't start", "Battery", "Medium"),
+    ("need a jump start, battery drained", "Battery", "Low"),
+    ("battery died in the parking lot", "Battery", "Low"),
+    ("engine overheating smoke from bonnet", "Engine", "High"),
+    ("engine making knocking noise", "Engine", "Medium"),
+    ("engine stalled and won't restart", "Engine", "Medium"),
+    ("accident with a truck, driver injured", "Accident", "Critical"),
+    ("car crash on the flyover, people hurt", "Accident", "Critical"),
+    ("minor collision with a bike", "Accident", "High"),
+    ("ran out of fuel", "General", "Low"),
+    ("locked keys inside the car", "General", "Low"),
+]
+
+def test_train_predict_and_round_trip():
+    examples = [(text, {"issueType": issue, "severity": severity}) for text, issue, severity in LABELS] * 3
+    model = triage_classifier.TriageModel().fit(examples, epochs=15)
+
+    result = model.predict("flat tyre near the station")
+    print(result)
+    assert result["issueType"] == "Tyre"
+    assert model.predict("crash, driver injured")["issueType"] == "Accident"
+    assert 0.0 < result["confidence"] <= 1.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.json")
+        model.save(path)
+        loaded = triage_classifier.TriageModel.load(path)
+    again = loaded.predict("flat tyre near the station")
+    assert again["issueType"] == result["issueType"] and again["severity"] == result["severity"]
+    assert abs(again["confidence"] - result["confidence"]) < 1e-3
+
+    start = time.perf_counter()
+    for _ in range(100):
+        model.predict("engine overheating on the ring road")
+    per_call_ms = (time.perf_counter() - start) * 10
+    print(f"{per_call_ms:.3f} ms per prediction")
+    assert per_call_ms < 5
+
+if __name__ == "__main__":
+    test_train_predict_and_round_trip()
+    print("Triage classifier tests passed!")
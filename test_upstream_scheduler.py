@@ -0,0 +1,37 @@
+import threading
+import time
+
+import upstream_scheduler
+
+def test_emergency_jumps_the_queue():
+    scheduler = upstream_scheduler.Scheduler("test_upstream", max_concurrent=1)
+    order = []
+
+    def call(priority):
+        with scheduler.slot(priority):
+            order.append(priority)
+
+    with scheduler.slot("normal"):
+        threads = []
+        for priority in ("low", "normal", "emergency"):
+            thread = threading.Thread(target=call, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.05)  # queue them in this order
+    for thread in threads:
+        thread.join(timeout=5)
+
+    print(order)
+    assert order == ["emergency", "normal", "low"]
+    assert upstream_scheduler.QUEUE_DEPTH.value(upstream="test_upstream", priority="low") == 0
+
+def test_priority_is_scoped_to_the_request():
+    with upstream_scheduler.request_scope():
+        upstream_scheduler.set_priority("emergency")
+        assert upstream_scheduler.current_priority() == "emergency"
+    assert upstream_scheduler.current_priority() == upstream_scheduler.DEFAULT_PRIORITY
+
+if __name__ == "__main__":
+    test_emergency_jumps_the_queue()
+    test_priority_is_scoped_to_the_request()
+    print("Upstream scheduler tests passed!")
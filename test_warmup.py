@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import time
+
+import eta_grid
+import osm_service
+import warmup
+
+def test_rank_tiles_hottest_first():
+    step = osm_service.CACHE_TILE_DEGREES
+    locations = [(21.1458, 79.0882)] * 3 + [(21.1458 + 5 * step, 79.0882)] + [(21.1459, 79.0883)] * 2
+    tiles = warmup.rank_tiles(locations)
+    assert [n for _, n in tiles] == [5, 1]
+    (lat, lon), _ = tiles[0]
+    assert abs(lat - 21.1458) <= step / 2 and abs(lon - 79.0882) <= step / 2
+
+def test_rate_budget_paces_and_caps():
+    budget = warmup.RateBudget(calls_per_second=50, max_calls=5)
+    start = time.monotonic()
+    assert budget.acquire(3)
+    assert budget.acquire()
+    # The 3-call charge pushed the next slot 60 ms out
+    assert time.monotonic() - start >= 0.05
+    assert not budget.acquire(2)
+    assert budget.remaining == 1
+    assert budget.acquire(0)
+    assert budget.acquire()
+    assert not budget.acquire()
+
+def test_grid_builds_are_charged_to_the_budget():
+    original = osm_service.fetch_nearby, eta_grid.is_known, eta_grid.upstream_calls, eta_grid.register_hub
+    registered = []
+    shop = {"lat": 21.15, "lon": 79.09, "category": "mechanic"}
+    osm_service.fetch_nearby = lambda lat, lon, types=None: [shop]
+    eta_grid.is_known = lambda hub: any(h is hub for h in registered)
+    eta_grid.upstream_calls = lambda hub: 15
+    eta_grid.register_hub = registered.append
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "requests.jsonl")
+            with open(path, "w") as f:
+                for _ in range(3):
+                    f.write(json.dumps({"user_location": {"lat": 21.15, "lon": 79.09}}) + "\n")
+
+            # Enough for the POI lookups, not for a 15-call grid build
+            budget = warmup.RateBudget(calls_per_second=0, max_calls=10)
+            assert warmup.warm_up(path, budget=budget) == 1
+            assert registered == []
+            assert budget.remaining == 10 - len(osm_service.EMERGENCY_CATEGORIES)
+
+            budget = warmup.RateBudget(calls_per_second=0, max_calls=30)
+            warmup.warm_up(path, budget=budget)
+            assert registered == [shop]
+            assert budget.remaining == 30 - len(osm_service.EMERGENCY_CATEGORIES) - 15
+    finally:
+        osm_service.fetch_nearby, eta_grid.is_known, eta_grid.upstream_calls, eta_grid.register_hub = original
+
+if __name__ == "__main__":
+    test_rank_tiles_hottest_first()
+    test_rate_budget_paces_and_caps()
+    test_grid_builds_are_charged_to_the_budget()
+    print("warmup tests passed")
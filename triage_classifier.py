@@ -0,0 +1,253 @@
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# In-process triage distilled from Gemini's labels (the triage label log):
+# hashed character n-grams feeding one softmax model per output. Texts it is
+# confident about skip the LLM call; the rest still go to gemini_service.
+TRIAGE_MODEL_PATH = os.getenv("TRIAGE_MODEL_PATH", "triage_model.json")
+TRIAGE_CONFIDENCE_THRESHOLD = float(os.getenv("TRIAGE_CONFIDENCE_THRESHOLD", 0.85))
+NGRAM_RANGE = (2, 4)
+HASH_BUCKETS = 1 << 18
+
+# Same label sets as gemini_service.RESPONSE_SCHEMA
+ISSUE_TYPES = ("Tyre", "Battery", "Engine", "Accident", "General")
+SEVERITIES = ("Low", "Medium", "High", "Critical")
+HEADS = {"issueType": ISSUE_TYPES, "severity": SEVERITIES}
+
+LOCAL_TRIAGE_SECONDS = metrics.Histogram(
+    "local_triage_seconds", "Time to classify one request with the local model",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01),
+)
+TRIAGE_DECISIONS = metrics.Counter("triage_decisions_total", "Triage results by source (local, llm, rules)")
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+def features(text, ngram_range=NGRAM_RANGE, buckets=HASH_BUCKETS):
+    """
+    Hashed character n-grams of the normalized text, per word with boundary
+    markers, as a sorted list of bucket indexes.
+    """
+    found = set()
+    for word in _NON_ALNUM.sub(" ", text.lower()).split():
+        padded = f" {word} "
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            for i in range(len(padded) - n + 1):
+                # crc32, not hash(): str hashing is salted per process
+                found.add(zlib.crc32(padded[i:i + n].encode("utf-8")) % buckets)
+    return sorted(found)
+
+def _softmax(scores):
+    top = max(scores)
+    exps = [math.exp(s - top) for s in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+class TriageModel:
+    """
+    One linear softmax model per head over shared hashed features. Weights
+    are stored sparsely: only buckets seen in training have a row.
+    """
+
+    def __init__(self, heads=None, ngram_range=NGRAM_RANGE, buckets=HASH_BUCKETS):
+        self.ngram_range = tuple(ngram_range)
+        self.buckets = buckets
+        self.heads = {}
+        for name, classes in (heads or HEADS).items():
+            self.heads[name] = {"classes": list(classes), "bias": [0.0] * len(classes), "weights": {}}
+
+    def _scores(self, head, feats):
+        scores = list(head["bias"])
+        weights = head["weights"]
+        scale = 1.0 / math.sqrt(len(feats)) if feats else 0.0
+        for f in feats:
+            row = weights.get(f)
+            if row is not None:
+                for c, w in enumerate(row):
+                    scores[c] += w * scale
+        return scores
+
+    def predict(self, text):
+        """
+        {head: label, ...} plus 'confidence', the lowest top-class probability
+        across heads.
+        """
+        feats = features(text, self.ngram_range, self.buckets)
+        result = {}
+        confidence = 1.0
+        for name, head in self.heads.items():
+            probs = _softmax(self._scores(head, feats))
+            best = max(range(len(probs)), key=probs.__getitem__)
+            result[name] = head["classes"][best]
+            confidence = min(confidence, probs[best])
+        result["confidence"] = confidence
+        return result
+
+    def fit(self, examples, epochs=10, learning_rate=0.5, l2=1e-5, seed=0):
+        """
+        SGD on the cross-entropy of each head. examples is a list of
+        (text, {head: label}); labels outside a head's classes are skipped.
+        """
+        encoded = [(features(text, self.ngram_range, self.buckets), labels) for text, labels in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(encoded)
+            rate = learning_rate / (1 + epoch)
+            for feats, labels in encoded:
+                scale = 1.0 / math.sqrt(len(feats)) if feats else 0.0
+                for name, head in self.heads.items():
+                    label = labels.get(name)
+                    if label not in head["classes"]:
+                        continue
+                    target = head["classes"].index(label)
+                    probs = _softmax(self._scores(head, feats))
+                    grads = [p - (1.0 if c == target else 0.0) for c, p in enumerate(probs)]
+                    for c, g in enumerate(grads):
+                        head["bias"][c] -= rate * g
+                    weights = head["weights"]
+                    for f in feats:
+                        row = weights.get(f)
+                        if row is None:
+                            row = weights[f] = [0.0] * len(grads)
+                        for c, g in enumerate(grads):
+                            row[c] -= rate * (g * scale + l2 * row[c])
+        return self
+
+    def save(self, path):
+        data = {
+            "ngram_range": self.ngram_range,
+            "buckets": self.buckets,
+            "heads": {
+                name: {"classes": head["classes"], "bias": head["bias"],
+                       "weights": {str(f): [round(w, 5) for w in row] for f, row in head["weights"].items()}}
+                for name, head in self.heads.items()
+            },
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        model = cls({name: head["classes"] for name, head in data["heads"].items()},
+                    data["ngram_range"], data["buckets"])
+        for name, head in data["heads"].items():
+            model.heads[name]["bias"] = head["bias"]
+            model.heads[name]["weights"] = {int(f): row for f, row in head["weights"].items()}
+        return model
+
+def read_labels(path):
+    """
+    (text, {issueType, severity}) pairs from the triage label log.
+    """
+    examples = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("user_text"):
+                examples.append((entry["user_text"], {name: entry.get(name) for name in HEADS}))
+    return examples
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+def get_model():
+    """
+    The model at TRIAGE_MODEL_PATH, loaded once; None if there is none.
+    """
+    global _model, _model_loaded
+    if not _model_loaded:
+        with _model_lock:
+            if not _model_loaded:
+                try:
+                    _model = TriageModel.load(TRIAGE_MODEL_PATH)
+                    logger.info("Loaded triage model from %s", TRIAGE_MODEL_PATH)
+                except FileNotFoundError:
+                    _model = None
+                except Exception as e:
+                    logger.error("Failed to load triage model %s: %s", TRIAGE_MODEL_PATH, e)
+                    _model = None
+                _model_loaded = True
+    return _model
+
+def classify(user_text, threshold=None):
+    """
+    Local triage result shaped like gemini_service.analyze_request's, or None
+    when there is no model or it is less confident than the threshold.
+    """
+    model = get_model()
+    if model is None or not user_text:
+        return None
+    start = time.perf_counter()
+    result = model.predict(user_text)
+    LOCAL_TRIAGE_SECONDS.observe(time.perf_counter() - start)
+    if result["confidence"] < (TRIAGE_CONFIDENCE_THRESHOLD if threshold is None else threshold):
+        return None
+    result["suggestedAction"] = ""
+    return result
+
+def evaluate(model, examples, threshold=TRIAGE_CONFIDENCE_THRESHOLD):
+    """
+    Coverage (share of texts at or above threshold) and accuracy on those.
+    """
+    covered = correct = 0
+    for text, labels in examples:
+        result = model.predict(text)
+        if result["confidence"] >= threshold:
+            covered += 1
+            correct += all(result[name] == labels.get(name) for name in model.heads)
+    return {
+        "examples": len(examples),
+        "coverage": round(covered / len(examples), 3) if examples else 0.0,
+        "accuracy_when_covered": round(correct / covered, 3) if covered else 0.0,
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    import logging_config
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Train or try the local triage classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="train from the triage label log")
+    train.add_argument("labels", nargs="?", default=logging_config.TRIAGE_LABEL_LOG_PATH)
+    train.add_argument("output", nargs="?", default=TRIAGE_MODEL_PATH)
+    train.add_argument("--epochs", type=int, default=10)
+    train.add_argument("--holdout", type=float, default=0.2, help="fraction held out for evaluation")
+    classify_cmd = sub.add_parser("classify", help="classify a text with a trained model")
+    classify_cmd.add_argument("text")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        examples = read_labels(args.labels)
+        random.Random(0).shuffle(examples)
+        split = int(len(examples) * (1 - args.holdout))
+        model = TriageModel().fit(examples[:split], epochs=args.epochs)
+        if split < len(examples):
+            print(json.dumps(evaluate(model, examples[split:]), indent=2))
+        # Ship a model trained on everything
+        model = TriageModel().fit(examples, epochs=args.epochs)
+        model.save(args.output)
+        print(f"Trained on {len(examples)} labels, saved to {args.output}")
+    else:
+        start = time.perf_counter()
+        result = get_model().predict(args.text)
+        print(result, f"({(time.perf_counter() - start) * 1000:.3f} ms)")
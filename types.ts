@@ -23,6 +23,7 @@ export interface MechanicInfo {
   capability: string;
   lat?: number;
   lon?: number;
+  routePolyline?: string;
 }
 
 export interface AssistanceRequest {
@@ -0,0 +1,125 @@
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bounded concurrency per upstream with priority queues in front of it, so a
+# burst of low-priority dispatches (or background warm-up) can't delay an
+# emergency's Overpass/OSRM call. The priority of the calling dispatch is
+# carried in a context variable set after Step 4; code that hands work to a
+# thread pool must submit through contextvars.copy_context().run to keep it.
+PRIORITIES = ("emergency", "normal", "low")
+DEFAULT_PRIORITY = "normal"
+
+# Max calls in flight per upstream; override with UPSTREAM_MAX_CONCURRENT_<NAME>
+DEFAULT_MAX_CONCURRENT = {"overpass": 2, "osrm_route": 8, "osrm_table": 4}
+
+QUEUE_SECONDS = metrics.Histogram(
+    "upstream_queue_seconds", "Time a call waited for an upstream slot, by upstream and priority",
+    buckets=(0.001, 0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+QUEUE_DEPTH = metrics.Gauge("upstream_queue_depth", "Calls waiting for an upstream slot, by upstream and priority")
+IN_FLIGHT = metrics.Gauge("upstream_in_flight", "Calls holding an upstream slot")
+
+_priority = contextvars.ContextVar("upstream_priority", default=DEFAULT_PRIORITY)
+
+def current_priority():
+    return _priority.get()
+
+def set_priority(priority):
+    """
+    Set the priority of upstream calls made from the current context.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority {priority!r}")
+    return _priority.set(priority)
+
+@contextmanager
+def request_scope():
+    """
+    Restore the previous priority on exit, e.g. around one dispatch on a
+    reused worker thread.
+    """
+    token = _priority.set(_priority.get())
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class Scheduler:
+    """
+    Up to max_concurrent holders of a slot at a time. Waiters are served
+    highest priority first, then in arrival order; a released slot is handed
+    straight to the next waiter.
+    """
+
+    def __init__(self, name, max_concurrent):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = []
+        self._seq = itertools.count()
+
+    @contextmanager
+    def slot(self, priority=None):
+        priority = priority or current_priority()
+        start = time.perf_counter()
+        granted = None
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiting:
+                self._active += 1
+            else:
+                granted = threading.Event()
+                heapq.heappush(self._waiting, (PRIORITIES.index(priority), next(self._seq), priority, granted))
+                QUEUE_DEPTH.inc(upstream=self.name, priority=priority)
+        if granted is not None:
+            granted.wait()
+        QUEUE_SECONDS.observe(time.perf_counter() - start, upstream=self.name, priority=priority)
+        IN_FLIGHT.inc(upstream=self.name)
+        try:
+            yield
+        finally:
+            IN_FLIGHT.dec(upstream=self.name)
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            if self._waiting:
+                _, _, priority, granted = heapq.heappop(self._waiting)
+                QUEUE_DEPTH.dec(upstream=self.name, priority=priority)
+                granted.set()
+            else:
+                self._active -= 1
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get(name):
+    """
+    The scheduler for an upstream, created on first use.
+    """
+    scheduler = _schedulers.get(name)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(name)
+            if scheduler is None:
+                limit = int(os.getenv(f"UPSTREAM_MAX_CONCURRENT_{name.upper()}", DEFAULT_MAX_CONCURRENT.get(name, 4)))
+                scheduler = _schedulers[name] = Scheduler(name, limit)
+    return scheduler
+
+@contextmanager
+def slot(name, priority=None):
+    """
+    Hold one of the upstream's slots for the duration of a call.
+    """
+    with get(name).slot(priority):
+        yield
@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+import eta_grid
+import logging_config
+import metrics
+import osm_service
+import upstream_scheduler
+
+logger = logging.getLogger(__name__)
+
+# After a deploy, prefetch POI results and hub ETA grids for the locations
+# that historically get the most requests, under a rate budget, so the first
+# dispatches don't all go to Overpass/OSRM.
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_TOP_TILES = int(os.getenv("WARMUP_TOP_TILES", 50))
+WARMUP_CALLS_PER_SECOND = float(os.getenv("WARMUP_CALLS_PER_SECOND", 0.5))
+WARMUP_MAX_CALLS = int(os.getenv("WARMUP_MAX_CALLS", 200))
+
+WARMUP_PREFETCHES = metrics.Counter("warmup_prefetch_total", "Warm-up prefetches by kind")
+
+def read_locations(path):
+    """
+    Yield (lat, lon) of every logged request that had a location. Accepts the
+    request log written by logging_config.log_request or any JSONL file with
+    a user_location object or top-level lat/lon.
+    """
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            loc = entry.get("user_location") or entry
+            if isinstance(loc, dict) and loc.get("lat") is not None and loc.get("lon") is not None:
+                yield float(loc["lat"]), float(loc["lon"])
+
+def rank_tiles(locations, tile_degrees=osm_service.CACHE_TILE_DEGREES):
+    """
+    Count requests per tile; returns [((lat, lon) of tile center, count)], hottest first.
+    Tiles match osm_service's cache tiles so prefetched entries are hit exactly.
+    """
+    counts = Counter((round(lat / tile_degrees), round(lon / tile_degrees)) for lat, lon in locations)
+    return [((ty * tile_degrees, tx * tile_degrees), n) for (ty, tx), n in counts.most_common()]
+
+class RateBudget:
+    """
+    Token bucket limiting upstream calls per second, with a cap on the total.
+    """
+
+    def __init__(self, calls_per_second, max_calls):
+        self.interval = 1.0 / calls_per_second if calls_per_second > 0 else 0.0
+        self.remaining = max_calls
+        self._next = time.monotonic()
+
+    def acquire(self, calls=1):
+        """
+        Wait until calls more upstream calls fit the rate; False, without
+        waiting, if they would exceed what is left of the total budget.
+        """
+        if calls <= 0:
+            return True
+        if self.remaining < calls:
+            return False
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next) + self.interval * calls
+        self.remaining -= calls
+        return True
+
+def warm_up(path, top_tiles=WARMUP_TOP_TILES, budget=None):
+    """
+    Prefetch POIs (mechanic, hospital, police) for the hottest tiles and queue
+    the nearest mechanics as ETA-grid hubs. Returns the number of tiles warmed.
+    """
+    budget = budget or RateBudget(WARMUP_CALLS_PER_SECOND, WARMUP_MAX_CALLS)
+    upstream_scheduler.set_priority("low")
+    tiles = rank_tiles(read_locations(path))[:top_tiles]
+    logger.info("Warming caches for %d hot tiles from %s", len(tiles), path)
+    warmed = 0
+    for (lat, lon), _ in tiles:
+        # Same lookups as dispatch: car_repair for breakdowns, plus the accident responders
+        for category, types in osm_service.EMERGENCY_CATEGORIES.items():
+            if not budget.acquire():
+                logger.info("Warm-up budget exhausted after %d tiles", warmed)
+                return warmed
+            results = osm_service.fetch_nearby(lat, lon, types=types)
+            WARMUP_PREFETCHES.inc(kind="poi")
+            if category == 'mechanic' and results and not eta_grid.is_known(results[0]):
+                # Dispatches from this shop will be served from its ETA grid. The
+                # build's OSRM table calls are charged up front: the builder
+                # thread makes them in one burst, so the rate holds on average.
+                if budget.acquire(eta_grid.upstream_calls(results[0])):
+                    eta_grid.register_hub(results[0])
+                    WARMUP_PREFETCHES.inc(kind="eta_hub")
+                else:
+                    WARMUP_PREFETCHES.inc(kind="eta_hub_skipped")
+        warmed += 1
+    return warmed
+
+def start_background_warm_up(path=None):
+    """
+    Run warm_up on a daemon thread if enabled and a request log exists.
+    """
+    path = path or logging_config.REQUEST_LOG_PATH
+    if not WARMUP_ENABLED or not os.path.exists(path):
+        return None
+    thread = threading.Thread(target=warm_up, args=(path,), name="cache-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Show or warm the hottest request tiles")
+    parser.add_argument("log", nargs="?", default=logging_config.REQUEST_LOG_PATH)
+    parser.add_argument("--top", type=int, default=WARMUP_TOP_TILES)
+    parser.add_argument("--dry-run", action="store_true", help="only print the ranked tiles")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        for (lat, lon), count in rank_tiles(read_locations(args.log))[:args.top]:
+            print(f"{lat:.4f},{lon:.4f}  {count} requests")
+    else:
+        print(f"Warmed {warm_up(args.log, top_tiles=args.top)} tiles")